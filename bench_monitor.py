@@ -0,0 +1,352 @@
+# bench_monitor.py
+# Banco de pruebas del pipeline de escaneo con flotas sintéticas. Compara contra la
+# línea base versionada en bench_baseline.json (como check_startup_budget.py).
+#
+#   python bench_monitor.py                        -> corre los escenarios y verifica (exit 1 si hay regresión)
+#   python bench_monitor.py --scenarios 500,5000   -> solo esos escenarios
+#   python bench_monitor.py --update               -> re-mide y reescribe la línea base
+#   python bench_monitor.py --replay PuntosReportes -> estados de los CSV grabados, barrido por barrido
+#                                                     (con --update queda como escenario "replay")
+#   python bench_monitor.py --loopback             -> ICMP real: vivos en 127/8, caídos en 198.18/15
+#   python bench_monitor.py --shards 4             -> el scan repartido en 4 procesos (monitor_shards);
+#                                                     solo informa: compárese sondas/s contra la corrida normal
+#
+# Cada escenario corre en un intérprete nuevo (pico de RSS limpio) dentro de un
+# directorio temporal: state.db, archivo y gráficos no tocan PuntosReportes/.
+# Etapas, con el mismo código que un barrido real (run_sweep):
+#   catalog  filas del catálogo -> Targets (sin red: la descarga no se simula)
+#   scan     _probe_stream (o _probe_sharded con --shards): política adaptativa + sondas + scan_single_target
+#   state    update_state_history (SQLite)
+#   archive / events / trends   archive_results, observe_transitions, update_zone_trends
+#   report   build_report_text
+#   chart    generate_pie_chart, forzando el dibujo (sin aciertos de caché)
+# El prober simulado duerme latencia * time_scale (y el timeout completo si la sonda se
+# pierde): las sondas/s miden el pipeline, no la red.
+import argparse
+import asyncio
+import csv
+import glob
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BASELINE_FILE = os.path.join(HERE, "bench_baseline.json")
+STAGES = ("catalog", "scan", "state", "archive", "events", "trends", "report", "chart")
+ZONE_NAMES = ("PALMIRA", "ROZO", "CANDELARIA", "FLORIDA", "PRADERA", "AMAIME Y EL PLACER", "OCCIDENTE", "EL CERRITO")
+
+# Defaults de un escenario (bench_baseline.json puede sobreescribir cualquiera)
+SCENARIO_DEFAULTS = {
+    "size": 500,
+    "zones": 6,
+    "latency_ms": [25.0, 0.6],   # lognormal: mediana, sigma
+    "down": 0.12,                # fracción caída (no responde nunca)
+    "lossy": 0.05,               # fracción con pérdida parcial...
+    "loss": 0.4,                 # ...de esta probabilidad por sonda
+    "flap": 0.02,                # fracción que cambia de estado entre barridos
+    "sweeps": 3,                 # se reporta la mediana de los barridos 2..n (en régimen)
+    "time_scale": 0.001,         # 2000 ms de timeout simulado = 2 ms reales
+    "seed": 7,
+}
+TOLERANCE_DEFAULTS = {"time": 1.0, "rss": 0.25, "rate": 1.0, "floor_s": 0.01}
+
+
+# ============================================================================
+# Flotas
+# ============================================================================
+def _ip(i: int, base: Tuple[int, int] = (10, 0)) -> str:
+    i += 1
+    return f"{base[0]}.{base[1] + (i >> 16)}.{(i >> 8) & 255}.{i & 255}"
+
+
+def synthetic_fleet(spec: Dict) -> Tuple[List[Dict], List[Dict[str, Tuple[float, float]]]]:
+    """(filas del catálogo, por barrido {ip: (latencia_ms, pérdida)})."""
+    rng = random.Random(spec["seed"])
+    zones = [ZONE_NAMES[i % len(ZONE_NAMES)] + ("" if i < len(ZONE_NAMES) else f" {i}") for i in range(spec["zones"])]
+    median, sigma = spec["latency_ms"]
+    rows, base = [], {}
+    for i in range(spec["size"]):
+        ip = _ip(i)
+        rows.append({"id": i + 1, "ip": ip, "alias": f"PUNTO {i:05d}", "segment": zones[i % len(zones)], "active": True})
+        r = rng.random()
+        loss = 1.0 if r < spec["down"] else (spec["loss"] if r < spec["down"] + spec["lossy"] else 0.0)
+        base[ip] = (median * rng.lognormvariate(0.0, sigma), loss)
+    sweeps = []
+    state = dict(base)
+    for _ in range(spec["sweeps"]):
+        sweeps.append(dict(state))
+        for ip in rng.sample(list(state), int(len(state) * spec["flap"])):
+            lat, loss = state[ip]
+            state[ip] = (lat, 0.0 if loss >= 1.0 else 1.0)
+    return rows, sweeps
+
+
+def replay_fleet(directory: str, spec: Dict) -> Tuple[List[Dict], List[Dict[str, Tuple[float, float]]]]:
+    """Los CSV grabados (PuntosReportes/*.csv) en orden: cada uno es un barrido de su zona."""
+    rng = random.Random(spec["seed"])
+    median, sigma = spec["latency_ms"]
+    rows: Dict[str, Dict] = {}
+    state: Dict[str, Tuple[float, float]] = {}
+    sweeps = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.csv"))):
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            for rec in csv.DictReader(f):
+                ip = (rec.get("ip") or "").strip()
+                if not ip:
+                    continue
+                rows.setdefault(ip, {"id": len(rows) + 1, "ip": ip, "alias": rec.get("alias") or ip,
+                                     "segment": rec.get("segment") or "General", "active": True})
+                try:
+                    lat = float(rec.get("latency") or "")
+                except ValueError:
+                    lat = median * rng.lognormvariate(0.0, sigma)
+                state[ip] = (lat, 0.0 if str(rec.get("active")).strip().lower() == "true" else 1.0)
+        sweeps.append(dict(state))
+    return list(rows.values()), sweeps
+
+
+def loopback_fleet(spec: Dict) -> Tuple[List[Dict], List[Dict[str, Tuple[float, float]]]]:
+    """IPs reales: los vivos en 127/8 (alias de loopback en Linux), los caídos en 198.18/15 (RFC 2544)."""
+    rows, sweeps = synthetic_fleet(spec)
+    remap = {}
+    for i, row in enumerate(rows):
+        lat, loss = sweeps[0][row["ip"]]
+        remap[row["ip"]] = _ip(i, (198, 18)) if loss >= 1.0 else _ip(i, (127, 1))
+        row["ip"] = remap[row["ip"]]
+    return rows, [{remap[ip]: v for ip, v in s.items()} for s in sweeps[:1]] * len(sweeps)
+
+
+# ============================================================================
+# Prober simulado
+# ============================================================================
+class SimPinger:
+    """Misma interfaz que AsyncPinger.ping_plan; el estado de cada IP viene de la flota."""
+    kind = "sim"
+
+    def __init__(self, fleet: Dict[str, Tuple[float, float]], time_scale: float, seed: int):
+        self.fleet = fleet
+        self.time_scale = time_scale
+        self.rng = random.Random(seed)
+
+    async def ping_plan(self, ip: str, timeouts_ms, segment: Optional[str] = None):
+        latency, loss = self.fleet.get(ip, (0.0, 1.0))
+        for timeout_ms in timeouts_ms:
+            if latency <= timeout_ms and self.rng.random() >= loss:
+                await asyncio.sleep(latency * self.time_scale / 1000.0)
+                return True, latency, "sim_ok"
+            await asyncio.sleep(timeout_ms * self.time_scale / 1000.0)
+        return False, None, "timeout"
+
+
+@asynccontextmanager
+async def sim_prober(fleet: Dict[str, Tuple[float, float]], time_scale: float, seed: int):
+    """Fábrica para los procesos de monitor_shards (cada hijo arma su SimPinger)."""
+    yield SimPinger(fleet, time_scale, seed + os.getpid())
+
+
+# ============================================================================
+# Un escenario (proceso hijo)
+# ============================================================================
+def _peak_rss_mb() -> float:
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024.0 * 1024.0) if sys.platform == "darwin" else peak / 1024.0  # bytes en macOS, KB en Linux
+
+
+def run_scenario(spec: Dict) -> Dict:
+    workdir = tempfile.mkdtemp(prefix="bench_monitor_")
+    os.chdir(workdir)  # OUTPUT_DIR / temp/ relativos: todo queda en el temporal
+    sys.path.insert(0, HERE)
+    try:
+        import monitor_puntos_wpp as mon
+        from monitor_policy import PolicyStats
+        from monitor_records import targets_from_rows
+        mon.JSON_MODE = True
+        mon.log = lambda msg: None
+        mon.ensure_dirs()
+
+        if spec.get("replay"):
+            rows, sweeps = replay_fleet(spec["replay"], spec)
+        elif spec.get("loopback"):
+            rows, sweeps = loopback_fleet(spec)
+        else:
+            rows, sweeps = synthetic_fleet(spec)
+        real_pinger = None
+        if spec.get("loopback") and not spec.get("shards"):
+            import monitor_icmp
+            real_pinger = monitor_icmp.BackgroundPinger(max_in_flight=mon.ASYNC_MAX_IN_FLIGHT)
+
+        per_sweep: List[Dict[str, float]] = []
+        probes_per_s: List[float] = []
+        for n, fleet in enumerate(sweeps):
+            times: Dict[str, float] = {}
+            t0 = time.perf_counter()
+            targets = targets_from_rows(rows, mon.get_exclusions())
+            pages = [targets[i:i + mon.CATALOG_PAGE_SIZE] for i in range(0, len(targets), mon.CATALOG_PAGE_SIZE)]
+            times["catalog"] = time.perf_counter() - t0
+
+            historical = mon.load_state_history()
+            stats = PolicyStats(mon.make_probe_policy())
+            t0 = time.perf_counter()
+            if spec.get("shards"):
+                workers = int(spec["shards"])
+                if spec.get("loopback"):
+                    from monitor_shards import icmp_prober
+                    prober, prober_args = icmp_prober, (max(1, mon.ASYNC_MAX_IN_FLIGHT // workers),)
+                else:
+                    prober, prober_args = sim_prober, (fleet, spec["time_scale"], spec["seed"] + n)
+                results, _ = mon._probe_sharded(targets, historical, stats, None, workers, spec.get("shard_by", "subnet"), prober, prober_args)
+            elif real_pinger is not None:
+                results = real_pinger.run(mon._probe_stream(mon.make_multi_prober(real_pinger.pinger), pages, lambda t: True, historical, stats))
+            else:
+                sim = SimPinger(fleet, spec["time_scale"], spec["seed"] + n)
+                results = asyncio.run(mon._probe_stream(sim, pages, lambda t: True, historical, stats))
+            times["scan"] = time.perf_counter() - t0
+            probed = sum(1 for r in results if not r.excluded)  # hosts sondeados (con todos sus intentos)
+            probes_per_s.append(probed / times["scan"] if times["scan"] > 0 else 0.0)
+
+            for stage, fn in (("state", lambda: mon.update_state_history(results, historical)),
+                              ("archive", lambda: mon.archive_results(results)),
+                              ("events", lambda: mon.observe_transitions(results)),
+                              ("trends", lambda: mon.update_zone_trends(None, results)),
+                              ("report", lambda: mon.build_report_text(results, times["scan"], None, trends=mon._safe_trends(None))),
+                              # zona por barrido: siempre dibuja (un acierto de caché no mide nada)
+                              ("chart", lambda: mon.generate_pie_chart(*mon.count_active(results), zona=f"BENCH {n}"))):
+                t0 = time.perf_counter()
+                fn()
+                times[stage] = time.perf_counter() - t0
+            per_sweep.append(times)
+        if real_pinger is not None:
+            real_pinger.stop()
+
+        steady = per_sweep[1:] or per_sweep
+        out = {f"{s}_s": round(statistics.median(t[s] for t in steady), 4) for s in STAGES}
+        out["total_s"] = round(sum(out[f"{s}_s"] for s in STAGES), 4)
+        out["first_sweep_s"] = round(sum(per_sweep[0].values()), 4)
+        out["probes_per_s"] = round(statistics.median(probes_per_s[1:] or probes_per_s), 1)
+        out["peak_rss_mb"] = round(_peak_rss_mb(), 1)
+        out["targets"] = len(rows)
+        out["sweeps"] = len(sweeps)
+        return out
+    finally:
+        os.chdir(HERE)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def measure(spec: Dict) -> Dict:
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", json.dumps(spec)],
+                          capture_output=True, text=True, cwd=HERE)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip()[-2000:])
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+# ============================================================================
+# Comparación con la línea base
+# ============================================================================
+def compare(got: Dict, base: Optional[Dict], tolerance: Dict[str, float]) -> List[str]:
+    """
+    Regresiones: tiempos por encima de base*(1+time), RSS por encima de base*(1+rss),
+    sondas/s por debajo de base/(1+rate). Las tolerancias son amplias a propósito:
+    se buscan regresiones de orden (un import pesado, algo cuadrático), no el ruido
+    de una máquina compartida.
+    """
+    if not base:
+        return []
+    bad = []
+    for key, value in got.items():
+        ref = base.get(key)
+        if not isinstance(ref, (int, float)) or key in ("targets", "sweeps"):
+            continue
+        if key == "probes_per_s":
+            limit = ref / (1 + tolerance["rate"])
+            if value < limit:
+                bad.append(f"{key} {value:.0f} < {limit:.0f}")
+            continue
+        if key == "peak_rss_mb":
+            limit = ref * (1 + tolerance["rss"])
+        else:
+            limit = max(ref * (1 + tolerance["time"]), ref + tolerance["floor_s"])  # etapas de ms: piso absoluto
+        if value > limit:
+            bad.append(f"{key} {value:.3f} > {limit:.3f}")
+    return bad
+
+
+def _print_row(name: str, r: Dict, status: str) -> None:
+    stages = " ".join(f"{s}={r[f'{s}_s'] * 1000:.0f}" for s in STAGES)
+    print(f"{name:<10} {r['targets']:>6} pts  total {r['total_s'] * 1000:7.0f} ms  "
+          f"{r['probes_per_s']:>9.0f} sondas/s  RSS {r['peak_rss_mb']:6.1f} MB  {status}")
+    print(f"           ms: {stages}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--update", action="store_true", help="Regenera bench_baseline.json con las mediciones actuales")
+    parser.add_argument("--scenarios", help="Lista separada por coma (default: todos los de bench_baseline.json)")
+    parser.add_argument("--replay", nargs="?", const=os.path.join(HERE, "PuntosReportes"), help="Reproducir los CSV de un directorio")
+    parser.add_argument("--loopback", action="store_true", help="Sondas ICMP reales contra loopback (requiere socket ICMP)")
+    parser.add_argument("--shards", type=int, default=0, help="Repartir el scan en N procesos (solo informa)")
+    parser.add_argument("--shard-by", default="subnet", choices=["subnet", "hash"])
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_scenario(json.loads(args.child))))
+        return 0
+
+    with open(BASELINE_FILE, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    tolerance = dict(TOLERANCE_DEFAULTS, **baseline.get("tolerance", {}))
+    scenarios = baseline["scenarios"]
+    names = [s.strip() for s in args.scenarios.split(",")] if args.scenarios else list(scenarios)
+    if args.replay:
+        names = ["replay"]
+        scenarios.setdefault("replay", {"spec": {}})["spec"]["replay"] = os.path.relpath(os.path.abspath(args.replay), HERE)
+    elif args.loopback:
+        names = [f"loopback:{n}" for n in names]
+    if args.shards > 1:
+        names = [f"x{args.shards}:{n}" for n in names]
+
+    failed = False
+    for name in names:
+        key = name.rsplit(":", 1)[-1]
+        if key not in scenarios:
+            print(f"{name:<10} escenario desconocido (definidos: {', '.join(scenarios)})")
+            failed = True
+            continue
+        spec = dict(SCENARIO_DEFAULTS, **scenarios[key].get("spec", {}))
+        if spec.get("replay"):
+            spec["replay"] = os.path.join(HERE, spec["replay"])  # relativo al repo en bench_baseline.json
+        if args.loopback:
+            spec["loopback"] = True
+        if args.shards > 1:
+            spec.update(shards=args.shards, shard_by=args.shard_by)
+        result = measure(spec)
+        # La línea base es del prober simulado en un proceso: loopback y --shards solo informan
+        informative = args.loopback or args.shards > 1
+        base = None if informative else scenarios[key].get("baseline")
+        bad = [] if args.update else compare(result, base, tolerance)
+        _print_row(name, result, "FAIL (" + "; ".join(bad) + ")" if bad else ("OK" if base or args.update else "sin línea base"))
+        failed = failed or bool(bad)
+        if args.update and not informative:
+            scenarios[key]["baseline"] = result
+
+    if args.update:
+        with open(BASELINE_FILE, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"📝 Línea base actualizada en {BASELINE_FILE}")
+        return 0
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
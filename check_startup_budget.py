@@ -0,0 +1,194 @@
+# check_startup_budget.py
+# Mide el arranque de cada punto de entrada de monitor_puntos_wpp.py y lo compara
+# con el presupuesto versionado en startup_budget.json.
+#
+#   python check_startup_budget.py            -> verifica (exit 1 si se pasa)
+#   python check_startup_budget.py --update   -> re-mide y reescribe el presupuesto
+#
+# Cada medición es la línea de comandos real (python monitor_puntos_wpp.py <argv>)
+# en un intérprete nuevo, cronometrada hasta la primera sonda: un hook de auditoría
+# (sitecustomize en un directorio temporal) corta el proceso al crear el primer
+# socket ICMP o lanzar el primer subproceso (ping del sistema, `uptime -s`), antes
+# de que salga un paquete. Así se mide el grafo de imports que de verdad recorre
+# cada punto de entrada, no una lista mantenida a mano.
+# El catálogo sale de un snapshot vigente escrito en un directorio de trabajo
+# temporal: no hace falta red ni Supabase, y no se toca PuntosReportes/ del repo.
+# El presupuesto es lo que cuesta POR ENCIMA de un intérprete vacío (python -c pass,
+# mismo entorno), en rondas intercaladas y con el mínimo de cada serie (el ruido solo
+# suma tiempo). Ese costo se escala por interpreter_ms / intérprete medido ahora: una
+# máquina (o un momento) más lento afecta a los dos por igual y se cancela.
+# Regenerarlo siempre con --update (guarda interpreter_ms y aplica HEADROOM).
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SCRIPT = os.path.join(HERE, "monitor_puntos_wpp.py")
+BUDGET_FILE = os.path.join(HERE, "startup_budget.json")
+RUNS = 7
+HEADROOM = 1.5  # margen al regenerar el presupuesto
+SAMPLE_TARGETS = 50  # puntos del catálogo de prueba (TEST-NET-1: nunca se sondean)
+
+# Se carga en el intérprete medido. Al primer evento de sonda deja en
+# STARTUP_PROBE_OUT los módulos prohibidos ya importados y sale sin más.
+_HOOK = r'''
+import os, sys
+
+def _startup_probe_hook(event, args):
+    if event == "subprocess.Popen" or (event == "socket.__new__" and len(args) >= 4 and args[3] == 1):
+        bad = [m for m in os.environ.get("STARTUP_PROBE_FORBIDDEN", "").split(",") if m and m in sys.modules]
+        with open(os.environ["STARTUP_PROBE_OUT"], "w") as f:
+            f.write(event + "\n" + ",".join(bad))
+        sys.stderr.flush()
+        os._exit(0)
+
+if os.environ.get("STARTUP_PROBE_OUT"):
+    sys.addaudithook(_startup_probe_hook)
+'''
+
+
+class Sandbox:
+    """Directorio temporal con el hook y un snapshot de catálogo vigente."""
+
+    def __init__(self):
+        self.root = tempfile.mkdtemp(prefix="startup_budget_")
+        self.hook_dir = os.path.join(self.root, "hook")
+        self.out = os.path.join(self.root, "probe.out")
+        os.makedirs(self.hook_dir)
+        with open(os.path.join(self.hook_dir, "sitecustomize.py"), "w", encoding="utf-8") as f:
+            f.write(_HOOK)
+
+    def workdir(self) -> str:
+        # Uno nuevo por corrida: sin last_sweep.json ni state.db de la anterior
+        cwd = tempfile.mkdtemp(dir=self.root)
+        from monitor_catalog import CatalogStore, SNAPSHOT_VERSION
+        now = time.time()
+        rows = [[f"192.0.2.{i + 1}", "General", f"Punto {i + 1}", None] for i in range(SAMPLE_TARGETS)]
+        store = CatalogStore(None, None, os.path.join(cwd, "PuntosReportes", "catalog_snapshot.json"), log=lambda *_: None)
+        store.write_snapshot({"version": SNAPSHOT_VERSION, "table": store.table_name, "fetched_at": now, "checked_at": now,
+                              "marker": {"has_updated_at": False}, "rows": rows})
+        return cwd
+
+    def env(self, forbidden) -> dict:
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join([self.hook_dir] + ([env["PYTHONPATH"]] if env.get("PYTHONPATH") else []))
+        env["STARTUP_PROBE_OUT"] = self.out
+        env["STARTUP_PROBE_FORBIDDEN"] = ",".join(forbidden)
+        for var in ("MONITOR_SHARDS", "MONITOR_SCHEDULE", "MONITOR_RESOLVE_DNS"):
+            env.pop(var, None)  # el camino por defecto de cada entrada
+        return env
+
+    def baseline(self) -> float:
+        """ms de un intérprete vacío con el mismo entorno (hook incluido)."""
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], capture_output=True, cwd=self.root, env=self.env([]))
+        return (time.perf_counter() - t0) * 1000.0
+
+    def run(self, argv, forbidden, importtime: bool = False) -> subprocess.CompletedProcess:
+        if os.path.exists(self.out):
+            os.remove(self.out)
+        cmd = [sys.executable] + (["-X", "importtime"] if importtime else []) + [SCRIPT] + list(argv)
+        return subprocess.run(cmd, capture_output=True, text=True, cwd=self.workdir(), env=self.env(forbidden))
+
+    def close(self) -> None:
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+def _probe_once(box: Sandbox, entry: str, argv, forbidden) -> Tuple[float, List[str]]:
+    t0 = time.perf_counter()
+    proc = box.run(argv, forbidden)
+    ms = (time.perf_counter() - t0) * 1000.0
+    if not os.path.exists(box.out):
+        tail = (proc.stderr.strip() or proc.stdout.strip())[-400:]
+        raise RuntimeError(f"{entry}: terminó sin llegar a la primera sonda (exit {proc.returncode}): {tail}")
+    with open(box.out, "r") as f:
+        leaked = f.read().split("\n", 1)[1].strip()
+    return ms, [x for x in leaked.split(",") if x]
+
+
+def measure(box: Sandbox, entries: Dict[str, Dict], runs: int = RUNS) -> Tuple[Dict[str, Tuple[float, List[str]]], float]:
+    """
+    Rondas intercaladas (intérprete vacío + cada entrada): una ráfaga de ruido toca una
+    ronda de todas, no las `runs` muestras de una. Devuelve ({entrada: (ms por encima
+    del intérprete, módulos prohibidos)}, ms del intérprete), con el mínimo de cada serie.
+    """
+    bases: List[float] = []
+    samples: Dict[str, List[float]] = {entry: [] for entry in entries}
+    leaked: Dict[str, List[str]] = {}
+    for _ in range(runs):
+        bases.append(box.baseline())
+        for entry, spec in entries.items():
+            ms, leaked[entry] = _probe_once(box, entry, spec.get("argv", []), spec.get("forbidden", []))
+            samples[entry].append(ms)
+    base = min(bases)
+    return {entry: (max(0.0, min(ms) - base), leaked[entry]) for entry, ms in samples.items()}, base
+
+
+def top_imports(box: Sandbox, argv, limit: int = 8):
+    # Para diagnosticar: los imports más caros del mismo recorrido (python -X importtime)
+    proc = box.run(argv, [], importtime=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2].rstrip()
+        if name.startswith("  "):
+            continue  # solo imports de primer nivel
+        rows.append((int(parts[1]) / 1000.0, name.strip()))
+    return sorted(rows, reverse=True)[:limit]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--update", action="store_true", help="Regenera startup_budget.json con las mediciones actuales")
+    args = parser.parse_args()
+
+    with open(BUDGET_FILE, "r", encoding="utf-8") as f:
+        budget = json.load(f)
+
+    failed = False
+    box = Sandbox()
+    try:
+        measured, base = measure(box, budget["entries"])
+        reference = base if args.update else float(budget.get("interpreter_ms") or base)
+        scale = reference / base
+        print(f"intérprete vacío: {base:.0f} ms (referencia del presupuesto {reference:.0f} ms)")
+        for entry, spec in budget["entries"].items():
+            ms, leaked = measured[entry]
+            ms *= scale
+            limit = float(spec["max_ms"])
+            status = "OK"
+            if leaked:
+                status = f"FAIL (importa {', '.join(leaked)})"
+                failed = True
+            elif ms > limit and not args.update:
+                status = "FAIL (excede presupuesto)"
+                failed = True
+            print(f"{entry:<8} +{ms:7.0f} ms  / presupuesto {limit:6.0f} ms  {status}")
+            if status != "OK":
+                for cost, name in top_imports(box, spec.get("argv", [])):
+                    print(f"           {cost:8.1f} ms  {name}")
+            if args.update:
+                spec["max_ms"] = int(round(ms * HEADROOM, -1))
+    finally:
+        box.close()
+
+    if args.update:
+        budget = dict({"interpreter_ms": round(base, 1)}, **{k: v for k, v in budget.items() if k != "interpreter_ms"})
+        with open(BUDGET_FILE, "w", encoding="utf-8") as f:
+            json.dump(budget, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"📝 Presupuesto actualizado en {BUDGET_FILE}")
+        return 0
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,246 @@
+# monitor_analytics.py
+# Analítica de disponibilidad sobre el historial, vectorizada con NumPy.
+#
+# Por host (guardado en state.db, monitor_state.py):
+#   up_s / down_s  tiempo acumulado de intervalos YA cerrados arriba / abajo
+#   n_down         transiciones arriba -> abajo (fallas)
+#   n_up           transiciones abajo -> arriba (reparaciones); cada una cierra un intervalo de down_s
+#   ewma_avail     EWMA de disponibilidad en tiempo continuo, valor al último cambio
+# Entre transiciones el estado es constante, así que todo se deriva en forma cerrada
+# al consultar (intervalo abierto = ahora - último cambio):
+#   ewma(t) = s + (e0 - s) * exp(-(t - t0) / tau)
+# => cada barrido solo toca los hosts que cambiaron (O(cambios)), y el cálculo de
+#    disponibilidad, EWMA, MTBF, MTTR y flaps es una pasada NumPy sobre el parque.
+#
+# Por zona: monitor_history.json ({zona: {last, ewma, updated_at}}) con EWMA_ALPHA por
+# barrido; de ahí salen las líneas de tendencia del reporte sin costo de escaneo.
+# Percentiles de latencia: desde el archivo columnar (monitor_archive.py).
+#
+#   python monitor_analytics.py [--zona ROZO] [--top 10] [--dias 7]
+import argparse
+import json
+import math
+import os
+import sys
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+from monitor_zones import norm_text
+
+DEFAULT_TAU_S = 24 * 3600.0  # constante de tiempo del EWMA por host
+TREND_DEADBAND = 1.0         # puntos % de diferencia para marcar ↑ / ↓
+
+
+def _ts(s: Optional[str]) -> Optional[float]:
+    if not s:
+        return None
+    try:
+        return datetime.fromisoformat(s).timestamp()
+    except ValueError:
+        return None
+
+
+def ewma_at(e0: Optional[float], state: bool, elapsed_s: float, tau_s: float) -> float:
+    s = 1.0 if state else 0.0
+    e0 = s if e0 is None else float(e0)
+    return s + (e0 - s) * math.exp(-max(0.0, elapsed_s) / tau_s)
+
+
+def close_interval(h: Dict, prev_state: bool, now_iso: str, tau_s: float = DEFAULT_TAU_S) -> None:
+    """
+    Llamado en una transición (prev_state -> not prev_state): cierra el intervalo
+    en curso y congela el EWMA en el instante del cambio. Muta la fila `h`.
+    """
+    start = _ts(h.get("last_state_change")) or _ts(h.get("first_seen"))
+    now = _ts(now_iso)
+    if start is None or now is None:
+        return
+    elapsed = max(0.0, now - start)
+    if prev_state:
+        h["up_s"] = float(h.get("up_s") or 0.0) + elapsed
+        h["n_down"] = int(h.get("n_down") or 0) + 1
+    else:
+        h["down_s"] = float(h.get("down_s") or 0.0) + elapsed
+        h["n_up"] = int(h.get("n_up") or 0) + 1
+    h["ewma_avail"] = round(ewma_at(h.get("ewma_avail"), prev_state, elapsed, tau_s), 6)
+
+
+class HostFrame:
+    """Columnas NumPy armadas desde las filas de estado (una por host)."""
+
+    def __init__(self, history: Mapping[str, Dict], ips: Optional[Iterable[str]] = None):
+        import numpy as np
+        ips = list(history) if ips is None else [ip for ip in ips if ip in history]
+        rows = [history[ip] for ip in ips]
+        self.ips = ips
+        segs = np.array([norm_text(r.get("segment")) or "GENERAL" for r in rows], dtype=object)
+        if len(segs):
+            self.segments, self.seg_code = np.unique(segs, return_inverse=True)
+        else:
+            self.segments, self.seg_code = segs, np.zeros(0, dtype=int)
+        f = lambda k, d=np.nan: np.array([r.get(k) if r.get(k) is not None else d for r in rows], dtype=float)
+        self.state = np.array([bool(r.get("last_state")) for r in rows], dtype=bool)
+        self.known = np.array([r.get("last_state") is not None for r in rows], dtype=bool)
+        self.since = np.array([_ts(r.get("last_state_change")) or _ts(r.get("first_seen")) or np.nan for r in rows], dtype=float)
+        self.first = np.array([_ts(r.get("first_seen")) or np.nan for r in rows], dtype=float)
+        self.up_s = f("up_s", 0.0)
+        self.down_s = f("down_s", 0.0)
+        self.n_down = f("n_down", 0.0)
+        self.n_up = f("n_up", 0.0)
+        self.changes = f("state_changes", 0.0)
+        self.e0 = f("ewma_avail")
+
+    def __len__(self) -> int:
+        return len(self.ips)
+
+
+def host_stats(frame: HostFrame, now: Optional[float] = None, tau_s: float = DEFAULT_TAU_S) -> Dict:
+    """Arrays por host: availability, ewma, mtbf_s, mttr_s, flaps_per_day."""
+    import numpy as np
+    now = datetime.now().timestamp() if now is None else now
+    open_s = np.where(np.isnan(frame.since), 0.0, np.maximum(0.0, now - frame.since))
+    up = frame.up_s + np.where(frame.state, open_s, 0.0)
+    down = frame.down_s + np.where(frame.state, 0.0, open_s)
+    total = up + down
+    s = frame.state.astype(float)
+    e0 = np.where(np.isnan(frame.e0), s, frame.e0)
+    observed_days = np.where(np.isnan(frame.first), np.nan, np.maximum(now - frame.first, 1.0) / 86400.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return {
+            "availability": np.where(total > 0, up / total * 100.0, s * 100.0),
+            "ewma": (s + (e0 - s) * np.exp(-open_s / tau_s)) * 100.0,
+            "mtbf_s": np.where(frame.n_down > 0, frame.up_s / frame.n_down, np.nan),
+            # Sin tiempo caído medido no hay MTTR (no un 0): esos hosts no entran a la media
+            "mttr_s": np.where((frame.n_up > 0) & (frame.down_s > 0), frame.down_s / frame.n_up, np.nan),
+            "flaps_per_day": frame.changes / observed_days,
+        }
+
+
+def segment_stats(frame: HostFrame, stats: Dict) -> Dict[str, Dict]:
+    """Agregado por segmento con bincount (medias de host; online = último estado)."""
+    import numpy as np
+    if not len(frame):
+        return {}
+    n_seg = len(frame.segments)
+    mask = frame.known
+    code = frame.seg_code[mask]
+    hosts = np.bincount(code, minlength=n_seg).astype(float)
+
+    def mean(v):
+        v = v[mask]
+        ok = ~np.isnan(v)
+        num = np.bincount(code[ok], weights=v[ok], minlength=n_seg)
+        den = np.bincount(code[ok], minlength=n_seg)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return num / den
+
+    online = np.bincount(code, weights=frame.state[mask].astype(float), minlength=n_seg)
+    avail, ewma, flaps = mean(stats["availability"]), mean(stats["ewma"]), mean(stats["flaps_per_day"])
+    mtbf, mttr = mean(stats["mtbf_s"]), mean(stats["mttr_s"])
+    out = {}
+    for i, seg in enumerate(frame.segments):
+        if not hosts[i]:
+            continue
+        out[seg] = {
+            "hosts": int(hosts[i]),
+            "online_pct": round(float(online[i] / hosts[i]) * 100.0, 2),
+            "availability": round(float(avail[i]), 2),
+            "ewma": round(float(ewma[i]), 2),
+            "mtbf_h": None if np.isnan(mtbf[i]) else round(float(mtbf[i]) / 3600.0, 1),
+            "mttr_h": None if np.isnan(mttr[i]) else round(float(mttr[i]) / 3600.0, 1),
+            "flaps_per_day": round(float(flaps[i]), 2),
+        }
+    return out
+
+
+def latency_percentiles(archive, days: float = 1.0, zona: Optional[str] = None, q: Tuple[int, ...] = (50, 95, 99)) -> Dict[str, Dict[str, float]]:
+    """Percentiles de latencia (ms) por segmento en los últimos `days` días, desde el archivo columnar."""
+    import numpy as np
+    start = (datetime.now() - timedelta(days=days)).date()
+    data = archive.query(start=start, zona=zona, columns=("ts", "latency", "segment"))
+    if not len(data["ts"]):
+        return {}
+    keep = (data["ts"] >= datetime.now().timestamp() - days * 86400.0) & ~np.isnan(data["latency"])
+    lat, seg = data["latency"][keep], data["segment"][keep]
+    out = {}
+    for s in np.unique(seg):
+        v = lat[seg == s]
+        out[str(s)] = {f"p{p}": round(float(x), 2) for p, x in zip(q, np.percentile(v, q))}
+    return out
+
+
+# ============================================================================
+# TENDENCIA POR ZONA (monitor_history.json)
+# ============================================================================
+
+def load_zone_history(path: str) -> Dict[str, Dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def update_zone_history(path: str, availability: Dict[str, float], alpha: float) -> Dict[str, Dict]:
+    """Un paso de EWMA por zona barrida (O(zonas)). availability: {zona: % en línea}."""
+    history = load_zone_history(path)
+    now = datetime.now().replace(microsecond=0).isoformat()
+    for zona, pct in availability.items():
+        key = norm_text(zona) or "GENERAL"
+        prev = history.get(key, {}).get("ewma")
+        ewma = pct if prev is None else alpha * pct + (1 - alpha) * float(prev)
+        # Sin redondear: la línea de tendencia formatea igual que el encabezado del reporte
+        history[key] = {"last": pct, "ewma": ewma, "updated_at": now}
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(history, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+    return history
+
+
+def trend_line(zona: str, entry: Optional[Dict]) -> Optional[str]:
+    """'PALMIRA 82.7 % (EWMA 79.6 %, ↑)'"""
+    if not entry or entry.get("last") is None or entry.get("ewma") is None:
+        return None
+    last, ewma = float(entry["last"]), float(entry["ewma"])
+    arrow = "↑" if last > ewma + TREND_DEADBAND else ("↓" if last < ewma - TREND_DEADBAND else "→")
+    return f"{norm_text(zona) or 'GENERAL'} {last:.1f} % (EWMA {ewma:.1f} %, {arrow})"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="monitor_analytics.py")
+    parser.add_argument("--zona", default=None)
+    parser.add_argument("--top", type=int, default=10, help="Hosts con peor disponibilidad")
+    parser.add_argument("--dias", type=float, default=1.0, help="Ventana para percentiles de latencia")
+    args = parser.parse_args(argv)
+
+    import numpy as np
+    import monitor_puntos_wpp as mon
+    history = mon.get_state_store().view().load_all()
+    ips = list(history)
+    if args.zona:
+        index = mon.ZoneIndex()
+        ips = [ip for ip in ips if index.in_zone(history[ip].get("segment") or "", args.zona)]
+    frame = HostFrame(history, ips)
+    if not len(frame):
+        print("Sin historial para ese corte.")
+        return 1
+    stats = host_stats(frame)
+    lat = latency_percentiles(mon.get_archive(), days=args.dias, zona=args.zona)
+
+    print(f"{'ZONA':<22}{'hosts':>6}{'online':>8}{'disp.':>8}{'EWMA':>8}{'MTBF h':>8}{'MTTR h':>8}{'flaps/d':>8}{'p50':>7}{'p95':>7}")
+    for seg, s in segment_stats(frame, stats).items():
+        p = lat.get(seg, {})
+        fmt = lambda v: "-" if v is None else f"{v:.1f}"
+        print(f"{seg[:21]:<22}{s['hosts']:>6}{s['online_pct']:>7.1f}%{s['availability']:>7.1f}%{s['ewma']:>7.1f}%"
+              f"{fmt(s['mtbf_h']):>8}{fmt(s['mttr_h']):>8}{s['flaps_per_day']:>8.2f}{fmt(p.get('p50')):>7}{fmt(p.get('p95')):>7}")
+
+    print(f"\nPeores {args.top} hosts (disponibilidad):")
+    for i in np.argsort(stats["availability"])[:args.top]:
+        row = history[frame.ips[i]]
+        print(f"  {row.get('alias') or frame.ips[i]:<30} {stats['availability'][i]:6.1f}%  EWMA {stats['ewma'][i]:5.1f}%  flaps/d {stats['flaps_per_day'][i]:.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
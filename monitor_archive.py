@@ -0,0 +1,340 @@
+# monitor_archive.py
+# Archivo columnar, solo-append, de resultados de escaneo.
+#
+#   PuntosReportes/archive/
+#     reasons.json  aliases.json  imported.json
+#     day=20260129/seg=ROZO/{ts.f8, ip.u4, active.u1, state_change.u1, latency.f4, reason.u2, _rows, meta.json}
+#
+# - Particiones por día y segmento; una columna = un archivo binario plano.
+#   Escribir es un append de bytes (módulo array, sin numpy en el camino del barrido);
+#   leer es np.memmap solo de las columnas y particiones pedidas.
+# - `_rows` guarda cuántas filas están confirmadas; se reescribe al final de cada
+#   append, así un corte a mitad de escritura no deja columnas desalineadas.
+# - backfill: importa en bloque los CSV históricos de PuntosReportes/ (una vez cada uno).
+#
+#   python monitor_archive.py backfill
+#   python monitor_archive.py query --zona ROZO --desde 2026-01-28 --hasta 2026-02-04
+import argparse
+import csv
+import glob
+import json
+import os
+import socket
+import struct
+import sys
+from array import array
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from monitor_records import ScanResult
+from monitor_zones import contains_word, norm_text
+
+# columna -> (typecode de array, dtype numpy)
+COLUMNS: Dict[str, Tuple[str, str]] = {
+    "ts":           ("d", "<f8"),   # scan_time (epoch, s)
+    "ip":           ("I", "<u4"),   # IPv4 empaquetada
+    "active":       ("B", "u1"),
+    "state_change": ("B", "u1"),
+    "latency":      ("f", "<f4"),   # ms, NaN = sin dato
+    "reason":       ("H", "<u2"),   # código en reasons.json
+}
+_EXT = {name: dtype.lstrip("<") for name, (_, dtype) in COLUMNS.items()}
+_NAN = float("nan")
+
+assert array("I").itemsize == 4, "array('I') debe ser de 32 bits"
+
+
+def ip_to_int(ip: str) -> Optional[int]:
+    try:
+        return struct.unpack("!I", socket.inet_aton(ip))[0]
+    except (OSError, TypeError):
+        return None
+
+
+def int_to_ip(n: int) -> str:
+    return socket.inet_ntoa(struct.pack("!I", int(n)))
+
+
+def _slug(segment: str) -> str:
+    n = norm_text(segment) or "GENERAL"
+    return "".join(c if c.isalnum() else "_" for c in n)
+
+
+def _parse_ts(s) -> Optional[float]:
+    try:
+        return datetime.fromisoformat(str(s)).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def _truthy(v) -> bool:
+    return str(v).strip().lower() in ("true", "1", "yes")
+
+
+class ResultArchive:
+    def __init__(self, root: str, log=print):
+        self.root = root
+        self.log = log
+        os.makedirs(root, exist_ok=True)
+        self._reload()
+
+    def _reload(self) -> None:
+        # Otro proceso pudo agregar razones / alias: se relee bajo el lock antes de escribir
+        self._reasons: List[str] = self._load_json("reasons.json", [])
+        self._reason_code = {r: i for i, r in enumerate(self._reasons)}
+        self._aliases: Dict[str, str] = self._load_json("aliases.json", {})
+
+    # ------------------------------------------------------------------ diccionarios
+    @staticmethod
+    def _read_json(path: str, default):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return default
+
+    def _load_json(self, name: str, default):
+        return self._read_json(os.path.join(self.root, name), default)
+
+    def _save_json(self, name: str, data) -> None:
+        path = os.path.join(self.root, name)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+
+    def _code(self, reason: Optional[str]) -> int:
+        reason = reason or ""
+        code = self._reason_code.get(reason)
+        if code is None:
+            code = self._reason_code[reason] = len(self._reasons)
+            self._reasons.append(reason)
+        return code
+
+    def lock(self):
+        from monitor_sweep import FileLock
+        return FileLock(os.path.join(self.root, ".lock"))
+
+    # ------------------------------------------------------------------ escritura
+    def _partition(self, day: str, segment: str) -> str:
+        return os.path.join(self.root, f"day={day}", f"seg={_slug(segment)}")
+
+    @staticmethod
+    def _committed(part: str) -> int:
+        try:
+            with open(os.path.join(part, "_rows"), "r") as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _append_partition(self, part: str, segment: str, cols: Dict[str, array]) -> None:
+        os.makedirs(part, exist_ok=True)
+        rows = self._committed(part)
+        if rows == 0 and not os.path.exists(os.path.join(part, "meta.json")):
+            with open(os.path.join(part, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump({"segment": norm_text(segment) or "GENERAL"}, f, ensure_ascii=False)
+        for name, values in cols.items():
+            path = os.path.join(part, f"{name}.{_EXT[name]}")
+            with open(path, "ab") as f:
+                f.truncate(rows * values.itemsize)  # descarta restos de un append interrumpido
+                f.seek(0, os.SEEK_END)
+                if sys.byteorder != "little":
+                    values = array(values.typecode, values)
+                    values.byteswap()
+                f.write(values.tobytes())
+        n = rows + len(cols["ts"])
+        with open(os.path.join(part, "_rows.tmp"), "w") as f:
+            f.write(str(n))
+        os.replace(os.path.join(part, "_rows.tmp"), os.path.join(part, "_rows"))
+
+    def append_rows(self, rows: Iterable[Tuple[str, str, str, bool, bool, Optional[float], float, Optional[str]]]) -> int:
+        """rows: (segment, ip, alias, active, state_change, latency, ts, reason). Devuelve filas escritas."""
+        rows = list(rows)
+        if not rows:
+            return 0
+        with self.lock():
+            self._reload()
+            return self._append_locked(rows)
+
+    def _append_locked(self, rows: List[Tuple]) -> int:
+        groups: Dict[Tuple[str, str], Tuple[str, Dict[str, array]]] = {}
+        aliases_changed = False
+        n = 0
+        reasons_before = len(self._reasons)
+        for segment, ip, alias, active, state_change, latency, ts, reason in rows:
+            ipn = ip_to_int(ip)
+            if ipn is None or ts is None:
+                continue
+            day = datetime.fromtimestamp(ts).strftime("%Y%m%d")
+            key = (day, _slug(segment))
+            if key not in groups:
+                groups[key] = (segment, {name: array(tc) for name, (tc, _) in COLUMNS.items()})
+            cols = groups[key][1]
+            cols["ts"].append(ts)
+            cols["ip"].append(ipn)
+            cols["active"].append(1 if active else 0)
+            cols["state_change"].append(1 if state_change else 0)
+            cols["latency"].append(_NAN if latency is None else float(latency))
+            cols["reason"].append(self._code(reason))
+            if alias and self._aliases.get(ip) != alias:
+                self._aliases[ip] = alias
+                aliases_changed = True
+            n += 1
+        if not n:
+            return 0
+        if len(self._reasons) != reasons_before:
+            self._save_json("reasons.json", self._reasons)  # antes que las columnas que los usan
+        for (day, _), (segment, cols) in groups.items():
+            self._append_partition(self._partition(day, segment), segment, cols)
+        if aliases_changed:
+            self._save_json("aliases.json", self._aliases)
+        return n
+
+    def append_results(self, results: Sequence[ScanResult]) -> int:
+        return self.append_rows(
+            (r.segment, r.ip, r.alias, r.active, r.state_change, r.latency, _parse_ts(r.scan_time), r.ping_reason)
+            for r in results if not r.excluded
+        )
+
+    # ------------------------------------------------------------------ backfill
+    def backfill(self, csv_dir: str, pattern: str = "*.csv") -> Tuple[int, int]:
+        """Importa los CSV con el esquema histórico que aún no estén en imported.json. (archivos, filas)"""
+        # Todo bajo un solo lock (FileLock no es reentrante: se escribe con _append_locked).
+        # imported.json se lee adentro: dos backfill a la vez no importan el mismo archivo dos veces
+        with self.lock():
+            self._reload()
+            imported = set(self._load_json("imported.json", []))
+            files = [p for p in sorted(glob.glob(os.path.join(csv_dir, pattern))) if os.path.basename(p) not in imported]
+            rows: List[Tuple] = []
+            done: List[str] = []
+            for path in files:
+                # Filas del archivo aparte: si falla a mitad no se escribe nada de él y se
+                # reintenta entero en la próxima corrida (no queda a medias ni duplicado)
+                file_rows: List[Tuple] = []
+                try:
+                    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+                        reader = csv.DictReader(f)
+                        if not {"ip", "active", "scan_time"} <= set(reader.fieldnames or ()):
+                            continue
+                        for r in reader:
+                            if _truthy(r.get("excluded")):
+                                continue
+                            lat = r.get("latency")
+                            file_rows.append((r.get("segment") or "General", (r.get("ip") or "").strip(), r.get("alias"),
+                                              _truthy(r.get("active")), _truthy(r.get("state_change")),
+                                              float(lat) if lat not in (None, "") else None,
+                                              _parse_ts(r.get("scan_time")), r.get("ping_reason")))
+                except (OSError, csv.Error, ValueError) as e:
+                    self.log(f"⚠️  {os.path.basename(path)}: {e}")
+                    continue
+                rows.extend(file_rows)
+                done.append(os.path.basename(path))
+            n = self._append_locked(rows) if rows else 0
+            if done:
+                self._save_json("imported.json", sorted(imported | set(done)))
+        return len(done), n
+
+    # ------------------------------------------------------------------ lectura
+    def partitions(self, start: Optional[date] = None, end: Optional[date] = None, zona: Optional[str] = None) -> List[Tuple[str, str]]:
+        """(ruta, segmento) de las particiones dentro del rango [start, end] y de la zona."""
+        lo = start.strftime("%Y%m%d") if start else None
+        hi = end.strftime("%Y%m%d") if end else None
+        zn = norm_text(zona) if zona else None
+        out = []
+        for day_dir in sorted(glob.glob(os.path.join(self.root, "day=*"))):
+            day = os.path.basename(day_dir)[4:]
+            if (lo and day < lo) or (hi and day > hi):
+                continue
+            for part in sorted(glob.glob(os.path.join(day_dir, "seg=*"))):
+                meta = self._read_json(os.path.join(part, "meta.json"), {})
+                segment = meta.get("segment") or os.path.basename(part)[4:]
+                if zn and not contains_word(segment, zn):
+                    continue
+                out.append((part, segment))
+        return out
+
+    def query(self, start: Optional[date] = None, end: Optional[date] = None, zona: Optional[str] = None,
+              ips: Optional[Iterable[str]] = None, columns: Sequence[str] = ("ts", "ip", "active")):
+        """
+        Corte por rango de fechas / zona / IPs. Solo abre las columnas y particiones
+        necesarias. Devuelve {columna: np.ndarray}; "segment" se puede pedir como columna.
+        """
+        import numpy as np
+        want = [c for c in columns if c != "segment"]
+        read = list(dict.fromkeys(want + (["ip"] if ips is not None else [])))
+        ip_filter = None
+        if ips is not None:
+            ip_filter = np.array([x for x in (ip_to_int(i) for i in ips) if x is not None], dtype="<u4")
+        parts: Dict[str, List] = {c: [] for c in columns}
+        for part, segment in self.partitions(start, end, zona):
+            rows = self._committed(part)
+            if rows == 0:
+                continue
+            cols = {c: np.memmap(os.path.join(part, f"{c}.{_EXT[c]}"), dtype=COLUMNS[c][1], mode="r", shape=(rows,)) for c in read}
+            mask = None
+            if ip_filter is not None:
+                mask = np.isin(cols["ip"], ip_filter)
+                if not mask.any():
+                    continue
+            for c in want:
+                parts[c].append(np.array(cols[c] if mask is None else cols[c][mask]))
+            if "segment" in parts:
+                parts["segment"].append(np.full(int(mask.sum()) if mask is not None else rows, segment, dtype=object))
+        out = {}
+        for c in columns:
+            if parts[c]:
+                out[c] = np.concatenate(parts[c])
+            else:
+                out[c] = np.empty(0, dtype=object if c == "segment" else COLUMNS[c][1])
+        # Rango horario exacto dentro de los días extremos
+        if "ts" in out and (start or end) and len(out["ts"]):
+            lo = datetime.combine(start, datetime.min.time()).timestamp() if start else -np.inf
+            hi = datetime.combine(end + timedelta(days=1), datetime.min.time()).timestamp() if end else np.inf
+            keep = (out["ts"] >= lo) & (out["ts"] < hi)
+            if not keep.all():
+                out = {c: v[keep] for c, v in out.items()}
+        return out
+
+    def reason_names(self) -> List[str]:
+        return list(self._reasons)
+
+    def alias(self, ip: str) -> Optional[str]:
+        return self._aliases.get(ip)
+
+
+def _parse_day(s: Optional[str]) -> Optional[date]:
+    return datetime.strptime(s, "%Y-%m-%d").date() if s else None
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="monitor_archive.py")
+    parser.add_argument("--root", default=os.path.join("PuntosReportes", "archive"))
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    bf = sub.add_parser("backfill", help="Importar los CSV históricos de PuntosReportes/")
+    bf.add_argument("--dir", default="PuntosReportes")
+    q = sub.add_parser("query", help="Disponibilidad por día para una zona / IP")
+    q.add_argument("--zona", default=None)
+    q.add_argument("--ip", action="append", default=None)
+    q.add_argument("--desde", default=None, help="YYYY-MM-DD")
+    q.add_argument("--hasta", default=None, help="YYYY-MM-DD")
+    args = parser.parse_args(argv)
+
+    archive = ResultArchive(args.root)
+    if args.cmd == "backfill":
+        files, rows = archive.backfill(args.dir)
+        print(f"📦 Backfill: {files} CSV, {rows} filas -> {args.root}")
+        return 0
+
+    import numpy as np
+    data = archive.query(_parse_day(args.desde), _parse_day(args.hasta), zona=args.zona, ips=args.ip, columns=("ts", "active"))
+    if not len(data["ts"]):
+        print("Sin datos para ese corte.")
+        return 1
+    days = np.array([datetime.fromtimestamp(t).strftime("%Y-%m-%d") for t in data["ts"]])
+    for d in np.unique(days):
+        m = days == d
+        print(f"{d}  {int(m.sum()):6d} muestras  {data['active'][m].mean() * 100:6.1f}% en línea")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
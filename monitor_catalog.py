@@ -0,0 +1,304 @@
+# monitor_catalog.py
+# Snapshot local del catálogo `puntos_venta` con sincronización incremental.
+#
+# - Proyección: solo se piden ip, segment, alias (+ updated_at / active para el delta).
+# - TTL: dentro de MONITOR_CATALOG_TTL_S no se toca la red.
+# - Vencido el TTL se pide un "marcador" barato (conteo + max(updated_at)):
+#     * igual al del snapshot      -> nada que bajar
+#     * hay updated_at más nuevos  -> delta (solo filas cambiadas, incluye desactivadas)
+#     * conteo no cuadra / sin col -> descarga completa
+# - Si Supabase no responde se sigue escaneando con el último snapshot bueno.
+# - Descargas paginadas con `Range` (sin tope silencioso por max-rows de PostgREST);
+#   stream() entrega página a página para que el escaneo arranque antes de terminar
+#   la descarga, y el snapshot se escribe incrementalmente (memoria ~ tamaño de página).
+# - En memoria el catálogo es una TargetTable (monitor_records): ips uint32 + columnas
+#   de índice. IPs inválidas o repetidas se descartan (y se reportan) al armarla, y las
+#   exclusiones CIDR se marcan una sola vez por carga.
+#
+# Habla PostgREST directo (urllib), así que se puede probar contra un stand-in local.
+import json
+import os
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from monitor_records import ExclusionList, Target, TargetTable
+from monitor_zones import ZoneIndex
+
+SNAPSHOT_VERSION = 1
+_COLUMNS = "ip,segment,alias,updated_at"
+DEFAULT_PAGE_SIZE = 1000
+
+
+class CatalogUnavailable(Exception):
+    """Supabase no respondió y no hay snapshot local para seguir trabajando."""
+
+
+class CatalogStore:
+    def __init__(self, base_url: Optional[str], api_key: Optional[str], snapshot_path: str,
+                 ttl_s: float = 600.0, table: str = "puntos_venta", timeout_s: float = 10.0,
+                 page_size: int = DEFAULT_PAGE_SIZE, keep_in_memory: bool = False,
+                 exclusions: Optional[ExclusionList] = None, log: Callable[[str], None] = lambda msg: None):
+        self.base_url = (base_url or "").rstrip("/")
+        self.api_key = api_key or ""
+        self.snapshot_path = snapshot_path
+        self.ttl_s = float(ttl_s)
+        self.table_name = table
+        self.timeout_s = float(timeout_s)
+        self.page_size = max(1, int(page_size))
+        self.keep_in_memory = keep_in_memory  # modo serve: conservar catálogo completo en RAM
+        self.exclusions = exclusions
+        self.log = log
+        self._snap: Optional[Dict] = None
+        self.targets: Optional[TargetTable] = None  # último catálogo armado (table_name: tabla en PostgREST)
+        self.zone_index: Optional[ZoneIndex] = None  # se arma junto con el catálogo
+        self.last_source = "none"  # snapshot | marker | delta | full | stale
+
+    # ------------------------------------------------------------------
+    # PostgREST
+    # ------------------------------------------------------------------
+    def _get(self, params: Dict[str, str], extra_headers: Optional[Dict[str, str]] = None) -> Tuple[List[Dict], Dict[str, str]]:
+        if not self.base_url or not self.api_key:
+            raise CatalogUnavailable("❌ Faltan credenciales de Supabase en .env")
+        url = f"{self.base_url}/rest/v1/{self.table_name}?{urllib.parse.urlencode(params, safe=',.:*')}"
+        headers = {
+            "apikey": self.api_key,
+            "Authorization": f"Bearer {self.api_key}",
+            "Accept": "application/json",
+        }
+        headers.update(extra_headers or {})
+        req = urllib.request.Request(url, headers=headers)
+        with urllib.request.urlopen(req, timeout=self.timeout_s) as resp:
+            body = resp.read()
+            return (json.loads(body.decode("utf-8")) if body else []), dict(resp.headers)
+
+    @staticmethod
+    def _total_from_headers(headers: Dict[str, str]) -> Optional[int]:
+        # Content-Range: 0-0/1234  (con Prefer: count=exact)
+        cr = headers.get("Content-Range") or headers.get("content-range") or ""
+        total = cr.rsplit("/", 1)[-1] if "/" in cr else ""
+        return int(total) if total.isdigit() else None
+
+    def fetch_marker(self) -> Dict:
+        """Marcador de cambios: {'count': n, 'max_updated_at': str|None, 'has_updated_at': bool}."""
+        try:
+            rows, headers = self._get(
+                {"select": "updated_at", "active": "eq.true", "order": "updated_at.desc.nullslast", "limit": "1"},
+                {"Prefer": "count=exact"},
+            )
+            max_upd = rows[0].get("updated_at") if rows else None
+            return {"count": self._total_from_headers(headers), "max_updated_at": max_upd, "has_updated_at": True}
+        except urllib.error.HTTPError as e:
+            # 400 / 42703: la tabla aún no tiene la columna updated_at
+            if e.code != 400:
+                raise
+        _, headers = self._get({"select": "ip", "active": "eq.true", "limit": "1"}, {"Prefer": "count=exact"})
+        return {"count": self._total_from_headers(headers), "max_updated_at": None, "has_updated_at": False}
+
+    def iter_pages(self, params: Dict[str, str], page_size: Optional[int] = None) -> Iterator[List[Dict]]:
+        """Pagina con `Range: a-b` (orden estable por ip) hasta agotar la tabla."""
+        page_size = page_size or self.page_size
+        params = dict(params, order="ip.asc")
+        offset = 0
+        total: Optional[int] = None
+        while True:
+            headers = {"Range-Unit": "items", "Range": f"{offset}-{offset + page_size - 1}"}
+            if total is None:
+                headers["Prefer"] = "count=exact"
+            rows, resp_headers = self._get(params, headers)
+            if total is None:
+                total = self._total_from_headers(resp_headers)
+            if not rows:
+                return
+            yield rows
+            # Si el servidor recorta por max-rows la página llega corta: seguimos desde ahí
+            offset += len(rows)
+            if total is not None and offset >= total:
+                return
+
+    def fetch_rows(self, params: Dict[str, str]) -> List[Dict]:
+        out: List[Dict] = []
+        for page in self.iter_pages(params):
+            out.extend(page)
+        return out
+
+    def _select(self, has_updated_at: bool, with_active: bool = False) -> str:
+        cols = _COLUMNS if has_updated_at else "ip,segment,alias"
+        return cols + (",active" if with_active else "")
+
+    # ------------------------------------------------------------------
+    # Snapshot en disco
+    # ------------------------------------------------------------------
+    def read_snapshot(self) -> Optional[Dict]:
+        if self._snap is not None:
+            return self._snap
+        try:
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                snap = json.load(f)
+            if snap.get("version") == SNAPSHOT_VERSION and snap.get("table") == self.table_name:
+                self._snap = snap
+        except (OSError, ValueError):
+            pass
+        return self._snap
+
+    def write_snapshot(self, snap: Dict) -> None:
+        self._snap = snap
+        self.targets = None
+        self.zone_index = None
+        os.makedirs(os.path.dirname(self.snapshot_path) or ".", exist_ok=True)
+        tmp = f"{self.snapshot_path}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(snap, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp, self.snapshot_path)
+        except OSError as e:
+            self.log(f"⚠️  No se pudo guardar snapshot de catálogo: {e}")
+
+    @staticmethod
+    def _row_tuple(r: Dict) -> List:
+        ip = str(r.get("ip") or "").strip()
+        return [ip, r.get("segment") or "General", r.get("alias") or ip, r.get("updated_at")]
+
+    def _report(self, table: TargetTable) -> None:
+        problems = table.report()
+        if problems:
+            self.log(f"⚠️  Catálogo: descartadas {problems}")
+
+    def _index_segments(self, segments: List[str]) -> None:
+        # El índice solo memoriza segmentos; las filas por zona salen de la tabla
+        for s in segments:
+            self.zone_index.norm_segment(s)
+
+    def _table_from_snapshot(self, snap: Dict) -> TargetTable:
+        if self.targets is None:
+            self.targets = TargetTable.from_rows(((ip, seg, alias) for ip, seg, alias, _ in snap["rows"]), self.exclusions)
+            self._report(self.targets)
+            self.zone_index = ZoneIndex(keep_targets=False)
+            self._index_segments(self.targets.segments)
+        return self.targets
+
+    # ------------------------------------------------------------------
+    # Sincronización
+    # ------------------------------------------------------------------
+    def _stream_full(self, marker: Dict, seen: Optional[Set[str]]) -> Iterator[List[Target]]:
+        """Descarga completa página a página, escribiendo el snapshot sobre la marcha."""
+        now = time.time()
+        header = {"version": SNAPSHOT_VERSION, "table": self.table_name, "fetched_at": now, "checked_at": now, "marker": marker}
+        os.makedirs(os.path.dirname(self.snapshot_path) or ".", exist_ok=True)
+        tmp = f"{self.snapshot_path}.tmp"
+        kept: List[List] = []
+        table = TargetTable(self.exclusions)
+        self.zone_index = ZoneIndex(keep_targets=False)
+        count = 0
+        with open(tmp, "w", encoding="utf-8") as f:
+            # Cabecera + filas: el JSON final es idéntico al de write_snapshot()
+            f.write(json.dumps(header, ensure_ascii=False, separators=(",", ":"))[:-1] + ',"rows":[')
+            for page in self.iter_pages({"select": self._select(marker["has_updated_at"]), "active": "eq.true"}):
+                rows = [self._row_tuple(r) for r in page]
+                f.write(("," if count else "") + ",".join(json.dumps(r, ensure_ascii=False, separators=(",", ":")) for r in rows))
+                count += len(rows)
+                if seen is not None:
+                    seen.update(r[0] for r in rows)
+                n_segments = len(table.segments)
+                targets = table.add_page((ip, seg, alias) for ip, seg, alias, _ in rows)
+                self._index_segments(table.segments[n_segments:])
+                if self.keep_in_memory:
+                    kept.extend(rows)
+                yield targets
+            f.write("]}")
+        os.replace(tmp, self.snapshot_path)
+        self.log(f"📊 Registros descargados de Supabase: {count}")
+        self._report(table)
+        self.targets = table.seal()  # columnas compactas: se conserva también en one-shot
+        self._snap = dict(header, rows=kept) if self.keep_in_memory else None
+
+    def _delta_refresh(self, snap: Dict, marker: Dict) -> Optional[Dict]:
+        since = snap["marker"].get("max_updated_at")
+        if not since:
+            return None
+        changed = self.fetch_rows({"select": self._select(True, with_active=True), "updated_at": f"gt.{since}"})
+        by_ip = {row[0]: row for row in snap["rows"]}
+        for r in changed:
+            row = self._row_tuple(r)
+            if r.get("active") is False:
+                by_ip.pop(row[0], None)
+            else:
+                by_ip[row[0]] = row
+        if marker.get("count") is not None and len(by_ip) != marker["count"]:
+            # Borrados físicos (sin updated_at que los delate): toca descarga completa
+            return None
+        self.log(f"🔄 Catálogo incremental: {len(changed)} filas cambiadas")
+        now = time.time()
+        return {"version": SNAPSHOT_VERSION, "table": self.table_name, "fetched_at": snap.get("fetched_at", now),
+                "checked_at": now, "marker": marker, "rows": list(by_ip.values())}
+
+    def _sync_incremental(self, force_refresh: bool) -> Tuple[Optional[Dict], Optional[Dict]]:
+        """
+        Todo lo que no requiere descarga completa.
+        Devuelve (snapshot utilizable, None) o (None, marcador) si hay que bajar todo.
+        """
+        snap = self.read_snapshot()
+        now = time.time()
+        if snap and not force_refresh and (now - snap.get("checked_at", 0)) < self.ttl_s:
+            self.last_source = "snapshot"
+            return snap, None
+
+        marker = self.fetch_marker()
+        if snap and not force_refresh and marker["has_updated_at"] and marker == snap.get("marker"):
+            snap["checked_at"] = now
+            self.write_snapshot(snap)
+            self.last_source = "marker"
+            return snap, None
+        if snap and not force_refresh and marker["has_updated_at"]:
+            new_snap = self._delta_refresh(snap, marker)
+            if new_snap is not None:
+                self.write_snapshot(new_snap)
+                self.last_source = "delta"
+                return new_snap, None
+        return None, marker
+
+    def _stale(self, e: Exception) -> Dict:
+        snap = self.read_snapshot()
+        if not snap:
+            raise CatalogUnavailable(f"❌ Error consultando Supabase: {e}")
+        age_min = (time.time() - snap.get("fetched_at", time.time())) / 60
+        self.log(f"⚠️  Supabase no disponible ({e}); usando snapshot de hace {age_min:.0f} min")
+        self.last_source = "stale"
+        return snap
+
+    def stream(self, force_refresh: bool = False) -> Iterator[List[Target]]:
+        """
+        Entrega el catálogo en páginas de Targets. Con snapshot vigente las páginas
+        salen de disco/memoria; si hay que bajar todo, salen de la red a medida que llegan.
+        """
+        try:
+            snap, marker = self._sync_incremental(force_refresh)
+        except (urllib.error.URLError, OSError, ValueError, CatalogUnavailable) as e:
+            snap, marker = self._stale(e), None
+
+        if snap is not None:
+            table = self._table_from_snapshot(snap)
+            for i in range(0, len(table), self.page_size):
+                yield table.slice(i, i + self.page_size)
+            return
+
+        # Descarga completa en streaming; si se cae a mitad, completamos con el snapshot viejo
+        fallback = self.read_snapshot()
+        seen: Optional[Set[str]] = set() if fallback else None
+        self.last_source = "full"
+        try:
+            yield from self._stream_full(marker, seen)
+        except (urllib.error.URLError, OSError, ValueError, CatalogUnavailable) as e:
+            snap = self._stale(e)
+            self.targets = None  # re-arma catálogo e índice desde el snapshot viejo
+            rest = [t for t in self._table_from_snapshot(snap) if seen is None or t.ip not in seen]
+            for i in range(0, len(rest), self.page_size):
+                yield rest[i:i + self.page_size]
+
+    def load(self, force_refresh: bool = False) -> List[Target]:
+        targets: List[Target] = []
+        for page in self.stream(force_refresh=force_refresh):
+            targets.extend(page)
+        return targets
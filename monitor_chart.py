@@ -0,0 +1,266 @@
+# monitor_chart.py
+# Renderizador rápido del gráfico de dona del reporte (reemplaza el Figure de matplotlib por llamada).
+# - Plantilla: fondo, cabecera, línea divisoria, etiquetas y viñetas (Pillow + DejaVu, la
+#   fuente que sí trae la imagen Docker; 'Segoe UI' no existe en Linux y cada texto pagaba
+#   el fallback de fuentes) y las capas de la dona (anillo con antialiasing, ángulo por
+#   píxel, franja de borde) se calculan con NumPy UNA vez y se guardan en
+#   temp/charts/template_v<TEMPLATE_VERSION>/. Los procesos siguientes (cada reporte de
+#   CLI es uno) las leen como PNG y no importan NumPy.
+# - Por llamada solo se compone la dona con operaciones de Pillow sobre esas capas y se
+#   dibujan los textos variables (zona, %, cifras, fecha).
+# - Caché direccionada por contenido: temp/charts/<sha1(activos, inactivos, zona, minuto)>.png
+#   con desalojo por tamaño (los más viejos primero). Sin colisiones entre procesos.
+# Mismo layout que el gráfico original: 6x6 in a 120 dpi (720x720 px).
+import hashlib
+import importlib.util
+import math
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+TEMPLATE_VERSION = 2
+SIZE = 720                  # px (6 in * 120 dpi)
+_PT = 120 / 72.0            # puntos -> px
+
+C_BG = (0x1E, 0x1E, 0x1E)
+C_ON = (0x00, 0xE6, 0x76)
+C_OFF = (0xFF, 0x17, 0x44)
+C_TEXT = (0xFF, 0xFF, 0xFF)
+C_SUB = (0xAA, 0xAA, 0xAA)
+C_LABEL = (0xDD, 0xDD, 0xDD)
+C_RULE = (0x33, 0x33, 0x33)
+C_FOOT = (0x66, 0x66, 0x66)
+
+# Geometría de la dona (equivalente a ax [0.10, 0.38, 0.80, 0.45], radio 1 en límites ±1.25)
+_AX_H = 0.45 * SIZE
+CX, CY = SIZE / 2.0, SIZE - (0.38 * SIZE + _AX_H / 2.0)
+R_OUT = _AX_H / 2.0 / 1.25
+R_IN = R_OUT * (1 - 0.22)
+EDGE = 4 * _PT              # borde del color de fondo entre porciones (wedgeprops linewidth=4)
+
+ROWS_Y = (0.28, 0.20, 0.12)
+THETA_SCALE = 65535 / (2 * math.pi)  # ángulo (rad) -> nivel de la capa de 16 bits
+_LAYERS = ("base", "ring", "theta", "gap")
+
+_FONT_DIRS = ("/usr/share/fonts/truetype/dejavu",)
+
+
+def _y(frac: float) -> float:
+    return SIZE * (1 - frac)
+
+
+def _font_path(bold: bool) -> Optional[str]:
+    name = "DejaVuSans-Bold.ttf" if bold else "DejaVuSans.ttf"
+    dirs = list(_FONT_DIRS)
+    # Las DejaVu que trae matplotlib, sin importar matplotlib
+    spec = importlib.util.find_spec("matplotlib")
+    if spec and spec.submodule_search_locations:
+        dirs.append(os.path.join(list(spec.submodule_search_locations)[0], "mpl-data", "fonts", "ttf"))
+    for d in dirs:
+        p = os.path.join(d, name)
+        if os.path.exists(p):
+            return p
+    return None
+
+
+class DonutRenderer:
+    """
+    template_dir: dónde leer/guardar la plantilla y las capas de la dona (None = solo en
+    memoria). Si están, el arranque es abrir cuatro PNG; si no, se calculan y se guardan.
+    """
+
+    def __init__(self, template_dir: Optional[str] = None):
+        from PIL import Image, ImageChops, ImageDraw, ImageFont
+        self.Image, self.ImageChops, self.ImageDraw, self.ImageFont = Image, ImageChops, ImageDraw, ImageFont
+        self._fonts: Dict[Tuple[bool, int], object] = {}
+        self._paths = {True: _font_path(True), False: _font_path(False)}
+        x0, y0 = int(CX - R_OUT - 2), int(CY - R_OUT - 2)
+        x1, y1 = int(CX + R_OUT + 3), int(CY + R_OUT + 3)
+        self.box = (x0, y0, x1, y1)
+        self.center = (CX - x0, CY - y0)  # centro de la dona en coordenadas de la región
+        self.template_dir = template_dir
+        self.loaded = self._load_layers()
+        if not self.loaded:
+            self.base = self._build_template()
+            self._build_geometry()
+            self._save_layers()
+
+    def font(self, pt: float, bold: bool = False):
+        key = (bold, int(round(pt * _PT)))
+        f = self._fonts.get(key)
+        if f is None:
+            path = self._paths[bold] or self._paths[not bold]
+            f = self.ImageFont.truetype(path, key[1]) if path else self.ImageFont.load_default()
+            self._fonts[key] = f
+        return f
+
+    # ------------------------------------------------------------------ plantilla (una vez)
+    def _build_template(self):
+        img = self.Image.new("RGB", (SIZE, SIZE), C_BG)
+        d = self.ImageDraw.Draw(img)
+        d.text((SIZE / 2, _y(0.93)), "REPORTE DE ESTADO", font=self.font(10, True), fill=C_SUB, anchor="ms")
+        d.text((CX, CY + 0.25 * R_OUT), "ONLINE", font=self.font(12), fill=C_SUB, anchor="mm")
+        d.line([(0.15 * SIZE, _y(0.36)), (0.85 * SIZE, _y(0.36))], fill=C_RULE, width=max(1, int(round(_PT))))
+        for y, label, color in zip(ROWS_Y, ("Total Puntos", "En Línea", "Sin Conexión"), (C_TEXT, C_ON, C_OFF)):
+            d.text((0.15 * SIZE, _y(y)), "●", font=self.font(14), fill=color, anchor="mm")
+            d.text((0.20 * SIZE, _y(y)), label, font=self.font(14), fill=C_LABEL, anchor="lm")
+        return img
+
+    def _build_geometry(self):
+        import numpy as np
+        x0, y0, x1, y1 = self.box
+        ys, xs = np.mgrid[y0:y1, x0:x1].astype(np.float32)
+        dx, dy = xs + 0.5 - CX, ys + 0.5 - CY
+        r = np.hypot(dx, dy)
+        # Anillo con antialiasing por radio (el borde del color de fondo recorta media línea por lado)
+        r_out, r_in = R_OUT - EDGE / 2, R_IN + EDGE / 2
+        ring = np.clip(r_out - r + 0.5, 0, 1) * np.clip(r - r_in + 0.5, 0, 1)
+        # Ángulo en sentido horario desde las 12 (startangle=90, counterclock=False)
+        theta = np.mod(np.arctan2(dx, -dy), 2 * np.pi)
+        # Franja de fondo sobre el radio de las 12; la del otro corte es esta misma rotada
+        gap = np.where(dy < 0, np.clip(EDGE / 2 - np.abs(dx) + 0.5, 0, 1), 0)
+        self.ring = self.Image.fromarray(np.round(ring * 255).astype(np.uint8))
+        self.theta = self.Image.fromarray(np.round(theta * THETA_SCALE).astype(np.uint16))
+        self.gap = self.Image.fromarray(np.round(gap * 255).astype(np.uint8))
+
+    def _layer_path(self, name: str) -> str:
+        return os.path.join(self.template_dir, f"{name}.png")
+
+    def _load_layers(self) -> bool:
+        if not self.template_dir:
+            return False
+        layers = {}
+        try:
+            for name in _LAYERS:
+                with self.Image.open(self._layer_path(name)) as im:
+                    im.load()
+                    layers[name] = im.copy()
+        except (OSError, ValueError):
+            return False  # falta o está a medio escribir: se recalcula
+        size = (self.box[2] - self.box[0], self.box[3] - self.box[1])
+        expected = {"base": ("RGB", (SIZE, SIZE)), "ring": ("L", size), "theta": ("I;16", size), "gap": ("L", size)}
+        if any((layers[n].mode, layers[n].size) != expected[n] for n in _LAYERS):
+            return False
+        self.base, self.ring, self.theta, self.gap = (layers[n] for n in _LAYERS)
+        return True
+
+    def _save_layers(self) -> None:
+        if not self.template_dir:
+            return
+        try:
+            os.makedirs(self.template_dir, exist_ok=True)
+            for name in _LAYERS:
+                path = self._layer_path(name)
+                tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                getattr(self, name).save(tmp, format="PNG")
+                os.replace(tmp, path)
+        except OSError:
+            pass  # sin disco: se recalcula en el próximo proceso
+
+    # ------------------------------------------------------------------ por llamada
+    def render(self, active: int, inactive: int, zona: Optional[str], now: datetime):
+        Image, ImageChops = self.Image, self.ImageChops
+        total = active + inactive
+        frac = active / total
+        img = self.base.copy()
+
+        region = img.crop(self.box)
+        split = 2 * math.pi * frac
+        # theta < split -> 255 (el paso a "L" satura): color encendido
+        level = split * THETA_SCALE
+        on = self.theta.convert("I").point(lambda v: v * -256 + level * 256).convert("L")
+        color = Image.composite(Image.new("RGB", region.size, C_ON), Image.new("RGB", region.size, C_OFF), on)
+        alpha = self.ring
+        if 0 < active and 0 < inactive:
+            gap = self.gap.rotate(-math.degrees(split), resample=Image.BICUBIC, center=self.center)
+            alpha = ImageChops.multiply(alpha, ImageChops.invert(ImageChops.lighter(self.gap, gap)))
+        img.paste(Image.composite(color, region, alpha), self.box[:2])
+
+        d = self.ImageDraw.Draw(img)
+        title = (zona or "GENERAL").upper()
+        if len(title) > 22: title = title[:20] + ".."
+        d.text((SIZE / 2, _y(0.86)), title, font=self.font(24, True), fill=C_TEXT, anchor="ms")
+        d.text((CX, CY - 0.10 * R_OUT), f"{frac * 100:.0f}%", font=self.font(32, True), fill=C_TEXT, anchor="mm")
+        for y, value in zip(ROWS_Y, (total, active, inactive)):
+            d.text((0.85 * SIZE, _y(y)), str(value), font=self.font(16, True), fill=C_TEXT, anchor="rm")
+        d.text((SIZE / 2, _y(0.03)), now.strftime("%d %b %Y, %I:%M %p").upper(), font=self.font(9), fill=C_FOOT, anchor="ms")
+        return img
+
+
+class ChartCache:
+    """PNGs direccionados por contenido en `root`, con tope de tamaño (desaloja los más viejos)."""
+
+    def __init__(self, root: str, max_bytes: int = 50 * 1024 * 1024, min_age_s: float = 600.0):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.min_age_s = min_age_s  # nunca desalojar algo que el bot pueda estar por enviar
+        self._renderer: Optional[DonutRenderer] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(active: int, inactive: int, zona: Optional[str], now: datetime) -> str:
+        raw = f"{TEMPLATE_VERSION}|{active}|{inactive}|{(zona or 'GENERAL').upper()}|{now:%Y%m%d%H%M}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:20]
+
+    def renderer(self) -> DonutRenderer:
+        if self._renderer is None:
+            # Subdirectorio: evict() solo recorre los *.png sueltos de root
+            self._renderer = DonutRenderer(os.path.join(self.root, f"template_v{TEMPLATE_VERSION}"))
+        return self._renderer
+
+    def get(self, active: int, inactive: int, zona: Optional[str] = None, now: Optional[datetime] = None) -> Optional[str]:
+        if active + inactive <= 0:
+            return None
+        now = now or datetime.now()
+        path = os.path.abspath(os.path.join(self.root, f"chart_{self.key(active, inactive, zona, now)}.png"))
+        if os.path.exists(path):
+            os.utime(path)  # LRU por mtime
+            return path
+        os.makedirs(self.root, exist_ok=True)
+        with self._lock:  # Pillow libera el GIL a ratos; la plantilla es compartida
+            img = self.renderer().render(active, inactive, zona, now)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        img.save(tmp, format="PNG", compress_level=1)
+        os.replace(tmp, path)
+        self.evict()
+        return path
+
+    def evict(self) -> int:
+        try:
+            entries = [e for e in os.scandir(self.root) if e.name.endswith(".png")]
+        except OSError:
+            return 0
+        stats = sorted(((e.stat().st_mtime, e.stat().st_size, e.path) for e in entries), reverse=True)
+        total = sum(s for _, s, _ in stats)
+        removed = 0
+        cutoff = time.time() - self.min_age_s
+        while stats and total > self.max_bytes:
+            mtime, size, path = stats.pop()  # el más viejo
+            if mtime > cutoff:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                removed += 1
+            except OSError:
+                pass
+        return removed
+
+    def purge_legacy(self, directory: str, prefix: str = "chart_") -> int:
+        """Borra los PNG sueltos del renderizador anterior (temp/chart_<epoch>.png)."""
+        removed = 0
+        cutoff = time.time() - self.min_age_s
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            return 0
+        for e in entries:
+            if e.is_file() and e.name.startswith(prefix) and e.name.endswith(".png") and e.stat().st_mtime < cutoff:
+                try:
+                    os.remove(e.path)
+                    removed += 1
+                except OSError:
+                    pass
+        return removed
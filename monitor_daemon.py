@@ -0,0 +1,199 @@
+# monitor_daemon.py
+# Modo residente del monitor: `python monitor_puntos_wpp.py serve [...]`
+# - Mantiene en memoria el catálogo de puntos (snapshot + sync incremental), el
+#   historial por IP (state.db) y un prober ICMP caliente.
+# - El bot (src/services/monitor.service.js) consulta por HTTP local o socket Unix
+#   y recibe exactamente el mismo payload que imprime `--json`.
+#
+# Endpoints:
+#   GET  /health
+#   GET  /metrics   (texto Prometheus: fases, RTT, fallos, pool; ver monitor_metrics.py)
+#   GET  /uptime
+#   GET  /report?zona=PALMIRA&tipo=standard[&max_age=60]
+#   POST /report   {"zona": "PALMIRA", "tipo": "standard", "max_age": 60}
+#
+# Pedidos simultáneos no lanzan barridos paralelos: se enganchan al barrido en
+# curso o reutilizan el último dentro de la ventana de frescura (monitor_sweep.py).
+# Con --schedule (o MONITOR_SCHEDULE=1) el catálogo se sondea continuamente y los
+# reportes salen de la foto en memoria (monitor_scheduler.py); max_age=0 fuerza barrido.
+import argparse
+import json
+import os
+import socketserver
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import monitor_icmp
+
+DEFAULT_HOST = os.getenv("MONITOR_DAEMON_HOST", "127.0.0.1")
+DEFAULT_PORT = int(os.getenv("MONITOR_DAEMON_PORT", "8765"))
+
+mon = None                      # módulo monitor_puntos_wpp ya cargado
+_STARTED_AT = time.time()
+
+
+def warm_up() -> None:
+    """Carga todo lo caro una sola vez: cliente, catálogo, historial y prober."""
+    mon.JSON_MODE = True  # logs a stderr, stdout limpio
+    mon.KEEP_STATE_IN_MEMORY = True
+
+    mon._STATE_CACHE = mon.load_state_history()
+    mon.log(f"🧠 Historial en memoria: {len(mon._STATE_CACHE)} IPs")
+
+    try:
+        catalog = mon.fetch_catalog()
+        mon.log(f"📚 Catálogo en memoria: {len(catalog)} puntos (TTL {mon.CATALOG_TTL_S:.0f}s)")
+    except Exception as e:
+        # No es fatal: se reintenta en el primer reporte
+        mon.log(f"⚠️  Catálogo no precargado: {e}")
+
+    if mon.PROBE_ENGINE != "subprocess":
+        try:
+            mon._WARM_PROBER = monitor_icmp.BackgroundPinger(max_in_flight=mon.ASYNC_MAX_IN_FLIGHT, burst=mon.QUALITY_BURST,
+                                                             burst_interval_ms=mon.QUALITY_INTERVAL_MS)
+            mon.log(f"📡 Prober ICMP caliente ({mon._WARM_PROBER.pinger.kind})")
+        except monitor_icmp.ICMPUnavailable as e:
+            mon.log(f"⚠️  ICMP asíncrono no disponible ({e}), se usará ping del sistema")
+
+
+def _parse_max_age(raw) -> Optional[float]:
+    try:
+        return float(raw) if raw not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def run_report(zona: Optional[str], tipo: str, max_age=None) -> Tuple[int, Dict]:
+    zona = zona.strip() if (zona and zona.strip()) else None
+    try:
+        # Sin lock global: monitor_sweep coordina un barrido a la vez
+        return 200, mon.build_report_payload(zona=zona, tipo=tipo or "standard", with_chart=True, max_age_s=_parse_max_age(max_age))
+    except Exception as e:
+        return 500, {"ok": False, "error": str(e)}
+
+
+class MonitorHandler(BaseHTTPRequestHandler):
+    server_version = "MonitorPuntos/1.0"
+
+    def log_message(self, fmt, *args):
+        mon.log("🌐 " + (fmt % args))
+
+    def address_string(self):
+        # En socket Unix client_address es un str vacío
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def _send_json(self, status: int, payload: Dict) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_text(self, status: int, text: str, content_type: str) -> None:
+        body = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self) -> Dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        if length <= 0:
+            return {}
+        try:
+            data = json.loads(self.rfile.read(length).decode("utf-8"))
+            return data if isinstance(data, dict) else {}
+        except Exception:
+            return {}
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        qs = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        if url.path == "/health":
+            return self._send_json(200, {"ok": True, "uptime_s": round(time.time() - _STARTED_AT, 1),
+                                         "sweep": mon.get_sweep_coordinator().status(),
+                                         "scheduler": mon._SCHEDULER.status() if mon._SCHEDULER is not None else None})
+        if url.path == "/metrics":
+            registry = mon.get_metrics_registry()
+            if mon._SCHEDULER is not None:
+                live = mon._SCHEDULER.status()
+                registry.set_gauge("monitor_scheduler_hosts", live["hosts"])
+                registry.set_gauge("monitor_scheduler_probes_per_second", live["probes_per_s"])
+                registry.set_gauge("monitor_scheduler_behind_seconds", live["behind_s"])
+            return self._send_text(200, registry.render(), "text/plain; version=0.0.4; charset=utf-8")
+        if url.path == "/uptime":
+            return self._send_json(200, mon.get_system_uptime())
+        if url.path == "/report":
+            status, payload = run_report(qs.get("zona"), qs.get("tipo", "standard"), qs.get("max_age"))
+            return self._send_json(status, payload)
+        self._send_json(404, {"ok": False, "error": f"ruta no encontrada: {url.path}"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/report":
+            return self._send_json(404, {"ok": False, "error": f"ruta no encontrada: {url.path}"})
+        body = self._read_body()
+        status, payload = run_report(body.get("zona"), body.get("tipo", "standard"), body.get("max_age"))
+        self._send_json(status, payload)
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def main(argv=None, module=None) -> None:
+    global mon
+    if module is None:
+        import monitor_puntos_wpp as module
+    mon = module
+
+    parser = argparse.ArgumentParser(prog="monitor_puntos_wpp.py serve")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix", default=os.getenv("MONITOR_DAEMON_SOCKET"), help="Ruta de socket Unix (en lugar de TCP)")
+    parser.add_argument("--schedule", action="store_true", default=mon.SCHEDULE_ENABLED,
+                        help="Sondeo continuo del catálogo (MONITOR_SCHEDULE=1)")
+    args = parser.parse_args(argv)
+
+    warm_up()
+    if args.schedule:
+        if mon._WARM_PROBER is None:
+            mon.log("⚠️  Sondeo continuo desactivado: requiere el prober ICMP asíncrono")
+        else:
+            try:
+                mon.start_scheduler()
+            except Exception as e:
+                mon.log(f"⚠️  Sondeo continuo no iniciado: {e}")
+
+    if args.unix:
+        if os.path.exists(args.unix):
+            os.unlink(args.unix)
+        server = UnixHTTPServer(args.unix, MonitorHandler)
+        where = f"unix:{args.unix}"
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), MonitorHandler)
+        server.daemon_threads = True
+        where = f"http://{args.host}:{args.port}"
+
+    mon.log(f"✅ Monitor residente escuchando en {where}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if mon._SCHEDULER is not None:
+            mon._SCHEDULER.stop()
+        if mon._WARM_PROBER is not None:
+            mon._WARM_PROBER.stop()
+        if args.unix and os.path.exists(args.unix):
+            os.unlink(args.unix)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
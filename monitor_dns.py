@@ -0,0 +1,335 @@
+# monitor_dns.py
+# Hostnames (PTR) para los puntos, sin alargar el barrido (solo con --resolve-dns).
+#
+# - DnsEnricher corre en un hilo propio con su event loop: recibe IPs a medida que
+#   el catálogo entra al sondeo (submit) y consulta PTR por UDP en lote (un socket,
+#   respuestas emparejadas por id), con un presupuesto duro por barrido.
+# - PtrCache persiste en PuntosReportes/dns_cache.json:
+#     {"version": 1, "entries": {"10.1.2.3": ["pos-01.gane.local", expira], "10.1.2.4": [null, expira]}}
+#   TTL positivo (nombre) y negativo (NXDOMAIN / sin PTR). Un nombre vencido se sigue
+#   mostrando mientras se vuelve a consultar; los timeouts no se guardan.
+# - Al armar el reporte, resolve_hostnames() solo lee lo que ya está listo (caché +
+#   lo resuelto durante el sondeo): no espera a la red.
+# Servidor: MONITOR_DNS_SERVER=ip[:puerto] o el primer nameserver de /etc/resolv.conf
+# (sin ninguno se cae a socket.gethostbyaddr en hilos, con el mismo presupuesto).
+import asyncio
+import json
+import os
+import random
+import socket
+import struct
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+CACHE_VERSION = 1
+QTYPE_PTR = 12
+RCODE_NXDOMAIN = 3
+
+
+# ============================================================================
+# Caché en disco
+# ============================================================================
+class PtrCache:
+    def __init__(self, path: str, ttl_s: float = 86400.0, negative_ttl_s: float = 3600.0):
+        self.path = path
+        self.ttl_s = float(ttl_s)
+        self.negative_ttl_s = float(negative_ttl_s)
+        self.entries: Dict[str, List] = {}   # ip -> [nombre | None, expira (epoch)]
+        self.dirty = False
+        self._mu = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == CACHE_VERSION:
+                self.entries = dict(data.get("entries") or {})
+        except (OSError, ValueError):
+            pass
+
+    def save(self) -> None:
+        with self._mu:
+            if not self.dirty:
+                return
+            data = json.dumps({"version": CACHE_VERSION, "entries": self.entries}, ensure_ascii=False, separators=(",", ":"))
+            self.dirty = False
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp, self.path)
+
+    def name(self, ip: str) -> Optional[str]:
+        """Nombre conocido (aunque esté vencido); None si no hay o el PTR no existe."""
+        entry = self.entries.get(ip)
+        return entry[0] if entry else None
+
+    def fresh(self, ip: str, now: Optional[float] = None) -> bool:
+        entry = self.entries.get(ip)
+        return entry is not None and entry[1] > (now or time.time())
+
+    def put(self, ip: str, name: Optional[str], now: Optional[float] = None) -> None:
+        ttl = self.ttl_s if name else self.negative_ttl_s
+        with self._mu:
+            self.entries[ip] = [name, round((now or time.time()) + ttl)]
+            self.dirty = True
+
+    def prune(self, keep_s: float = 7 * 86400.0) -> int:
+        """Borra entradas vencidas hace más de keep_s (IPs que salieron del catálogo)."""
+        cutoff = time.time() - keep_s
+        with self._mu:
+            old = [ip for ip, (_, exp) in self.entries.items() if exp < cutoff]
+            for ip in old:
+                del self.entries[ip]
+            self.dirty = self.dirty or bool(old)
+        return len(old)
+
+
+# ============================================================================
+# Protocolo DNS (solo lo necesario para PTR)
+# ============================================================================
+def reverse_name(ip: str) -> str:
+    return ".".join(reversed(ip.split("."))) + ".in-addr.arpa"
+
+
+def build_ptr_query(qid: int, ip: str) -> bytes:
+    header = struct.pack("!HHHHHH", qid, 0x0100, 1, 0, 0, 0)  # RD, una pregunta
+    qname = b"".join(bytes([len(label)]) + label.encode("ascii") for label in reverse_name(ip).split(".")) + b"\x00"
+    return header + qname + struct.pack("!HH", QTYPE_PTR, 1)
+
+
+def _read_name(data: bytes, offset: int) -> Tuple[str, int]:
+    """Nombre (con punteros de compresión) y el offset tras el nombre en su posición original."""
+    labels: List[str] = []
+    end = None
+    for _ in range(128):  # tope contra punteros en ciclo
+        length = data[offset]
+        if length & 0xC0 == 0xC0:
+            if end is None:
+                end = offset + 2
+            offset = ((length & 0x3F) << 8) | data[offset + 1]
+            continue
+        offset += 1
+        if length == 0:
+            return ".".join(labels), (end if end is not None else offset)
+        labels.append(data[offset:offset + length].decode("ascii", "replace"))
+        offset += length
+    raise ValueError("nombre DNS inválido")
+
+
+def parse_ptr_response(data: bytes) -> Tuple[int, int, Optional[str]]:
+    """(id, rcode, nombre PTR o None)."""
+    qid, flags, qdcount, ancount, _, _ = struct.unpack("!HHHHHH", data[:12])
+    rcode = flags & 0x000F
+    offset = 12
+    for _ in range(qdcount):
+        _, offset = _read_name(data, offset)
+        offset += 4
+    for _ in range(ancount):
+        _, offset = _read_name(data, offset)
+        rtype, _, _, rdlen = struct.unpack("!HHIH", data[offset:offset + 10])
+        offset += 10
+        if rtype == QTYPE_PTR:
+            name, _ = _read_name(data, offset)
+            return qid, rcode, name.rstrip(".") or None
+        offset += rdlen
+    return qid, rcode, None
+
+
+def system_nameserver(path: str = "/etc/resolv.conf") -> Optional[Tuple[str, int]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0] == "nameserver" and "." in parts[1]:
+                    return parts[1], 53
+    except OSError:
+        pass
+    return None
+
+
+def parse_server(raw: Optional[str]) -> Optional[Tuple[str, int]]:
+    raw = (raw or "").strip()
+    if not raw:
+        return system_nameserver()
+    host, _, port = raw.partition(":")
+    return host, int(port or 53)
+
+
+class _PtrProtocol(asyncio.DatagramProtocol):
+    def __init__(self):
+        self.waiting: Dict[int, asyncio.Future] = {}
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        try:
+            qid, rcode, name = parse_ptr_response(data)
+        except (ValueError, struct.error, IndexError):
+            return
+        fut = self.waiting.pop(qid, None)
+        if fut is not None and not fut.done():
+            fut.set_result((rcode, name))
+
+
+# ============================================================================
+# Enriquecedor en segundo plano
+# ============================================================================
+class DnsEnricher:
+    """
+    submit(ips) desde cualquier hilo; hostname(ip) devuelve lo que haya sin esperar.
+    close() avisa que no llegan más IPs: el hilo termina al vaciar la cola o al
+    agotar el presupuesto, y guarda la caché.
+    """
+
+    def __init__(self, cache: PtrCache, server: Optional[Tuple[str, int]], budget_s: float = 3.0,
+                 timeout_s: float = 1.0, max_in_flight: int = 200, log=lambda msg: None):
+        self.cache = cache
+        self.server = server
+        self.budget_s = max(0.0, float(budget_s))
+        self.timeout_s = float(timeout_s)
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.log = log
+        self.started = time.monotonic()
+        self.deadline = self.started + self.budget_s
+        self.stats = {"cached": 0, "queried": 0, "resolved": 0, "nxdomain": 0, "timeouts": 0}
+        self._seen = set()
+        self._pending: List[str] = []
+        self._mu = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="dns-enricher", daemon=True)
+        self._thread.start()
+
+    # -- API (hilo del barrido) ------------------------------------------------
+    def submit(self, ips: Iterable[str]) -> None:
+        now = time.time()
+        fresh = []
+        with self._mu:
+            for ip in ips:
+                if ip in self._seen:
+                    continue
+                self._seen.add(ip)
+                if self.cache.fresh(ip, now):
+                    self.stats["cached"] += 1
+                else:
+                    fresh.append(ip)
+            self._pending.extend(fresh)
+        if fresh:
+            self._wake.set()
+
+    def close(self) -> None:
+        self._closed = True
+        self._wake.set()
+
+    def hostname(self, ip: str) -> Optional[str]:
+        return self.cache.name(ip)
+
+    def wait(self, timeout_s: Optional[float] = None) -> bool:
+        self._thread.join(timeout_s)
+        return not self._thread.is_alive()
+
+    # -- Hilo ------------------------------------------------------------------
+    def _take(self) -> List[str]:
+        with self._mu:
+            batch, self._pending = self._pending, []
+        return batch
+
+    def _run(self) -> None:
+        try:
+            if self.server is None:
+                self._run_blocking()
+            else:
+                asyncio.run(self._run_async())
+        except Exception as e:
+            self.log(f"⚠️  DNS: {e}")
+        finally:
+            try:
+                self.cache.save()
+            except OSError as e:
+                self.log(f"⚠️  No se pudo guardar la caché DNS: {e}")
+
+    def _remaining(self) -> float:
+        return self.deadline - time.monotonic()
+
+    def _wait_for_work(self) -> bool:
+        """True si hay IPs para consultar; False si se cerró la entrada o venció el presupuesto."""
+        while self._remaining() > 0:
+            with self._mu:
+                if self._pending:
+                    return True
+                if self._closed:
+                    return False
+                self._wake.clear()
+            self._wake.wait(min(0.1, max(0.0, self._remaining())))
+        return False
+
+    async def _run_async(self) -> None:
+        loop = asyncio.get_running_loop()
+        transport, proto = await loop.create_datagram_endpoint(_PtrProtocol, remote_addr=self.server)
+        sem = asyncio.Semaphore(self.max_in_flight)
+        tasks = set()
+
+        async def _lookup(ip: str) -> None:
+            async with sem:
+                for _attempt in range(2):
+                    timeout = min(self.timeout_s, self._remaining())
+                    if timeout <= 0:
+                        return
+                    qid = random.randrange(1, 0xFFFF)
+                    while qid in proto.waiting:
+                        qid = random.randrange(1, 0xFFFF)
+                    fut = loop.create_future()
+                    proto.waiting[qid] = fut
+                    self.stats["queried"] += 1
+                    transport.sendto(build_ptr_query(qid, ip))
+                    try:
+                        rcode, name = await asyncio.wait_for(fut, timeout)
+                    except asyncio.TimeoutError:
+                        proto.waiting.pop(qid, None)
+                        self.stats["timeouts"] += 1
+                        continue
+                    if name or rcode in (0, RCODE_NXDOMAIN):
+                        self.cache.put(ip, name)
+                        self.stats["resolved" if name else "nxdomain"] += 1
+                    return  # SERVFAIL/REFUSED: no se guarda, se reintenta en otro barrido
+
+        try:
+            while await loop.run_in_executor(None, self._wait_for_work):
+                for ip in self._take():
+                    task = asyncio.ensure_future(_lookup(ip))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.wait(set(tasks), timeout=max(0.0, self._remaining()))
+        finally:
+            for task in list(tasks):
+                task.cancel()
+            transport.close()
+
+    def _run_blocking(self) -> None:
+        # Sin servidor configurable: resolver del sistema en hilos (no cancelables: se
+        # abandonan al vencer el presupuesto)
+        from concurrent.futures import ThreadPoolExecutor, wait
+
+        def _lookup(ip: str) -> None:
+            try:
+                self.cache.put(ip, socket.gethostbyaddr(ip)[0])
+                self.stats["resolved"] += 1
+            except socket.herror:
+                self.cache.put(ip, None)
+                self.stats["nxdomain"] += 1
+            except OSError:
+                self.stats["timeouts"] += 1
+
+        pool = ThreadPoolExecutor(max_workers=min(32, self.max_in_flight))
+        futures = []
+        try:
+            while self._wait_for_work():
+                batch = self._take()
+                self.stats["queried"] += len(batch)
+                futures += [pool.submit(_lookup, ip) for ip in batch]
+            if futures:
+                wait(futures, timeout=max(0.0, self._remaining()))
+        finally:
+            pool.shutdown(wait=False)
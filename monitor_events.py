@@ -0,0 +1,224 @@
+# monitor_events.py
+# Eventos de transición (caído / recuperado) con histéresis y amortiguación de flaps,
+# para reportar deltas ("3 caídos, 1 recuperado desde 10:05") en vez del reporte completo.
+#
+# Por host (tabla host_events en state.db, junto a host_state):
+#   observed     último estado sondeado
+#   reported     último estado ANUNCIADO (la primera vez se toma como línea base, sin evento)
+#   pending      estado nuevo esperando confirmación: se anuncia tras `confirm` sondas
+#                seguidas o `hold_s` segundos en ese estado
+#   penalty      puntaje de flaps: +flap_penalty por cada cambio observado y decaimiento
+#                exponencial con vida media half_life_s (route-flap damping, RFC 2439).
+#                Con penalty >= suppress el host queda suprimido (sus transiciones no se
+#                anuncian) hasta que baja de reuse; al liberarse se anuncia un solo evento
+#                si el estado estable difiere del anunciado.
+# Solo se escriben las filas que cambiaron; el decaimiento se calcula al leer.
+# Los eventos confirmados van a event_log; cada consumidor (zona) lleva su cursor.
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from monitor_records import ScanResult
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS host_events (
+    ip            TEXT PRIMARY KEY,
+    alias         TEXT,
+    segment       TEXT,
+    observed      INTEGER,
+    reported      INTEGER,
+    pending       INTEGER,
+    pending_n     INTEGER NOT NULL DEFAULT 0,
+    pending_since REAL,
+    penalty       REAL NOT NULL DEFAULT 0,
+    penalty_at    REAL,
+    suppressed    INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS event_log (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts         REAL NOT NULL,
+    ip         TEXT NOT NULL,
+    alias      TEXT,
+    segment    TEXT,
+    from_state INTEGER,
+    to_state   INTEGER NOT NULL,
+    since      REAL
+);
+CREATE INDEX IF NOT EXISTS ix_event_log_ts ON event_log(ts);
+CREATE TABLE IF NOT EXISTS event_cursor (
+    key TEXT PRIMARY KEY,
+    ts  REAL NOT NULL
+);
+"""
+
+_FIELDS = ("alias", "segment", "observed", "reported", "pending", "pending_n", "pending_since",
+           "penalty", "penalty_at", "suppressed")
+_CHUNK = 500
+
+
+def _b(v) -> Optional[bool]:
+    return None if v is None else bool(v)
+
+
+def _i(v) -> Optional[int]:
+    return None if v is None else int(bool(v))
+
+
+class TransitionTracker:
+    def __init__(self, path: str, confirm: int = 2, hold_s: float = 300.0, flap_penalty: float = 1000.0,
+                 suppress: float = 2000.0, reuse: float = 750.0, half_life_s: float = 900.0,
+                 max_suppress_s: float = 3600.0, retention_s: float = 7 * 86400.0, log=print):
+        self.path = path
+        self.confirm = max(1, int(confirm))
+        self.hold_s = hold_s
+        self.flap_penalty = flap_penalty
+        self.suppress = suppress
+        self.reuse = reuse
+        self.half_life_s = half_life_s
+        # Techo del puntaje: un host suprimido se libera a lo sumo max_suppress_s después de su último flap
+        self.max_penalty = reuse * 2 ** (max_suppress_s / half_life_s)
+        self.retention_s = retention_s
+        self.log = log
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def decayed(self, penalty: float, penalty_at: Optional[float], now: float) -> float:
+        if not penalty or penalty_at is None:
+            return float(penalty or 0.0)
+        return penalty * 0.5 ** (max(0.0, now - penalty_at) / self.half_life_s)
+
+    def _load(self, ips: List[str]) -> Dict[str, Dict]:
+        out: Dict[str, Dict] = {}
+        conn = self._conn()
+        for i in range(0, len(ips), _CHUNK):
+            chunk = ips[i:i + _CHUNK]
+            for row in conn.execute(f"SELECT * FROM host_events WHERE ip IN ({','.join('?' * len(chunk))})", chunk):
+                out[row["ip"]] = {k: row[k] for k in _FIELDS}
+        return out
+
+    def step(self, old: Optional[Dict], result: ScanResult, now: float) -> Tuple[Dict, Optional[Tuple[bool, bool, float]]]:
+        """Un sondeo del host -> (fila nueva, evento (desde, hacia, pendiente_desde) o None)."""
+        state = bool(result.active)
+        h = dict(old) if old else {"observed": None, "reported": None, "pending": None, "pending_n": 0,
+                                   "pending_since": None, "penalty": 0.0, "penalty_at": None, "suppressed": 0}
+        h["alias"], h["segment"] = result.alias, result.segment
+        observed, reported = _b(h["observed"]), _b(h["reported"])
+        h["observed"] = _i(state)
+
+        # Amortiguación: el puntaje solo se materializa cuando hay un flap o se evalúa la supresión
+        penalty = self.decayed(h["penalty"], h["penalty_at"], now)
+        if observed is not None and observed != state:
+            h["penalty"], h["penalty_at"] = min(self.max_penalty, penalty + self.flap_penalty), now
+            penalty = h["penalty"]
+        if penalty >= self.suppress and not h["suppressed"]:
+            h["suppressed"] = 1
+        elif h["suppressed"] and penalty < self.reuse:
+            h["suppressed"], h["penalty"], h["penalty_at"] = 0, 0.0, None
+
+        if reported is None:
+            h["reported"] = _i(state)  # línea base: primer sondeo, sin evento
+            return h, None
+        if state == reported:
+            h["pending"], h["pending_n"], h["pending_since"] = None, 0, None
+            return h, None
+        # Histéresis: estado nuevo sostenido
+        if _b(h["pending"]) != state:
+            h["pending"], h["pending_n"], h["pending_since"] = _i(state), 1, now
+        else:
+            h["pending_n"] = int(h["pending_n"] or 0) + 1
+        held = self.hold_s > 0 and now - float(h["pending_since"] or now) >= self.hold_s
+        if (h["pending_n"] >= self.confirm or held) and not h["suppressed"]:
+            since = h["pending_since"]
+            h["reported"], h["pending"], h["pending_n"], h["pending_since"] = _i(state), None, 0, None
+            return h, (reported, state, since)
+        return h, None
+
+    def observe(self, results: Iterable[ScanResult], now: Optional[float] = None) -> int:
+        """Aplica un barrido. Escribe solo las filas que cambiaron; devuelve eventos disparados."""
+        now = time.time() if now is None else now
+        live = [r for r in results if not r.excluded]
+        rows = self._load([r.ip for r in live])
+        dirty, events = [], []
+        for r in live:
+            old = rows.get(r.ip)
+            h, ev = self.step(old, r, now)
+            if old is None or any(old.get(k) != h.get(k) for k in _FIELDS):
+                dirty.append([r.ip] + [h.get(k) for k in _FIELDS])
+            if ev is not None:
+                events.append((now, r.ip, r.alias, r.segment, _i(ev[0]), _i(ev[1]), ev[2]))
+        if not dirty:
+            return 0
+        cols = ("ip",) + _FIELDS
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                f"INSERT INTO host_events ({','.join(cols)}) VALUES ({','.join('?' * len(cols))}) "
+                "ON CONFLICT(ip) DO UPDATE SET " + ", ".join(f"{c}=excluded.{c}" for c in _FIELDS), dirty)
+            conn.executemany("INSERT INTO event_log (ts, ip, alias, segment, from_state, to_state, since) "
+                             "VALUES (?, ?, ?, ?, ?, ?, ?)", events)
+            conn.execute("DELETE FROM event_log WHERE ts < ?", (now - self.retention_s,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return len(events)
+
+    def compact(self) -> int:
+        """Borra el estado de hosts que ya no están en host_state (ver StateStore.compact)."""
+        conn = self._conn()
+        try:
+            return conn.execute("DELETE FROM host_events WHERE ip NOT IN (SELECT ip FROM host_state)").rowcount
+        except sqlite3.OperationalError:
+            return 0
+
+    # ------------------------------------------------------------------ lectura de deltas
+    def cursor(self, key: str) -> Optional[float]:
+        row = self._conn().execute("SELECT ts FROM event_cursor WHERE key = ?", (key,)).fetchone()
+        return row["ts"] if row else None
+
+    def advance(self, key: str, ts: float) -> None:
+        self._conn().execute("INSERT INTO event_cursor (key, ts) VALUES (?, ?) "
+                             "ON CONFLICT(key) DO UPDATE SET ts = excluded.ts", (key, ts))
+
+    def delta(self, since: float, until: Optional[float] = None, accept=None) -> Dict:
+        """
+        Cambio NETO por host entre `since` y `until`: un host que cayó y volvió dentro
+        de la ventana no aparece. accept(segment) filtra por zona.
+        """
+        until = time.time() if until is None else until
+        rows = self._conn().execute("SELECT * FROM event_log WHERE ts > ? AND ts <= ? ORDER BY ts, id", (since, until))
+        first: Dict[str, sqlite3.Row] = {}
+        last: Dict[str, sqlite3.Row] = {}
+        for row in rows:
+            if accept is not None and not accept(row["segment"] or ""):
+                continue
+            first.setdefault(row["ip"], row)
+            last[row["ip"]] = row
+        down, up = [], []
+        for ip, row in last.items():
+            if first[ip]["from_state"] == row["to_state"]:
+                continue
+            item = {"ip": ip, "alias": row["alias"] or ip, "segment": row["segment"], "at": row["since"] or row["ts"]}
+            (up if row["to_state"] else down).append(item)
+        suppressed = []
+        for row in self._conn().execute("SELECT ip, alias, segment, observed, reported FROM host_events WHERE suppressed = 1"):
+            if accept is None or accept(row["segment"] or ""):
+                suppressed.append({"ip": row["ip"], "alias": row["alias"] or row["ip"], "segment": row["segment"],
+                                   "up": _b(row["observed"])})
+        key = lambda e: (e["at"], e["alias"])
+        return {"since": since, "until": until, "down": sorted(down, key=key), "up": sorted(up, key=key),
+                "suppressed": sorted(suppressed, key=lambda e: e["alias"])}
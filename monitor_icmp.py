@@ -0,0 +1,341 @@
+# monitor_icmp.py
+# Motor ICMP asíncrono (en proceso) para monitor_puntos_wpp.py
+# - Un solo socket ICMP compartido por miles de sondas en vuelo.
+# - SOCK_DGRAM (ping sin privilegios, Linux/macOS) si el kernel lo permite,
+#   SOCK_RAW como alternativa (root / CAP_NET_RAW).
+# - Las respuestas se emparejan por (ip, id, secuencia).
+# - Devuelve la misma tupla (active, latency, reason) que ping_host().
+# - Modo calidad (burst > 1): el primer intento es una ráfaga de echos en tubería y
+#   el resumen (monitor_quality.LinkQuality) queda en AsyncPinger.quality[ip].
+import asyncio
+import os
+import socket
+import struct
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from monitor_quality import LinkQuality, burst_offsets
+
+ICMP_ECHO_REPLY   = 0
+ICMP_UNREACHABLE  = 3
+ICMP_ECHO_REQUEST = 8
+ICMP_TIME_EXCEEDED = 11
+
+_PAYLOAD = b"monitor_puntos".ljust(32, b".")
+
+ProbeResult = Tuple[bool, Optional[float], str]
+
+
+class ICMPUnavailable(OSError):
+    """No se pudo abrir ningún socket ICMP (sin permisos o plataforma no soportada)."""
+
+
+def _checksum(data: bytes) -> int:
+    if len(data) % 2:
+        data += b"\x00"
+    s = sum(struct.unpack("!%dH" % (len(data) // 2), data))
+    s = (s >> 16) + (s & 0xFFFF)
+    s += s >> 16
+    return ~s & 0xFFFF
+
+
+def _build_echo(ident: int, seq: int) -> bytes:
+    header = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, 0, ident, seq)
+    csum = _checksum(header + _PAYLOAD)
+    return struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, csum, ident, seq) + _PAYLOAD
+
+
+def _strip_ip_header(data: bytes) -> bytes:
+    # SOCK_RAW (y SOCK_DGRAM en macOS) entregan la cabecera IP delante del ICMP
+    if data and (data[0] >> 4) == 4:
+        ihl = (data[0] & 0x0F) * 4
+        return data[ihl:]
+    return data
+
+
+def open_icmp_socket() -> Tuple[socket.socket, str]:
+    """Abre un socket ICMP no bloqueante. Devuelve (socket, 'dgram' | 'raw')."""
+    errors = []
+    for kind, sock_type in (("dgram", socket.SOCK_DGRAM), ("raw", socket.SOCK_RAW)):
+        try:
+            sock = socket.socket(socket.AF_INET, sock_type, socket.IPPROTO_ICMP)
+        except (OSError, AttributeError) as e:
+            errors.append(f"{kind}:{e}")
+            continue
+        sock.setblocking(False)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        except OSError:
+            pass
+        return sock, kind
+    raise ICMPUnavailable("; ".join(errors))
+
+
+class AsyncPinger:
+    """
+    Prober ICMP asíncrono. Uso:
+
+        async with AsyncPinger() as pinger:
+            res = await pinger.ping_many(ips, timeout_ms=2000, retries=2)
+    """
+
+    def __init__(self, max_in_flight: int = 2000, burst: int = 0, burst_interval_ms: float = 20.0):
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.burst = max(0, int(burst))  # echos por ráfaga (0/1 = un echo por intento)
+        self.burst_interval_s = max(0.0, float(burst_interval_ms)) / 1000.0
+        self.quality: Dict[str, LinkQuality] = {}  # última ráfaga con respuesta, por ip
+        self.sock: Optional[socket.socket] = None
+        self.kind: Optional[str] = None
+        self.ident = os.getpid() & 0xFFFF
+        self._seq = 0
+        self._pending: Dict[Tuple[str, int], Tuple[asyncio.Future, float]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._sem: Optional[asyncio.Semaphore] = None
+
+    async def __aenter__(self) -> "AsyncPinger":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self.close()
+
+    async def start(self) -> None:
+        if self.sock is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self.sock, self.kind = open_icmp_socket()
+        if self.kind == "dgram":
+            # En SOCK_DGRAM el kernel reescribe el id con el puerto local del socket
+            try:
+                self.ident = self.sock.getsockname()[1] & 0xFFFF
+            except OSError:
+                pass
+        try:
+            self._loop.add_reader(self.sock.fileno(), self._on_readable)
+        except NotImplementedError as e:
+            # ProactorEventLoop (Windows) no soporta add_reader
+            self.close()
+            raise ICMPUnavailable(f"event loop sin add_reader: {e}")
+        self._sem = asyncio.Semaphore(self.max_in_flight)
+
+    def close(self) -> None:
+        if self.sock is None:
+            return
+        try:
+            if self._loop is not None:
+                self._loop.remove_reader(self.sock.fileno())
+        except Exception:
+            pass
+        try:
+            self.sock.close()
+        except Exception:
+            pass
+        self.sock = None
+        for fut, _ in self._pending.values():
+            if not fut.done():
+                fut.cancel()
+        self._pending.clear()
+
+    # ------------------------------------------------------------------
+    # Recepción
+    # ------------------------------------------------------------------
+    def _on_readable(self) -> None:
+        while self.sock is not None:
+            try:
+                data, addr = self.sock.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            self._handle_packet(_strip_ip_header(data), addr[0])
+
+    def _handle_packet(self, icmp: bytes, src: str) -> None:
+        if len(icmp) < 8:
+            return
+        icmp_type, code, _, ident, seq = struct.unpack("!BBHHH", icmp[:8])
+        if icmp_type == ICMP_ECHO_REPLY:
+            if self.kind == "raw" and ident != self.ident:
+                return
+            self._resolve((src, seq), True, None)
+        elif icmp_type in (ICMP_UNREACHABLE, ICMP_TIME_EXCEEDED) and self.kind == "raw":
+            # El error trae la cabecera IP + 8 bytes del echo original
+            inner = icmp[8:]
+            if len(inner) < 28:
+                return
+            ihl = (inner[0] & 0x0F) * 4
+            dst = socket.inet_ntoa(inner[16:20])
+            orig = inner[ihl:ihl + 8]
+            if len(orig) < 8:
+                return
+            o_type, _, _, o_ident, o_seq = struct.unpack("!BBHHH", orig)
+            if o_type != ICMP_ECHO_REQUEST or o_ident != self.ident:
+                return
+            self._resolve((dst, o_seq), False, f"icmp_unreach:{icmp_type}/{code}")
+
+    def _resolve(self, key: Tuple[str, int], ok: bool, reason: Optional[str]) -> None:
+        entry = self._pending.pop(key, None)
+        if entry is None:
+            return
+        fut, sent_at = entry
+        if fut.done():
+            return
+        if ok:
+            fut.set_result((True, (time.perf_counter() - sent_at) * 1000.0, "icmp_ok"))
+        else:
+            fut.set_result((False, None, reason or "icmp_error"))
+
+    # ------------------------------------------------------------------
+    # Envío
+    # ------------------------------------------------------------------
+    def _next_seq(self) -> int:
+        self._seq = (self._seq + 1) & 0xFFFF
+        return self._seq
+
+    async def _send(self, packet: bytes, ip: str) -> None:
+        while True:
+            try:
+                self.sock.sendto(packet, (ip, 0))
+                return
+            except (BlockingIOError, InterruptedError):
+                # Buffer de salida lleno: cedemos el loop y reintentamos
+                await asyncio.sleep(0.001)
+
+    async def ping_once(self, ip: str, timeout_s: float) -> ProbeResult:
+        if self.sock is None:
+            await self.start()
+        seq = self._next_seq()
+        key = (ip, seq)
+        fut = self._loop.create_future()
+        self._pending[key] = (fut, time.perf_counter())
+        try:
+            await self._send(_build_echo(self.ident, seq), ip)
+            return await asyncio.wait_for(fut, timeout_s)
+        except asyncio.TimeoutError:
+            return False, None, "timeout"
+        except OSError as e:
+            return False, None, f"error:{e}"
+        finally:
+            self._pending.pop(key, None)
+
+    async def ping_burst(self, ip: str, count: int, timeout_s: float, interval_s: float = 0.02) -> List[ProbeResult]:
+        """
+        count echos sin esperar respuesta, espaciados interval_s (tope: la mitad del
+        timeout). Todos esperan hasta inicio + timeout_s: la ráfaga no dura más que un intento.
+        """
+        if self.sock is None:
+            await self.start()
+        started = self._loop.time()
+        keys: List[Tuple[str, int]] = []
+        futs: List[asyncio.Future] = []
+        error: Optional[str] = None
+        try:
+            for offset in burst_offsets(count, interval_s, timeout_s):
+                delay = started + offset - self._loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                seq = self._next_seq()
+                fut = self._loop.create_future()
+                self._pending[(ip, seq)] = (fut, time.perf_counter())
+                keys.append((ip, seq))
+                futs.append(fut)
+                try:
+                    await self._send(_build_echo(self.ident, seq), ip)
+                except OSError as e:
+                    error = f"error:{e}"
+                    fut.cancel()
+                    break
+            remaining = started + timeout_s - self._loop.time()
+            live = [f for f in futs if not f.done()]
+            if live and remaining > 0:
+                await asyncio.wait(live, timeout=remaining)
+        finally:
+            for key in keys:
+                self._pending.pop(key, None)
+        out: List[ProbeResult] = []
+        for fut in futs:
+            if fut.done() and not fut.cancelled():
+                out.append(fut.result())
+            else:
+                out.append((False, None, error or "timeout"))
+        return out
+
+    async def _burst_attempt(self, ip: str, timeout_s: float) -> ProbeResult:
+        replies = await self.ping_burst(ip, self.burst, timeout_s, self.burst_interval_s)
+        q = LinkQuality.from_samples([r[1] if r[0] else None for r in replies])
+        if not q.received:
+            self.quality.pop(ip, None)
+            return next((r for r in replies if r[2] != "timeout"), replies[-1])  # unreachable > timeout
+        self.quality[ip] = q
+        return True, q.rtt_avg, "icmp_ok"
+
+    async def ping_plan(self, ip: str, timeouts_ms: Sequence[int]) -> ProbeResult:
+        """Un intento por timeout de la lista (ms), hasta la primera respuesta (en modo calidad, el primero es ráfaga)."""
+        last: ProbeResult = (False, None, "no_attempt")
+        async with self._sem:
+            for n, timeout_ms in enumerate(timeouts_ms):
+                if n == 0 and self.burst > 1:
+                    last = await self._burst_attempt(ip, timeout_ms / 1000.0)
+                else:
+                    last = await self.ping_once(ip, timeout_ms / 1000.0)
+                if last[0]:
+                    return last
+        return last
+
+    async def ping(self, ip: str, timeout_ms: int = 2000, retries: int = 2) -> ProbeResult:
+        return await self.ping_plan(ip, (timeout_ms,) * max(1, int(retries)))
+
+    async def ping_many(self, ips: Iterable[str], timeout_ms: int = 2000, retries: int = 2,
+                        plans: Optional[Dict[str, Sequence[int]]] = None) -> Dict[str, ProbeResult]:
+        if self.sock is None:
+            await self.start()
+        uniq = list(dict.fromkeys(ips))
+        default = (timeout_ms,) * max(1, int(retries))
+        plans = plans or {}
+        results = await asyncio.gather(*(self.ping_plan(ip, plans.get(ip, default)) for ip in uniq))
+        return dict(zip(uniq, results))
+
+
+def ping_many_sync(ips: Iterable[str], timeout_ms: int = 2000, retries: int = 2, max_in_flight: int = 2000,
+                   plans: Optional[Dict[str, Sequence[int]]] = None) -> Dict[str, ProbeResult]:
+    """Atajo síncrono: abre un prober, sondea la lista y lo cierra. Lanza ICMPUnavailable."""
+    async def _run():
+        async with AsyncPinger(max_in_flight=max_in_flight) as pinger:
+            return await pinger.ping_many(ips, timeout_ms=timeout_ms, retries=retries, plans=plans)
+    return asyncio.run(_run())
+
+
+class BackgroundPinger:
+    """
+    Prober "caliente" para procesos residentes (modo serve): mantiene un event loop
+    en un hilo propio con el socket ICMP ya abierto y expone una API síncrona.
+    """
+
+    def __init__(self, max_in_flight: int = 2000, burst: int = 0, burst_interval_ms: float = 20.0):
+        import threading
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="icmp-loop", daemon=True)
+        self._thread.start()
+        self.pinger = AsyncPinger(max_in_flight=max_in_flight, burst=burst, burst_interval_ms=burst_interval_ms)
+        try:
+            self.run(self.pinger.start())
+        except Exception:
+            self.stop()
+            raise
+
+    def run(self, coro, timeout: Optional[float] = None):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result(timeout)
+
+    def submit(self, coro):
+        """Lanza una corrutina de larga duración en el loop del prober (concurrent.futures.Future)."""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def ping_many(self, ips: Iterable[str], timeout_ms: int = 2000, retries: int = 2,
+                  plans: Optional[Dict[str, Sequence[int]]] = None) -> Dict[str, ProbeResult]:
+        return self.run(self.pinger.ping_many(list(ips), timeout_ms=timeout_ms, retries=retries, plans=plans))
+
+    def stop(self) -> None:
+        try:
+            self._loop.call_soon_threadsafe(self.pinger.close)
+        except Exception:
+            pass
+        self._loop.call_soon_threadsafe(self._loop.stop)
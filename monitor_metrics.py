@@ -0,0 +1,278 @@
+# monitor_metrics.py
+# Instrumentación por corrida: tiempos por fase, RTT de sondas, fallos/esperas y
+# uso del pool de sondeo. Dos salidas:
+#   - RunMetrics.summary()  -> bloque "metrics" del payload --json
+#   - Registry.render()     -> texto Prometheus (archivo con --metrics-file /
+#                              MONITOR_METRICS_FILE, o GET /metrics en modo serve)
+# Fases: catalog (descarga de páginas), zone_filter, probe (barrido), dns, history
+# (lectura + escritura de state.db), archive, trends, events, report, chart.
+# Con el catálogo en tubería catalog/zone_filter se solapan con probe: son tiempo
+# acumulado del productor, no tramos consecutivos.
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+PHASES = ("catalog", "zone_filter", "probe", "dns", "history", "archive", "trends", "events", "report", "chart")
+RTT_BUCKETS_MS = (0.25, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000)
+WAIT_BUCKETS_S = (0.1, 0.25, 0.5, 1, 2, 4, 8)
+PHASE_BUCKETS_S = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def failure_class(reason: Optional[str]) -> str:
+    """Motivo de ping_reason -> etiqueta de baja cardinalidad para Prometheus."""
+    reason = str(reason or "")
+    if reason.startswith("unreachable_via:"):
+        return "gateway"
+    if "unreach" in reason:
+        return "unreachable"
+    if reason == "timeout":
+        return "timeout"
+    return "error"
+
+
+def phase(metrics: Optional["RunMetrics"], name: str):
+    """metrics.phase(name), o nada si la corrida no se instrumenta."""
+    return metrics.phase(name) if metrics is not None else nullcontext()
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "total", "n")
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # el último es +Inf
+        self.total = 0.0
+        self.n = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.n += 1
+
+    def merge(self, other: "Histogram") -> None:
+        for i, c in enumerate(other.counts):
+            self.counts[i] += c
+        self.total += other.total
+        self.n += other.n
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Aproximado: límite superior del bucket que contiene el cuantil (el último si cae en +Inf)."""
+        if not self.n:
+            return None
+        rank, acc = q * self.n, 0
+        for i, c in enumerate(self.counts):
+            acc += c
+            if acc >= rank:
+                return self.buckets[min(i, len(self.buckets) - 1)]  # JSON no admite Infinity
+        return None
+
+
+class PoolTracker:
+    """Cola y ocupación del pool de sondeo (workers asyncio o hilos)."""
+
+    def __init__(self, kind: str, size: int):
+        self.kind = kind
+        self.size = max(1, size)
+        self.busy = 0
+        self.busy_s = 0.0
+        self.depth_max = 0
+        self._depth_sum = 0
+        self._depth_n = 0
+        self.started = time.perf_counter()
+        self.wall_s = 0.0
+        self._mu = threading.Lock()
+
+    def sample_depth(self, depth: int) -> None:
+        self.depth_max = max(self.depth_max, depth)
+        self._depth_sum += depth
+        self._depth_n += 1
+
+    @contextmanager
+    def task(self):
+        t0 = time.perf_counter()
+        with self._mu:
+            self.busy += 1
+        try:
+            yield
+        finally:
+            with self._mu:
+                self.busy -= 1
+                self.busy_s += time.perf_counter() - t0
+
+    def close(self) -> None:
+        self.wall_s = time.perf_counter() - self.started
+
+    def summary(self) -> Dict:
+        wall = self.wall_s or (time.perf_counter() - self.started)
+        return {
+            "pool": self.kind,
+            "size": self.size,
+            "utilization": round(self.busy_s / (self.size * wall), 3) if wall > 0 else 0.0,
+            "queue_max": self.depth_max,
+            "queue_avg": round(self._depth_sum / self._depth_n, 1) if self._depth_n else 0.0,
+        }
+
+
+class RunMetrics:
+    """Una corrida (barrido o reporte). Acumula; no es compartida entre corridas."""
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self.rtt = Histogram(RTT_BUCKETS_MS)
+        self.wait = Histogram(WAIT_BUCKETS_S)
+        self.failures: Dict[str, int] = {}
+        self.pool: Optional[PoolTracker] = None
+        self._mu = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - t0)
+
+    def add(self, name: str, seconds: float) -> None:
+        with self._mu:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def start_pool(self, kind: str, size: int) -> PoolTracker:
+        self.pool = PoolTracker(kind, size)
+        return self.pool
+
+    def record(self, result, plan: Tuple[int, ...] = ()) -> None:
+        """Un ScanResult: RTT si respondió; si no, motivo y espera gastada (suma del plan)."""
+        if result.excluded:
+            return
+        if result.active:
+            if result.latency is not None:
+                self.rtt.observe(float(result.latency))
+            return
+        with self._mu:
+            cls = failure_class(result.ping_reason)
+            self.failures[cls] = self.failures.get(cls, 0) + 1
+        if plan:
+            self.wait.observe(sum(plan) / 1000.0)
+
+    def record_many(self, results: Iterable, plans: Optional[Dict[str, Tuple[int, ...]]] = None) -> None:
+        plans = plans or {}
+        for r in results:
+            self.record(r, plans.get(r.ip, ()))
+
+    def summary(self) -> Dict:
+        q = lambda h, p: (None if h.quantile(p) is None else round(h.quantile(p), 3))
+        out = {
+            "phases_s": {k: round(v, 4) for k, v in sorted(self.phases.items(), key=lambda kv: PHASES.index(kv[0]) if kv[0] in PHASES else 99)},
+            "probe": {
+                "answered": self.rtt.n,
+                "rtt_ms": {"avg": round(self.rtt.total / self.rtt.n, 2) if self.rtt.n else None,
+                           "p50": q(self.rtt, 0.5), "p90": q(self.rtt, 0.9), "p99": q(self.rtt, 0.99)},
+                "failures": dict(sorted(self.failures.items())),
+                "wait_s": round(self.wait.total, 2),
+            },
+        }
+        if self.pool is not None:
+            out["workers"] = self.pool.summary()
+        return out
+
+
+# ============================================================================
+# Registro acumulado (Prometheus)
+# ============================================================================
+def _fmt(v: float) -> str:
+    return "+Inf" if v == float("inf") else "%g" % v
+
+
+def _labels(**kw) -> str:
+    items = [f'{k}="{str(v)}"' for k, v in kw.items() if v is not None]
+    return "{" + ",".join(items) + "}" if items else ""
+
+
+class Registry:
+    """Acumula corridas para el formato de texto de Prometheus (contadores monótonos)."""
+
+    def __init__(self):
+        self._mu = threading.Lock()
+        self.runs: Dict[str, int] = {}  # kind -> corridas ("sweep" / "report")
+        self.phase_hist: Dict[str, Histogram] = {}
+        self.rtt = Histogram(RTT_BUCKETS_MS)
+        self.wait = Histogram(WAIT_BUCKETS_S)
+        self.failures: Dict[str, int] = {}
+        self.last_pool: Optional[Dict] = None
+        self.last_phases: Dict[str, Dict[str, float]] = {}  # kind -> fases de la última corrida de ese tipo
+        self.last_run_ts = 0.0
+        self.gauges: Dict[str, float] = {}  # métricas sueltas (p. ej. hosts del sondeo continuo)
+
+    def observe(self, run: RunMetrics, kind: str = "sweep") -> None:
+        with self._mu:
+            self.runs[kind] = self.runs.get(kind, 0) + 1
+            self.last_run_ts = time.time()
+            for k, v in run.phases.items():
+                self.phase_hist.setdefault(k, Histogram(PHASE_BUCKETS_S)).observe(v)
+            self.last_phases[kind] = dict(run.phases)
+            self.rtt.merge(run.rtt)
+            self.wait.merge(run.wait)
+            for k, v in run.failures.items():
+                self.failures[k] = self.failures.get(k, 0) + v
+            if run.pool is not None:
+                self.last_pool = run.pool.summary()
+
+    def set_gauge(self, name: str, value: float) -> None:
+        with self._mu:
+            self.gauges[name] = value
+
+    def render(self) -> str:
+        out: List[str] = []
+
+        def hist(name: str, h: Histogram, labels: Dict = None) -> None:
+            labels = labels or {}
+            acc = 0
+            for b, c in zip(list(h.buckets) + [float("inf")], h.counts):
+                acc += c
+                out.append(f"{name}_bucket{_labels(**labels, le=_fmt(b))} {acc}")
+            out.append(f"{name}_sum{_labels(**labels)} {round(h.total, 6)}")
+            out.append(f"{name}_count{_labels(**labels)} {h.n}")
+
+        with self._mu:
+            out += ["# HELP monitor_runs_total Corridas registradas por tipo (barrido o reporte).",
+                    "# TYPE monitor_runs_total counter"]
+            out += [f"monitor_runs_total{_labels(kind=k)} {n}" for k, n in sorted(self.runs.items())]
+            out += ["# HELP monitor_last_run_timestamp_seconds Fin de la última corrida.",
+                    "# TYPE monitor_last_run_timestamp_seconds gauge", f"monitor_last_run_timestamp_seconds {round(self.last_run_ts, 3)}"]
+            out += ["# HELP monitor_phase_seconds Duración por fase de cada corrida.", "# TYPE monitor_phase_seconds histogram"]
+            for phase in sorted(self.phase_hist, key=lambda p: PHASES.index(p) if p in PHASES else 99):
+                hist("monitor_phase_seconds", self.phase_hist[phase], {"phase": phase})
+            out += ["# HELP monitor_last_phase_seconds Duración por fase de la última corrida de cada tipo.", "# TYPE monitor_last_phase_seconds gauge"]
+            for kind, phases in sorted(self.last_phases.items()):
+                for name, v in phases.items():
+                    out.append(f"monitor_last_phase_seconds{_labels(kind=kind, phase=name)} {round(v, 6)}")
+            out += ["# HELP monitor_probe_rtt_milliseconds RTT de las sondas respondidas.", "# TYPE monitor_probe_rtt_milliseconds histogram"]
+            hist("monitor_probe_rtt_milliseconds", self.rtt)
+            out += ["# HELP monitor_probe_wait_seconds Espera gastada en hosts sin respuesta (suma de timeouts).", "# TYPE monitor_probe_wait_seconds histogram"]
+            hist("monitor_probe_wait_seconds", self.wait)
+            out += ["# HELP monitor_probe_failures_total Hosts sin respuesta por motivo.", "# TYPE monitor_probe_failures_total counter"]
+            for cls, n in sorted(self.failures.items()):
+                out.append(f"monitor_probe_failures_total{_labels(reason=cls)} {n}")
+            if self.last_pool is not None:
+                pool = self.last_pool["pool"]
+                out += ["# HELP monitor_pool_size Workers del pool de sondeo (última corrida).", "# TYPE monitor_pool_size gauge",
+                        f"monitor_pool_size{_labels(pool=pool)} {self.last_pool['size']}",
+                        "# HELP monitor_pool_utilization Fracción del tiempo con workers ocupados (última corrida).", "# TYPE monitor_pool_utilization gauge",
+                        f"monitor_pool_utilization{_labels(pool=pool)} {self.last_pool['utilization']}",
+                        "# HELP monitor_pool_queue_depth Profundidad de la cola de targets (última corrida).", "# TYPE monitor_pool_queue_depth gauge",
+                        f"monitor_pool_queue_depth{_labels(pool=pool, stat='max')} {self.last_pool['queue_max']}",
+                        f"monitor_pool_queue_depth{_labels(pool=pool, stat='avg')} {self.last_pool['queue_avg']}"]
+            for name, v in sorted(self.gauges.items()):
+                out += [f"# TYPE {name} gauge", f"{name} {v}"]
+        return "\n".join(out) + "\n"
+
+    def write(self, path: str) -> None:
+        """Escritura atómica (el textfile collector de node_exporter lee el archivo entero)."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp, path)
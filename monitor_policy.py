@@ -0,0 +1,118 @@
+# monitor_policy.py
+# Timeouts y reintentos por host a partir del historial por IP (monitor_state.py).
+# - Timeout: k * (lat_ewma + 4 * lat_dev), acotado a [piso, techo]. Es el mismo
+#   estimador que usa TCP para su RTO (media + 4 desviaciones ~ p99 de la latencia).
+# - Reintentos: un host caído hace más de MONITOR_OUTAGE_S recibe una sola sonda
+#   rápida; el resto conserva el presupuesto base y los reintentos confirman con
+#   el timeout base (un host estable no se marca caído por un pico de latencia).
+# - PolicyStats estima cuánto tiempo de espera se ahorró frente a la política fija.
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from monitor_records import ScanResult
+
+ProbePlan = Tuple[int, ...]  # timeout (ms) de cada intento
+
+
+def update_latency_stats(entry: Dict, latency_ms: float, alpha: float) -> None:
+    """EWMA de la latencia y de su desviación absoluta, guardadas en el historial del host."""
+    lat = float(latency_ms)
+    ewma = entry.get("lat_ewma")
+    if ewma is None:
+        entry["lat_ewma"] = round(lat, 2)
+        entry["lat_dev"] = round(lat / 2.0, 2)
+        return
+    dev = float(entry.get("lat_dev") or 0.0)
+    entry["lat_dev"] = round((1 - alpha) * dev + alpha * abs(lat - ewma), 2)
+    entry["lat_ewma"] = round((1 - alpha) * ewma + alpha * lat, 2)
+
+
+def _parse_iso(s: Optional[str]) -> Optional[datetime]:
+    if not s:
+        return None
+    try:
+        return datetime.fromisoformat(s)
+    except ValueError:
+        return None
+
+
+class ProbePolicy:
+    def __init__(self, base_timeout_ms: int = 2000, base_retries: int = 2, adaptive: bool = True,
+                 k: float = 3.0, floor_ms: int = 300, cap_ms: Optional[int] = None, outage_s: float = 3600.0):
+        self.base_timeout_ms = int(base_timeout_ms)
+        self.base_retries = max(1, int(base_retries))
+        self.adaptive = adaptive
+        self.k = k
+        self.floor_ms = int(floor_ms)
+        self.cap_ms = int(cap_ms or base_timeout_ms)
+        self.outage_s = outage_s
+        self._now = datetime.now()
+
+    def baseline(self) -> ProbePlan:
+        return (self.base_timeout_ms,) * self.base_retries
+
+    def timeout_for(self, entry: Optional[Dict]) -> int:
+        if not entry or entry.get("lat_ewma") is None:
+            return self.base_timeout_ms
+        rto = self.k * (float(entry["lat_ewma"]) + 4.0 * float(entry.get("lat_dev") or 0.0))
+        return int(min(self.cap_ms, max(self.floor_ms, rto)))
+
+    def outage_for(self, entry: Optional[Dict]) -> float:
+        """Segundos que lleva caído el host (0 si está arriba o no hay datos)."""
+        if not entry or entry.get("last_state") is not False:
+            return 0.0
+        since = _parse_iso(entry.get("last_seen_active")) or _parse_iso(entry.get("first_seen"))
+        return (self._now - since).total_seconds() if since else 0.0
+
+    def plan(self, entry: Optional[Dict]) -> ProbePlan:
+        if not self.adaptive:
+            return self.baseline()
+        first = self.timeout_for(entry)
+        outage = self.outage_for(entry)
+        if outage > 0 and outage >= self.outage_s:
+            return (min(first, self.base_timeout_ms),)  # caído hace rato: una sonda rápida
+        return (first,) + (self.cap_ms,) * (self.base_retries - 1)
+
+    def plans(self, ips: Iterable[str], history: Dict) -> Dict[str, ProbePlan]:
+        return {ip: self.plan(history.get(ip)) for ip in ips}
+
+
+class PolicyStats:
+    """Espera gastada vs. la que habría gastado la política fija (solo hosts sin respuesta)."""
+
+    def __init__(self, policy: ProbePolicy):
+        self.policy = policy
+        self.base_ms: List[int] = []
+        self.actual_ms: List[int] = []
+        self.fast_probes = 0
+        self.short_circuited = 0  # hosts detrás de un gateway caído (monitor_topology)
+        self.parallel = 1  # sondas simultáneas del motor que corrió el barrido
+
+    def record(self, result: ScanResult, plan: ProbePlan) -> None:
+        if result.excluded:
+            return
+        if not plan:
+            self.short_circuited += 1
+        elif len(plan) < self.policy.base_retries:
+            self.fast_probes += 1
+        # Un host que respondió (o devolvió unreachable) cuesta lo mismo con ambas políticas
+        if result.active or str(result.ping_reason or "").startswith(("icmp_unreach", "tcp_unreach")):
+            return
+        self.base_ms.append(sum(self.policy.baseline()))
+        self.actual_ms.append(sum(plan))
+
+    def summary(self) -> Dict:
+        """Tiempo de pared estimado = max(host más lento, espera total / sondas simultáneas)."""
+        def wall(costs: List[int]) -> float:
+            if not costs:
+                return 0.0
+            return max(max(costs), sum(costs) / max(1, self.parallel)) / 1000.0
+
+        return {
+            "adaptive": self.policy.adaptive,
+            "unanswered": len(self.base_ms),
+            "fast_probes": self.fast_probes,
+            "short_circuited": self.short_circuited,
+            "wait_saved_s": round((sum(self.base_ms) - sum(self.actual_ms)) / 1000.0, 1),
+            "wall_saved_s": round(wall(self.base_ms) - wall(self.actual_ms), 1),
+        }
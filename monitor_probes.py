@@ -0,0 +1,242 @@
+# monitor_probes.py
+# Sondas por protocolo sobre el mismo event loop que el motor ICMP (monitor_icmp.py).
+# Algunos routers de los puntos descartan ICMP: para ellos se usa TCP connect o un
+# HEAD HTTP liviano. Mapa opcional junto al catálogo:
+#   PuntosReportes/probes.json   (o MONITOR_PROBES)
+#   {"default": "icmp",
+#    "segments": {"ROZO": "tcp:80"},
+#    "hosts": {"10.100.3.7": "http:8080/status", "10.100.3.9": "https"}}
+# Especificaciones: icmp | tcp:<puerto> | http[:<puerto>][/ruta] | https[:<puerto>][/ruta]
+# Precedencia: host > segmento > default. Segmentos comparados con norm_text (como el catálogo).
+# Todas devuelven la misma tupla (active, latency_ms, reason) que ping_host():
+#   tcp   "tcp_ok" (handshake completo) / "tcp_refused" (RST: el host está arriba)
+#   http  "http_<status>" (cualquier respuesta HTTP cuenta como vivo)
+#   caído "timeout" / "tcp_unreach:<errno>" / "error:<detalle>"
+# Un plan (timeouts en ms, monitor_policy) es un intento por timeout hasta el primer éxito.
+import asyncio
+import errno
+import json
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from monitor_zones import norm_text
+
+ProbeResult = Tuple[bool, Optional[float], str]
+KINDS = ("icmp", "tcp", "http", "https")
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+_UNREACH = {errno.EHOSTUNREACH, errno.ENETUNREACH}
+
+
+class ProbeSpec:
+    __slots__ = ("kind", "port", "path")
+
+    def __init__(self, kind: str = "icmp", port: Optional[int] = None, path: str = "/"):
+        if kind not in KINDS:
+            raise ValueError(f"tipo de sonda desconocido: {kind!r}")
+        if kind == "tcp" and not port:
+            raise ValueError("la sonda tcp requiere puerto (tcp:<puerto>)")
+        self.kind = kind
+        self.port = port or _DEFAULT_PORTS.get(kind)
+        self.path = path or "/"
+
+    @classmethod
+    def parse(cls, text: str) -> "ProbeSpec":
+        text = str(text or "").strip() or "icmp"
+        kind, _, rest = text.partition(":")
+        kind = kind.lower()  # la ruta HTTP conserva mayúsculas
+        if kind in ("http", "https") and rest.startswith("/"):
+            return cls(kind, None, rest)
+        port, slash, path = rest.partition("/")
+        try:
+            return cls(kind, int(port) if port else None, slash + path)
+        except ValueError as e:
+            raise ValueError(f"sonda inválida {text!r}: {e}")
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, ProbeSpec) and (self.kind, self.port, self.path) == (other.kind, other.port, other.path)
+
+    def __hash__(self) -> int:
+        return hash((self.kind, self.port, self.path))
+
+    def __str__(self) -> str:
+        if self.kind == "icmp":
+            return "icmp"
+        if self.kind == "tcp":
+            return f"tcp:{self.port}"
+        return f"{self.kind}:{self.port}{self.path}"
+
+
+ICMP = ProbeSpec("icmp")
+
+
+class ProbeMap:
+    def __init__(self, default: ProbeSpec = ICMP, segments: Optional[Dict[str, ProbeSpec]] = None,
+                 hosts: Optional[Dict[str, ProbeSpec]] = None):
+        self.default = default
+        self.segments = {norm_text(k): v for k, v in (segments or {}).items()}
+        self.hosts = dict(hosts or {})
+
+    @classmethod
+    def load(cls, path: str) -> Optional["ProbeMap"]:
+        """None si no hay archivo (todo ICMP)."""
+        if not path or not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(ProbeSpec.parse(data.get("default", "icmp")),
+                   {k: ProbeSpec.parse(v) for k, v in (data.get("segments") or {}).items()},
+                   {k: ProbeSpec.parse(v) for k, v in (data.get("hosts") or {}).items()})
+
+    def __bool__(self) -> bool:
+        # Solo vale la pena despachar si algo no es ICMP
+        return (self.default.kind != "icmp" or any(s.kind != "icmp" for s in self.segments.values())
+                or any(s.kind != "icmp" for s in self.hosts.values()))
+
+    def spec_for(self, ip: str, segment: Optional[str] = None) -> ProbeSpec:
+        spec = self.hosts.get(ip)
+        if spec is None and segment:
+            spec = self.segments.get(norm_text(segment))
+        return spec or self.default
+
+    def describe(self) -> Dict[str, int]:
+        """Cuántas reglas hay por tipo (para el log)."""
+        out: Dict[str, int] = {}
+        for spec in list(self.segments.values()) + list(self.hosts.values()):
+            out[spec.kind] = out.get(spec.kind, 0) + 1
+        return out
+
+
+# ============================================================================
+# Sondas individuales (un intento)
+# ============================================================================
+async def _close(writer) -> None:
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except Exception:
+        pass
+
+
+def _os_error(e: OSError, started: float) -> ProbeResult:
+    if isinstance(e, ConnectionRefusedError):
+        # RST: la pila TCP del host respondió, solo el puerto está cerrado
+        return True, (time.perf_counter() - started) * 1000.0, "tcp_refused"
+    if e.errno in _UNREACH:
+        return False, None, f"tcp_unreach:{errno.errorcode.get(e.errno, e.errno)}"
+    return False, None, f"error:{e}"
+
+
+async def tcp_once(ip: str, port: int, timeout_s: float) -> ProbeResult:
+    started = time.perf_counter()
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), timeout_s)
+    except asyncio.TimeoutError:
+        return False, None, "timeout"
+    except OSError as e:
+        return _os_error(e, started)
+    latency = (time.perf_counter() - started) * 1000.0
+    await _close(writer)
+    return True, latency, "tcp_ok"
+
+
+async def http_once(ip: str, port: int, path: str, tls: bool, timeout_s: float) -> ProbeResult:
+    """HEAD y solo la línea de estado; la latencia es hasta esa línea."""
+    started = time.perf_counter()
+    ctx = None
+    if tls:
+        import ssl
+        ctx = ssl.create_default_context()
+        ctx.check_hostname = False
+        ctx.verify_mode = ssl.CERT_NONE  # routers con certificados autofirmados
+
+    async def _head() -> ProbeResult:
+        reader, writer = await asyncio.open_connection(ip, port, ssl=ctx)
+        try:
+            writer.write(f"HEAD {path} HTTP/1.0\r\nHost: {ip}\r\nUser-Agent: monitor_puntos\r\nConnection: close\r\n\r\n".encode("ascii"))
+            await writer.drain()
+            line = await reader.readline()
+        finally:
+            await _close(writer)
+        latency = (time.perf_counter() - started) * 1000.0
+        parts = line.decode("latin-1").split()
+        if len(parts) >= 2 and parts[0].startswith("HTTP/") and parts[1].isdigit():
+            return True, latency, f"http_{parts[1]}"
+        # Algo contestó en el puerto pero no habla HTTP: el host está arriba igual
+        return True, latency, "http_invalid"
+
+    try:
+        return await asyncio.wait_for(_head(), timeout_s)
+    except asyncio.TimeoutError:
+        return False, None, "timeout"
+    except OSError as e:
+        return _os_error(e, started)
+    except Exception as e:
+        return False, None, f"error:{e}"
+
+
+async def probe_once(spec: ProbeSpec, ip: str, timeout_s: float) -> ProbeResult:
+    if spec.kind == "tcp":
+        return await tcp_once(ip, spec.port, timeout_s)
+    return await http_once(ip, spec.port, spec.path, spec.kind == "https", timeout_s)
+
+
+async def probe_plan(spec: ProbeSpec, ip: str, timeouts_ms: Sequence[int]) -> ProbeResult:
+    """TCP/HTTP con la misma semántica de plan que AsyncPinger.ping_plan."""
+    last: ProbeResult = (False, None, "no_attempt")
+    for timeout_ms in timeouts_ms:
+        last = await probe_once(spec, ip, timeout_ms / 1000.0)
+        if last[0] or last[2].startswith("tcp_unreach"):
+            return last  # unreachable es definitivo: reintentar no cambia nada
+    return last
+
+
+# ============================================================================
+# Despacho
+# ============================================================================
+class MultiProber:
+    """
+    Misma interfaz que AsyncPinger (ping_plan / ping_many) pero elige la sonda por host.
+    ICMP va al AsyncPinger; TCP/HTTP se acotan con su propio semáforo (cada una ocupa
+    un descriptor mientras dura, a diferencia de ICMP que comparte un socket).
+    """
+
+    def __init__(self, icmp, probe_map: Optional[ProbeMap] = None, max_in_flight: int = 256):
+        self.icmp = icmp                      # monitor_icmp.AsyncPinger (o None: solo TCP/HTTP)
+        self.probe_map = probe_map
+        self.max_in_flight = max(1, int(max_in_flight))
+        self._sem: Optional[asyncio.Semaphore] = None  # se crea dentro del loop
+        self._no_quality: Dict = {}
+
+    @property
+    def kind(self) -> Optional[str]:
+        return getattr(self.icmp, "kind", None)
+
+    @property
+    def quality(self) -> Dict:
+        """ip -> LinkQuality de la última ráfaga ICMP (modo calidad); vacío si no aplica."""
+        quality = getattr(self.icmp, "quality", None)
+        return self._no_quality if quality is None else quality
+
+    def spec_for(self, ip: str, segment: Optional[str] = None) -> ProbeSpec:
+        return self.probe_map.spec_for(ip, segment) if self.probe_map else ICMP
+
+    async def ping_plan(self, ip: str, timeouts_ms: Sequence[int], segment: Optional[str] = None) -> ProbeResult:
+        spec = self.spec_for(ip, segment)
+        if spec.kind == "icmp":
+            if self.icmp is None:
+                return False, None, "icmp_unavailable"
+            return await self.icmp.ping_plan(ip, timeouts_ms)
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.max_in_flight)
+        async with self._sem:
+            return await probe_plan(spec, ip, timeouts_ms)
+
+    async def ping_many(self, ips: Iterable[str], plans: Optional[Dict[str, Sequence[int]]] = None,
+                        default: Sequence[int] = (2000, 2000), segments: Optional[Dict[str, str]] = None) -> Dict[str, ProbeResult]:
+        if self.icmp is not None and self.icmp.sock is None:
+            await self.icmp.start()
+        uniq: List[str] = list(dict.fromkeys(ips))
+        plans, segments = plans or {}, segments or {}
+        results = await asyncio.gather(*(self.ping_plan(ip, plans.get(ip, default), segments.get(ip)) for ip in uniq))
+        return dict(zip(uniq, results))
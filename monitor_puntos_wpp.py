@@ -7,6 +7,8 @@ import subprocess
 import json
 import argparse
 import concurrent.futures
+import threading
+from contextlib import nullcontext
 from datetime import datetime
 from typing import Optional, Tuple, Dict, List
 
@@ -17,19 +19,15 @@ if sys.platform == "win32":
     except Exception:
         pass
 
-import pandas as pd
-import requests
 from dotenv import load_dotenv
-from supabase import create_client, Client # ✅ NUEVO
 import warnings
 warnings.filterwarnings("ignore")
 
-import matplotlib
-matplotlib.use('Agg') # Backend no interactivo para servidor
-import matplotlib.pyplot as plt
-
-import ipaddress
-import socket
+# ⚡ Dependencias pesadas (pandas, numpy/Pillow, matplotlib) se importan bajo demanda:
+# `uptime` no debe pagar cientos de ms de imports que no usa.
+# Presupuesto por punto de entrada: startup_budget.json / check_startup_budget.py
+from monitor_records import Target, ScanResult, results_to_dataframe
+from monitor_metrics import RunMetrics, phase as _phase
 
 # ============================================================================
 # CONFIGURACIÓN
@@ -51,7 +49,67 @@ WPP_VERSION = os.getenv("WPP_VERSION", "v21.0")
 PING_RETRIES = 2
 PING_TIMEOUT = 2000  # ms
 PING_COUNT   = 1
-RESOLVE_DNS  = False
+RESOLVE_DNS  = os.getenv("MONITOR_RESOLVE_DNS", "0").strip() == "1"
+
+# Modo calidad (monitor_quality.py): el primer intento ICMP es una ráfaga de N echos en
+# tubería -> pérdida, RTT min/prom/máx/p95 y jitter por host, en el mismo tiempo de sondeo
+QUALITY_BURST        = int(os.getenv("MONITOR_QUALITY_BURST", "0"))            # 0/1 = apagado
+QUALITY_INTERVAL_MS  = float(os.getenv("MONITOR_QUALITY_INTERVAL_MS", "20"))   # entre echos al mismo host
+QUALITY_LOSS_PCT     = float(os.getenv("MONITOR_QUALITY_LOSS_PCT", "10"))      # umbrales de enlace degradado
+QUALITY_P95_MS       = float(os.getenv("MONITOR_QUALITY_P95_MS", "250"))
+QUALITY_JITTER_MS    = float(os.getenv("MONITOR_QUALITY_JITTER_MS", "30"))
+QUALITY_MAX_LISTED   = int(os.getenv("MONITOR_QUALITY_MAX_LISTED", "20"))
+
+# Hostnames (monitor_dns.py): PTR en segundo plano mientras se sondea, con caché en disco
+DNS_SERVER           = os.getenv("MONITOR_DNS_SERVER", "").strip()        # ip[:puerto]; vacío = /etc/resolv.conf
+DNS_BUDGET_S         = float(os.getenv("MONITOR_DNS_BUDGET_S", "3"))      # tope por barrido
+DNS_TTL_S            = float(os.getenv("MONITOR_DNS_TTL_S", "86400"))
+DNS_NEGATIVE_TTL_S   = float(os.getenv("MONITOR_DNS_NEG_TTL_S", "3600"))  # NXDOMAIN / sin PTR
+
+# Política adaptativa por host (monitor_policy.py): timeout según la latencia
+# observada y una sola sonda para hosts caídos hace rato. MONITOR_ADAPTIVE=0 la apaga.
+ADAPTIVE_PROBES      = os.getenv("MONITOR_ADAPTIVE", "1").strip() != "0"
+ADAPTIVE_K           = float(os.getenv("MONITOR_TIMEOUT_K", "3"))
+ADAPTIVE_FLOOR_MS    = int(os.getenv("MONITOR_TIMEOUT_FLOOR_MS", "300"))
+ADAPTIVE_OUTAGE_S    = float(os.getenv("MONITOR_OUTAGE_S", "3600"))
+
+# Motor de sondeo: auto (ICMP asíncrono y, si no hay permisos, subprocess) | async | subprocess
+PROBE_ENGINE         = os.getenv("MONITOR_PROBE_ENGINE", "auto").strip().lower()
+ASYNC_MAX_IN_FLIGHT  = int(os.getenv("MONITOR_MAX_IN_FLIGHT", "2000"))
+
+# Barrido repartido en procesos (monitor_shards.py): N | auto (núcleos) | 0 = un proceso
+SHARD_WORKERS        = os.getenv("MONITOR_SHARDS", "0").strip().lower()
+SHARD_BY             = os.getenv("MONITOR_SHARD_BY", "subnet").strip().lower()  # subnet | hash
+SHARD_MIN_TARGETS    = int(os.getenv("MONITOR_SHARD_MIN", "2000"))  # por debajo no compensa arrancar procesos
+
+# Catálogo: snapshot local + sincronización incremental (monitor_catalog.py)
+CATALOG_TTL_S        = float(os.getenv("MONITOR_CATALOG_TTL_S", "600"))
+CATALOG_TIMEOUT_S    = float(os.getenv("MONITOR_CATALOG_TIMEOUT_S", "10"))
+CATALOG_PAGE_SIZE    = int(os.getenv("MONITOR_CATALOG_PAGE_SIZE", "1000"))
+
+# Barridos compartidos (monitor_sweep.py): uno a la vez; dentro de la ventana de
+# frescura se reutiliza el último resultado en lugar de volver a sondear
+SWEEP_FRESHNESS_S    = float(os.getenv("MONITOR_FRESHNESS_S", "60"))
+
+# Modo residente (serve): cachés en memoria entre reportes
+KEEP_STATE_IN_MEMORY = False
+_CATALOG_STORE = None         # monitor_catalog.CatalogStore (uno por proceso)
+_SWEEPS = None                # monitor_sweep.SweepCoordinator (uno por proceso)
+_STATE_STORE = None           # monitor_state.StateStore (SQLite, uno por proceso)
+_STATE_CACHE = None           # monitor_state.StateView completa (solo modo serve)
+_ARCHIVE = None               # monitor_archive.ResultArchive
+_CHARTS = None                # monitor_chart.ChartCache
+_STREAM = None                # monitor_stream.EventStream (--stream: eventos NDJSON en stdout)
+_EVENTS = None                # monitor_events.TransitionTracker (state.db)
+_SCHEDULER = None             # monitor_scheduler.ProbeScheduler (serve --schedule)
+_TOPOLOGY = (None, 0.0)       # (monitor_topology.Topology | None, mtime del archivo)
+_PROBE_MAP = (None, 0.0)      # (monitor_probes.ProbeMap | None, mtime del archivo)
+_MULTI_PROBER = None          # monitor_probes.MultiProber sobre el prober caliente
+_WARM_PROBER = None           # monitor_icmp.BackgroundPinger en modo serve
+_METRICS = None               # monitor_metrics.Registry (acumulado del proceso, /metrics)
+_EXCLUSIONS = None            # monitor_records.ExclusionList (EXCLUDED_CIDRS)
+_DNS_CACHE = None             # monitor_dns.PtrCache (dns_cache.json)
+_DNS = None                   # monitor_dns.DnsEnricher del barrido en curso (--resolve-dns)
 
 # Global flag
 JSON_MODE = False
@@ -65,9 +123,9 @@ def log(msg):
 
 MAX_WORKERS  = 35
 
-# Exclusiones
-EXCLUDED_IPS = {"127.0.0.1", "10.0.0.1", "0.0.0.0", "255.255.255.255"}
-EXCLUDED_PREFIXES: Dict[str, bool] = {}
+# Exclusiones (CIDR; MONITOR_EXCLUDE agrega más, separadas por coma)
+EXCLUDED_CIDRS = ["127.0.0.1/32", "10.0.0.1/32", "0.0.0.0/32", "255.255.255.255/32"]
+EXCLUDED_CIDRS += [c.strip() for c in os.getenv("MONITOR_EXCLUDE", "").split(",") if c.strip()]
 
 # Salida local (logs / CSV)
 OUTPUT_DIR          = "PuntosReportes"
@@ -78,11 +136,52 @@ LOG_FILENAME        = "monitor_inteligente.log"
 BUSINESS_NAME = "Gane Palmira"
 
 HISTORY_JSON       = os.path.join(OUTPUT_DIR, HISTORY_FILE)
-STATE_HISTORY_JSON = os.path.join(OUTPUT_DIR, STATE_HISTORY_FILE)
+STATE_HISTORY_JSON = os.path.join(OUTPUT_DIR, STATE_HISTORY_FILE)  # legado: se migra a STATE_DB
+STATE_DB           = os.path.join(OUTPUT_DIR, "state.db")
+ARCHIVE_DIR        = os.path.join(OUTPUT_DIR, "archive")  # histórico columnar (monitor_archive.py)
+ARCHIVE_RESULTS    = os.getenv("MONITOR_ARCHIVE", "1").strip() != "0"
+CATALOG_SNAPSHOT_JSON = os.path.join(OUTPUT_DIR, "catalog_snapshot.json")
+SWEEP_CACHE_JSON   = os.path.join(OUTPUT_DIR, "last_sweep.json")
+SWEEP_LOCK_FILE    = os.path.join(OUTPUT_DIR, "sweep.lock")
+TOPOLOGY_JSON      = os.getenv("MONITOR_TOPOLOGY", os.path.join(OUTPUT_DIR, "topology.json"))  # subred -> gateway (opcional)
+TOPOLOGY_SAMPLE    = int(os.getenv("MONITOR_TOPOLOGY_SAMPLE", "2"))  # hosts de muestra detrás de un gateway caído
+PROBES_JSON        = os.getenv("MONITOR_PROBES", os.path.join(OUTPUT_DIR, "probes.json"))  # icmp/tcp/http por host o zona (opcional)
+DNS_CACHE_JSON     = os.path.join(OUTPUT_DIR, "dns_cache.json")  # PTR con TTL (monitor_dns.py, solo --resolve-dns)
+TCP_MAX_IN_FLIGHT  = int(os.getenv("MONITOR_TCP_MAX_IN_FLIGHT", "256"))  # sondas TCP/HTTP simultáneas (1 descriptor c/u)
+METRICS_FILE       = os.getenv("MONITOR_METRICS_FILE", "").strip()  # texto Prometheus tras cada corrida (textfile collector)
 EWMA_ALPHA         = 0.3
 
+# Estado por IP (monitor_state.py)
+STATE_TOUCH_S        = float(os.getenv("MONITOR_STATE_TOUCH_S", "300"))
+STATE_RETENTION_DAYS = float(os.getenv("MONITOR_STATE_RETENTION_DAYS", "30"))
+HOST_EWMA_TAU_H      = float(os.getenv("MONITOR_EWMA_TAU_H", "24"))  # EWMA por host (monitor_analytics)
+
+# Gráficos (monitor_chart.py): caché por contenido con tope de tamaño
+CHART_DIR            = os.path.join("temp", "charts")
+CHART_CACHE_MB       = float(os.getenv("MONITOR_CHART_CACHE_MB", "50"))
+
+# Eventos de transición (monitor_events.py, --tipo eventos): histéresis + amortiguación de flaps
+EVENT_TIPOS          = ("eventos", "delta")
+EVENT_CONFIRM        = int(os.getenv("MONITOR_EVENT_CONFIRM", "2"))        # sondas seguidas en el estado nuevo
+EVENT_HOLD_S         = float(os.getenv("MONITOR_EVENT_HOLD_S", "300"))     # ...o segundos sostenido
+EVENT_LOOKBACK_H     = float(os.getenv("MONITOR_EVENT_LOOKBACK_H", "24"))  # ventana del primer delta de una zona
+EVENT_MAX_LISTED     = int(os.getenv("MONITOR_EVENT_MAX_LISTED", "30"))
+FLAP_HALF_LIFE_S     = float(os.getenv("MONITOR_FLAP_HALF_LIFE_S", "900"))
+FLAP_SUPPRESS        = float(os.getenv("MONITOR_FLAP_SUPPRESS", "2000"))   # cada flap suma 1000
+FLAP_REUSE           = float(os.getenv("MONITOR_FLAP_REUSE", "750"))
+
+# Sondeo continuo (monitor_scheduler.py, solo modo serve): los reportes salen de la foto en memoria
+SCHEDULE_ENABLED      = os.getenv("MONITOR_SCHEDULE", "0").strip() == "1"
+SCHEDULE_INTERVAL_S   = float(os.getenv("MONITOR_SCHEDULE_INTERVAL_S", "60"))     # nivel warm
+SCHEDULE_MAX_PPS      = float(os.getenv("MONITOR_SCHEDULE_MAX_PPS", "50"))        # tope global de sondas/s
+SCHEDULE_JITTER       = float(os.getenv("MONITOR_SCHEDULE_JITTER", "0.1"))
+SCHEDULE_HOT_FACTOR   = float(os.getenv("MONITOR_SCHEDULE_HOT_FACTOR", "0.25"))   # cambiaron hace poco
+SCHEDULE_COLD_FACTOR  = float(os.getenv("MONITOR_SCHEDULE_COLD_FACTOR", "5"))     # estables hace rato
+SCHEDULE_HOT_WINDOW_S = float(os.getenv("MONITOR_SCHEDULE_HOT_WINDOW_S", "1800"))
+SCHEDULE_COLD_AFTER_S = float(os.getenv("MONITOR_SCHEDULE_COLD_AFTER_S", "86400"))
+SCHEDULE_ARCHIVE_S    = float(os.getenv("MONITOR_SCHEDULE_ARCHIVE_S", "900"))     # foto al archivo / tendencias
+
 _IP_RE = re.compile(r"^(?:\d{1,3}\.){3}\d{1,3}$")
-_DNS_CACHE: Dict[str, Optional[str]] = {}
 JSON_MODE = False
 
 def log(msg: str):
@@ -95,23 +194,8 @@ def log(msg: str):
 # NORMALIZACIÓN
 # ============================================================================
 
-def norm_text(s: Optional[str]) -> str:
-    if s is None:
-        return ""
-    t = str(s).strip().upper()
-    t = t.encode("utf-8", "ignore").decode("utf-8", "ignore")
-    t = (
-        t.replace("Á", "A").replace("É", "E").replace("Í", "I")
-         .replace("Ó", "O").replace("Ú", "U").replace("Ñ", "N")
-    )
-    t = re.sub(r"\s+", " ", t).strip()
-    return t
-
-def contains_word(haystack: str, needle: str) -> bool:
-    if not needle: return True
-    if not haystack: return False
-    pattern = r"(^|[^A-Z0-9])" + re.escape(needle) + r"([^A-Z0-9]|$)"
-    return re.search(pattern, haystack) is not None
+# norm_text / contains_word / índice de zonas viven en monitor_zones.py
+from monitor_zones import norm_text, contains_word, parse_zonas, ZoneIndex, ALL_ZONES_TOKEN
 
 # ============================================================================
 # FUNCIÓN UPTIME
@@ -146,9 +230,16 @@ def handle_uptime_command():
 def ensure_dirs():
     os.makedirs(OUTPUT_DIR, exist_ok=True)
 
+def get_exclusions():
+    global _EXCLUSIONS
+    if _EXCLUSIONS is None:
+        from monitor_records import ExclusionList
+        _EXCLUSIONS = ExclusionList(EXCLUDED_CIDRS)
+    return _EXCLUSIONS
+
 def is_excluded(ip: str) -> bool:
-    if ip in EXCLUDED_IPS: return True
-    return any(ip.startswith(pref) for pref in EXCLUDED_PREFIXES)
+    # Los Targets del catálogo ya traen t.excluded; esto es para IPs sueltas
+    return get_exclusions().contains_ip(ip)
 
 def _parse_latency_windows_ping(stdout_text: str) -> Optional[float]:
     if not stdout_text: return None
@@ -160,36 +251,192 @@ def _parse_latency_linux_ping(stdout_text: str) -> Optional[float]:
     m = re.search(r"time[=<]\s*([\d\.]+)\s*ms", stdout_text, re.IGNORECASE)
     return float(m.group(1)) if m else None
 
-def ping_host(ip: str) -> Tuple[bool, Optional[float], str]:
-    if is_excluded(ip): return False, None, "excluded"
+def ping_host(ip: str, plan: Optional[Tuple[int, ...]] = None) -> Tuple[bool, Optional[float], str]:
+    # plan: timeout (ms) de cada intento (monitor_policy); por defecto la política fija
     system = platform.system().lower()
     last_reason = "no_attempt"
+    plan = plan or (PING_TIMEOUT,) * max(1, PING_RETRIES)
     
-    for attempt in range(PING_RETRIES):
+    for attempt, timeout_ms in enumerate(plan):
         try:
             if system == "windows":
-                cmd = ["ping", "-n", str(PING_COUNT), "-w", str(PING_TIMEOUT), ip]
+                cmd = ["ping", "-n", str(PING_COUNT), "-w", str(timeout_ms), ip]
                 creationflags = getattr(subprocess, "CREATE_NO_WINDOW", 0)
-                result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=(PING_TIMEOUT/1000)+3, creationflags=creationflags, text=True, errors="ignore")
+                result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=(timeout_ms/1000)+3, creationflags=creationflags, text=True, errors="ignore")
                 out = result.stdout or ""
                 success = ("TTL=" in out.upper()) and (result.returncode == 0)
                 if success: return True, _parse_latency_windows_ping(out), "ttl_ok"
                 last_reason = f"win_fail_rc={result.returncode}"
             else:
-                cmd = ["ping", "-c", str(PING_COUNT), "-W", "2", ip]
-                result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=(PING_TIMEOUT/1000)+3, text=True, errors="ignore")
+                # -W en segundos (enteros en iputils antiguos)
+                cmd = ["ping", "-c", str(PING_COUNT), "-W", str(max(1, -(-timeout_ms // 1000))), ip]
+                result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=(timeout_ms/1000)+3, text=True, errors="ignore")
                 out = result.stdout or ""
                 success = (("bytes from" in out.lower()) or ("time=" in out.lower())) and (result.returncode == 0)
                 if success: return True, _parse_latency_linux_ping(out), "bytesfrom_ok"
                 last_reason = f"nix_fail_rc={result.returncode}"
-        except subprocess.TimeoutExpired: last_reason = "timeout"
+        except subprocess.TimeoutExpired:
+            last_reason = "timeout"
+            continue  # ya esperamos el timeout completo; no sumamos pausa
         except Exception as e: last_reason = f"error:{e}"
-        time.sleep(0.15 + (attempt * 0.1))
+        if attempt + 1 < len(plan): time.sleep(0.15 + (attempt * 0.1))
         
     return False, None, last_reason
 
-def resolve_hostname(ip: str) -> Optional[str]:
-    return None # Desactivado para velocidad
+def get_probe_map():
+    """monitor_probes.ProbeMap si existe PROBES_JSON (se recarga si cambia), si no None (todo ICMP)."""
+    global _PROBE_MAP
+    try:
+        mtime = os.path.getmtime(PROBES_JSON)
+    except OSError:
+        return None
+    probe_map, loaded = _PROBE_MAP
+    if probe_map is None or mtime != loaded:
+        from monitor_probes import ProbeMap
+        try:
+            probe_map = ProbeMap.load(PROBES_JSON)
+        except Exception as e:
+            log(f"⚠️  Mapa de sondas inválido ({PROBES_JSON}): {e}")
+            return None
+        _PROBE_MAP = (probe_map, mtime)
+        log(f"🧪 Sondas: default {probe_map.default}, reglas {probe_map.describe() or '{}'}")
+    return probe_map
+
+def make_multi_prober(pinger):
+    """Envuelve un AsyncPinger (o None) para despachar ICMP/TCP/HTTP por host."""
+    from monitor_probes import MultiProber
+    return MultiProber(pinger, get_probe_map(), max_in_flight=TCP_MAX_IN_FLIGHT)
+
+def _warm_multi_prober():
+    global _MULTI_PROBER
+    if _MULTI_PROBER is None:
+        _MULTI_PROBER = make_multi_prober(_WARM_PROBER.pinger)
+    _MULTI_PROBER.probe_map = get_probe_map()
+    return _MULTI_PROBER
+
+def probe_target(target: Target, plan: Optional[Tuple[int, ...]] = None) -> Tuple[bool, Optional[float], str]:
+    """Sonda síncrona (motor de procesos): ICMP con ping del sistema, TCP/HTTP en un loop propio."""
+    probe_map = get_probe_map()
+    spec = probe_map.spec_for(target.ip, target.segment) if probe_map else None
+    if spec is None or spec.kind == "icmp":
+        return ping_host(target.ip, plan)
+    import asyncio
+    from monitor_probes import probe_plan
+    return asyncio.run(probe_plan(spec, target.ip, plan or (PING_TIMEOUT,) * max(1, PING_RETRIES)))
+
+def probe_hosts_async(ips: List[str], plans: Optional[Dict[str, Tuple[int, ...]]] = None, segments: Optional[Dict[str, str]] = None,
+                      quality: Optional[Dict] = None) -> Optional[Dict[str, Tuple[bool, Optional[float], str]]]:
+    """
+    Sondea todas las IPs en proceso (ICMP asíncrono; TCP/HTTP según probes.json).
+    segments (ip -> zona) permite las reglas por zona. quality (dict) recibe la
+    LinkQuality de cada ip con ráfaga (modo calidad).
+    Devuelve None si el motor no está disponible (el llamador usa ping_host como fallback).
+    """
+    if PROBE_ENGINE == "subprocess":
+        return None
+    default = (PING_TIMEOUT,) * max(1, PING_RETRIES)
+
+    async def _run(prober):
+        probes = await prober.ping_many(ips, plans, default, segments)
+        if quality is not None:
+            quality.update((ip, prober.quality[ip]) for ip in ips if ip in prober.quality)
+        return probes
+
+    if _WARM_PROBER is not None:
+        return _WARM_PROBER.run(_run(_warm_multi_prober()))
+    import asyncio
+    import monitor_icmp
+
+    async def _oneshot():
+        async with monitor_icmp.AsyncPinger(max_in_flight=ASYNC_MAX_IN_FLIGHT, burst=QUALITY_BURST,
+                                            burst_interval_ms=QUALITY_INTERVAL_MS) as pinger:
+            return await _run(make_multi_prober(pinger))
+    try:
+        return asyncio.run(_oneshot())
+    except monitor_icmp.ICMPUnavailable as e:
+        if PROBE_ENGINE == "async":
+            raise
+        log(f"⚠️  ICMP asíncrono no disponible ({e}), usando ping del sistema")
+        return None
+
+def get_topology():
+    """monitor_topology.Topology si existe TOPOLOGY_JSON (se recarga si cambia), si no None."""
+    global _TOPOLOGY
+    try:
+        mtime = os.path.getmtime(TOPOLOGY_JSON)
+    except OSError:
+        return None
+    topo, loaded = _TOPOLOGY
+    if topo is None or mtime != loaded:
+        from monitor_topology import Topology
+        try:
+            topo = Topology.load(TOPOLOGY_JSON)
+        except Exception as e:
+            log(f"⚠️  Topología inválida ({TOPOLOGY_JSON}): {e}")
+            return None
+        _TOPOLOGY = (topo, mtime)
+        log(f"🔌 Topología: {len(topo)} subredes con gateway")
+    return topo
+
+def _probe_many_blocking(ips: List[str], plans: Dict[str, Tuple[int, ...]], segments: Optional[Dict[str, str]] = None) -> Dict[str, Tuple[bool, Optional[float], str]]:
+    """Sondeo por lotes con el motor disponible (asíncrono o ping del sistema)."""
+    probes = probe_hosts_async(ips, plans, segments)
+    if probes is not None:
+        return probes
+    segments = segments or {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        return dict(zip(ips, executor.map(lambda ip: probe_target(Target(ip, segments.get(ip, "General")), plans.get(ip)), ips)))
+
+def _log_dead_gateways(topology, dead: Dict[str, int]) -> None:
+    for gw, n in sorted(dead.items()):
+        log(f"🔌 Gateway sin respuesta {topology.label(gw)}: {n} hosts detrás marcados sin sondear")
+
+def start_dns_enrichment():
+    """PTR en segundo plano para el barrido que empieza (solo con --resolve-dns)."""
+    global _DNS, _DNS_CACHE
+    if not RESOLVE_DNS:
+        _DNS = None
+        return None
+    from monitor_dns import DnsEnricher, PtrCache, parse_server
+    if _DNS_CACHE is None:
+        _DNS_CACHE = PtrCache(DNS_CACHE_JSON, DNS_TTL_S, DNS_NEGATIVE_TTL_S)
+        _DNS_CACHE.prune()
+    try:
+        server = parse_server(DNS_SERVER)
+    except ValueError:
+        log(f"⚠️  MONITOR_DNS_SERVER inválido ({DNS_SERVER!r}); usando el resolver del sistema")
+        server = None
+    _DNS = DnsEnricher(_DNS_CACHE, server, budget_s=DNS_BUDGET_S, log=log)
+    return _DNS
+
+def _dns_submit(targets) -> None:
+    if _DNS is not None:
+        _DNS.submit(t.ip for t in targets if not t.excluded)
+
+def resolve_hostnames(results: List[ScanResult]) -> None:
+    """Completa hostname con lo que ya esté resuelto (caché + consultas del barrido); no espera a la red."""
+    if _DNS is None: return
+    _DNS.close()  # no llegan más IPs: el hilo termina lo pendiente dentro del presupuesto
+    filled = 0
+    for r in results:
+        if not r.hostname and not r.excluded:
+            r.hostname = _DNS.hostname(r.ip)
+            filled += 1 if r.hostname else 0
+    st = _DNS.stats
+    log(f"🔎 DNS: {filled} hostnames ({st['cached']} desde caché, {st['resolved']} resueltos en este barrido, {st['nxdomain']} sin PTR)")
+
+def flush_dns() -> None:
+    """Guarda lo resuelto hasta ahora (el hilo puede seguir si queda presupuesto)."""
+    if _DNS_CACHE is not None:
+        try:
+            _DNS_CACHE.save()
+        except OSError as e:
+            log(f"⚠️  No se pudo guardar la caché DNS: {e}")
+
+def make_probe_policy():
+    from monitor_policy import ProbePolicy
+    return ProbePolicy(base_timeout_ms=PING_TIMEOUT, base_retries=PING_RETRIES, adaptive=ADAPTIVE_PROBES,
+                       k=ADAPTIVE_K, floor_ms=ADAPTIVE_FLOOR_MS, outage_s=ADAPTIVE_OUTAGE_S)
 
 def _status_emoji_by_availability(pct: float) -> str:
     if pct >= 95: return "🟢"
@@ -200,149 +447,665 @@ def _status_emoji_by_availability(pct: float) -> str:
 # ============================================================================
 # HISTORIAL
 # ============================================================================
-def load_state_history() -> Dict:
-    ensure_dirs()
-    if os.path.exists(STATE_HISTORY_JSON):
-        try:
-            with open(STATE_HISTORY_JSON, "r", encoding="utf-8") as f: return json.load(f)
-        except Exception: return {}
-    return {}
+def get_state_store():
+    global _STATE_STORE
+    if _STATE_STORE is None:
+        from monitor_state import StateStore
+        ensure_dirs()
+        _STATE_STORE = StateStore(STATE_DB, touch_s=STATE_TOUCH_S, retention_s=STATE_RETENTION_DAYS * 86400,
+                                  ewma_tau_s=HOST_EWMA_TAU_H * 3600, log=log)
+        _STATE_STORE.import_json(STATE_HISTORY_JSON)
+    return _STATE_STORE
 
-def save_state_history(history: Dict) -> None:
-    ensure_dirs()
-    try:
-        with open(STATE_HISTORY_JSON, "w", encoding="utf-8") as f: json.dump(history, f, ensure_ascii=False, indent=2)
-    except: pass
+def load_state_history():
+    """ip -> estado. Vista perezosa sobre SQLite; en modo serve, completa y en memoria."""
+    global _STATE_CACHE
+    store = get_state_store()
+    if KEEP_STATE_IN_MEMORY:
+        if _STATE_CACHE is None:
+            _STATE_CACHE = store.view().load_all()
+        else:
+            _STATE_CACHE.refresh()  # lo que escribieron otros procesos (CLI del bot)
+        return _STATE_CACHE
+    return store.view()
 
-def update_state_history(scan_results: List[Dict]) -> Dict:
-    history = load_state_history()
-    now_iso = datetime.now().isoformat()
-    for result in scan_results:
-        if result.get("excluded"): continue
-        ip = result["ip"]
-        is_active = bool(result["active"])
-        if ip not in history:
-            history[ip] = {"alias": result.get("alias"), "segment": result.get("segment"), "first_seen": now_iso, "state_changes": 0, "last_state": None, "last_seen_active": None, "active_since": None, "last_state_change": None, "last_scan": None}
-        prev_state = history[ip].get("last_state")
-        history[ip]["last_state"] = is_active
-        history[ip]["last_scan"] = now_iso
-        if is_active:
-            history[ip]["last_seen_active"] = now_iso
-            if prev_state is False or not history[ip].get("active_since"): history[ip]["active_since"] = now_iso
-        if prev_state is not None and prev_state != is_active:
-            history[ip]["state_changes"] = int(history[ip].get("state_changes", 0)) + 1
-            history[ip]["last_state_change"] = now_iso
-            if is_active is False: history[ip]["active_since"] = None
-    save_state_history(history)
+def update_state_history(scan_results: List[ScanResult], history=None):
+    history = history if history is not None else load_state_history()
+    written = get_state_store().apply_scan(scan_results, history, ewma_alpha=EWMA_ALPHA)
+    log(f"🗄️  Historial: {written} filas actualizadas de {len(scan_results)}")
     return history
 
-def scan_single_target(target: Dict, historical_data: Dict = None) -> Dict:
-    ip, segment, alias = target["ip"], target.get("segment", "General"), target.get("alias", target["ip"])
-    if is_excluded(ip): return {"segment": segment, "ip": ip, "alias": alias, "active": False, "excluded": True}
-    is_active, latency, reason = ping_host(ip)
+def scan_single_target(target: Target, historical_data: Dict = None, probe: Optional[Tuple[bool, Optional[float], str]] = None, plan: Optional[Tuple[int, ...]] = None, quality=None) -> ScanResult:
+    ip = target.ip
+    if target.excluded: return ScanResult(target, active=False, excluded=True)
+    # probe: resultado ya calculado por el motor asíncrono; si no hay, sonda síncrona (ICMP/TCP/HTTP)
+    is_active, latency, reason = probe if probe is not None else probe_target(target, plan)
     scan_time = datetime.now()
-    estimated_uptime = None
     state_change = False
     if historical_data and ip in historical_data:
         ip_history = historical_data[ip]
         if ip_history.get("last_state") is not None and ip_history.get("last_state") != is_active: state_change = True
-    return {"segment": segment, "ip": ip, "alias": alias, "active": bool(is_active), "excluded": False, "latency": latency, "scan_time": scan_time.isoformat(), "state_change": state_change, "ping_reason": reason}
+    # quality: LinkQuality de la ráfaga (modo calidad); solo cuenta si el host contestó
+    packed = quality.pack() if quality is not None and is_active else None
+    return ScanResult(target, active=bool(is_active), latency=latency, scan_time=scan_time.isoformat(), state_change=state_change, ping_reason=reason, quality=packed)
 
 # ============================================================================
 # ✅ NUEVO: CARGAS DESDE SUPABASE
 # ============================================================================
-def load_targets_from_supabase(zona: Optional[str] = None) -> pd.DataFrame:
-    if not SUPABASE_URL or not SUPABASE_KEY:
-        raise ValueError("❌ Faltan credenciales de Supabase en .env")
-
-    log("☁️  Conectando a Supabase (tabla: puntos_venta)...")
-    sb = create_client(SUPABASE_URL, SUPABASE_KEY)
-    
-    # Query básica
-    query = sb.table("puntos_venta").select("*").eq("active", True)
-    
-    # Filtro de Zona si aplica
-    # OJO: Aquí implementamos lógica aproximada de zona. 
-    # Si la zona es "PALMIRA", buscamos que el segmento contenga PALMIRA.
-    # Supabase filter 'ilike' es útil.
-    if zona:
-        # Mapeo simple: si zona existe, filtramos. 
-        # Si prefieres filtrar todo en memoria (Python) para usar la logica de 'contains_word', 
-        # traemos todo y filtramos en Pandas. Es más seguro si la DB tiene textos variados.
-        pass
+def get_catalog_store():
+    # Un solo store por proceso (en modo serve el snapshot queda en memoria)
+    global _CATALOG_STORE
+    if _CATALOG_STORE is None:
+        from monitor_catalog import CatalogStore
+        log("☁️  Conectando a Supabase (tabla: puntos_venta)...")
+        _CATALOG_STORE = CatalogStore(SUPABASE_URL, SUPABASE_KEY, CATALOG_SNAPSHOT_JSON, ttl_s=CATALOG_TTL_S, timeout_s=CATALOG_TIMEOUT_S,
+                                      page_size=CATALOG_PAGE_SIZE, keep_in_memory=KEEP_STATE_IN_MEMORY,
+                                      exclusions=get_exclusions(), log=log)
+    return _CATALOG_STORE
 
+def fetch_catalog(force_refresh: bool = False) -> List[Target]:
+    from monitor_catalog import CatalogUnavailable
+    store = get_catalog_store()
     try:
-        response = query.execute()
-        data = response.data # Lista de diccionarios
-    except Exception as e:
-        raise ValueError(f"❌ Error consultando Supabase: {e}")
+        targets = store.load(force_refresh=force_refresh)
+    except CatalogUnavailable as e:
+        raise ValueError(str(e))
 
-    if not data:
+    if not targets:
         raise ValueError("❌ La tabla 'puntos_venta' está vacía o no retornó datos.")
 
-    df = pd.DataFrame(data)
-    log(f"📊 Registros descargados de Supabase: {len(df)}")
-    
-    # Normalizar para asegurar compatibilidad
-    # Supabase columns: ip, alias, segment
-    # Script columns expected: ip, segment, alias
-    
-    # Filtrado por Zona (Lógica Python robusta)
-    if zona:
-        zona_norm = norm_text(zona)
-        log(f"🎯 Filtrando por zona: '{zona}'")
-        
-        # Filtro loose
-        mask = df["segment"].astype(str).apply(lambda s: contains_word(norm_text(s), zona_norm))
-        df = df[mask].copy()
-        
-        if df.empty:
+    log(f"📚 Catálogo: {len(targets)} puntos (origen: {store.last_source})")
+    return targets
+
+def make_target_filter(zonas: Optional[List[str]], store):
+    """Filtro por zona(s) vía el índice de zonas del catálogo (las IPs ya vienen validadas)."""
+    def _accept(t: Target) -> bool:
+        if not zonas: return True
+        index = store.zone_index
+        if index is None:
+            index = store.zone_index = ZoneIndex(keep_targets=False)
+        return index.in_any(t.segment, zonas)
+    return _accept
+
+def _describe_zonas(zonas: Optional[List[str]]) -> str:
+    if not zonas: return "GENERAL"
+    if zonas[0] == ALL_ZONES_TOKEN: return "TODAS"
+    return ", ".join(norm_text(z) for z in zonas)
+
+def load_targets_from_supabase(zona: Optional[str] = None, force_refresh: bool = False, metrics: Optional[RunMetrics] = None) -> List[Target]:
+    zonas = parse_zonas(zona)
+    with _phase(metrics, "catalog"):
+        targets = fetch_catalog(force_refresh=force_refresh)
+
+    # Filtrado por Zona (índice precalculado al cargar el catálogo)
+    t0 = time.perf_counter()
+    if zonas:
+        log(f"🎯 Filtrando por zona: '{_describe_zonas(zonas)}'")
+        store = get_catalog_store()
+        index = store.zone_index
+        if store.targets is not None and index is not None:
+            # Una evaluación por segmento distinto, no por punto
+            targets = store.targets.where_segment(lambda seg: index.in_any(seg, zonas))
+        else:
+            index = index or ZoneIndex(keep_targets=False)
+            targets = [t for t in targets if index.in_any(t.segment, zonas)]
+        if not targets:
             raise ValueError(f"❌ No se encontraron puntos para la zona {zona}")
+    if metrics is not None: metrics.add("zone_filter", time.perf_counter() - t0)
 
-    # Validar IPs
-    # ... (validación IP existente)
-    result_df = df[["ip", "segment", "alias"]].copy()
-    result_df["ip"] = result_df["ip"].astype(str).str.strip()
-    result_df = result_df[result_df["ip"].apply(lambda x: len(x) > 6)] # Minimo IP
-    
-    log(f"🎯 Puntos a escanear: {len(result_df)}")
-    return result_df
+    log(f"🎯 Puntos a escanear: {len(targets)}")
+    return targets
 
 # ============================================================================
 # ESCANEO PARALELO
 # ============================================================================
 
-def scan_from_df_parallel(df_targets: pd.DataFrame) -> pd.DataFrame:
-    total = len(df_targets)
-    log(f"🚀 Iniciando escaneo de {total} puntos (Workers: {MAX_WORKERS})")
-    historical_data = load_state_history()
-    targets_list = df_targets.to_dict("records")
-    results = []
+def scan_from_df_parallel(targets: List[Target], stats=None, metrics: Optional[RunMetrics] = None) -> List[ScanResult]:
+    total = len(targets)
+    _dns_submit(targets)
+    with _phase(metrics, "history"):
+        historical_data = load_state_history()
+        historical_data.prefetch(t.ip for t in targets)
+    results: List[ScanResult] = []
     completed = 0
     start_time = time.time()
-    
-    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        futures = [executor.submit(scan_single_target, t, historical_data) for t in targets_list]
-        for future in concurrent.futures.as_completed(futures):
-            try:
-                results.append(future.result())
-                completed += 1
-                if completed % 50 == 0: log(f"   Progreso: {completed}/{total}...")
-            except Exception as e: log(f"❌ Error worker: {e}")
-            
+    policy = stats.policy if stats is not None else make_probe_policy()
+    plans = policy.plans((t.ip for t in targets), historical_data)
+    segments = {t.ip: t.segment for t in targets} if get_probe_map() else None
+
+    if _STREAM is not None: _STREAM.catalog(total, done=True)
+
+    # 1) Topología: gateways primero; lo que está detrás de uno caído no se sondea
+    shortcut: Dict[str, str] = {}
+    topology = get_topology()
+    if topology is not None:
+        from monitor_topology import dead_gateways_sync, unreachable_reason
+        shortcut = dead_gateways_sync(topology, [t.ip for t in targets if not t.excluded],
+                                      lambda ips, p: _probe_many_blocking(ips, p, segments),
+                                      policy.baseline(), (PING_TIMEOUT,), TOPOLOGY_SAMPLE)
+        dead: Dict[str, int] = {}
+        for gw in shortcut.values(): dead[gw] = dead.get(gw, 0) + 1
+        _log_dead_gateways(topology, dead)
+        for t in [t for t in targets if t.ip in shortcut]:
+            results.append(scan_single_target(t, historical_data, (False, None, unreachable_reason(shortcut[t.ip]))))
+            if _STREAM is not None: _STREAM.host(results[-1])
+        targets = [t for t in targets if t.ip not in shortcut]
+
+    # 2) Motor ICMP asíncrono: todas las sondas en vuelo sobre un solo socket
+    link_quality: Dict = {}
+    probes = probe_hosts_async([t.ip for t in targets if not t.excluded], plans, segments, link_quality)
+    if probes is not None:
+        log(f"🚀 Iniciando escaneo de {total} puntos (ICMP asíncrono, en vuelo: {ASYNC_MAX_IN_FLIGHT})")
+        if stats is not None: stats.parallel = ASYNC_MAX_IN_FLIGHT
+        for t in targets:
+            results.append(scan_single_target(t, historical_data, probes.get(t.ip), quality=link_quality.get(t.ip)))
+            if _STREAM is not None: _STREAM.host(results[-1])
+    else:
+        # 3) Fallback: un proceso ping por intento
+        log(f"🚀 Iniciando escaneo de {total} puntos (Workers: {MAX_WORKERS})")
+        if stats is not None: stats.parallel = MAX_WORKERS
+        pool = metrics.start_pool("threads", MAX_WORKERS) if metrics is not None else None
+
+        def _scan(t: Target) -> ScanResult:
+            if pool is None:
+                return scan_single_target(t, historical_data, None, plans.get(t.ip))
+            with pool.task():
+                return scan_single_target(t, historical_data, None, plans.get(t.ip))
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            futures = [executor.submit(_scan, t) for t in targets]
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    results.append(future.result())
+                    if _STREAM is not None: _STREAM.host(results[-1])
+                    completed += 1
+                    if pool is not None: pool.sample_depth(max(0, len(futures) - completed - MAX_WORKERS))
+                    if completed % 50 == 0: log(f"   Progreso: {completed}/{total}...")
+                except Exception as e: log(f"❌ Error worker: {e}")
+
     dur = time.time() - start_time
     log(f"✅ Escaneo completado en {dur:.1f}s")
-    update_state_history(results)
-    return pd.DataFrame(results)
+    if metrics is not None:
+        metrics.add("probe", dur)
+        if metrics.pool is not None: metrics.pool.close()
+        for r in results: metrics.record(r, () if r.ip in shortcut else plans.get(r.ip, ()))
+    if stats is not None:
+        for r in results: stats.record(r, () if r.ip in shortcut else plans.get(r.ip, ()))
+    with _phase(metrics, "dns"):
+        resolve_hostnames(results)
+    with _phase(metrics, "history"):
+        update_state_history(results, historical_data)
+    return results
+
+async def _probe_stream(pinger, pages, accept, historical_data: Dict, stats=None, metrics: Optional[RunMetrics] = None) -> List[ScanResult]:
+    """
+    Productor (hilo): baja páginas del catálogo y las filtra por zona.
+    Consumidores (event loop): sondean cada Target apenas entra a la cola.
+    La cola acotada mantiene la memoria ~ tamaño de página.
+    """
+    import asyncio
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=CATALOG_PAGE_SIZE * 2)
+    n_workers = max(1, ASYNC_MAX_IN_FLIGHT)
+    results: List[ScanResult] = []
+    counters = {"queued": 0, "pages": 0}
+    policy = stats.policy if stats is not None else make_probe_policy()
+    topology = get_topology()
+    gate = None
+    if topology is not None:
+        from monitor_topology import GatewayGate, gateway_of_reason
+        gate = GatewayGate(topology, pinger.ping_plan, policy.baseline(), TOPOLOGY_SAMPLE)
+
+    pool = metrics.start_pool("async", n_workers) if metrics is not None else None
+    link_quality = getattr(pinger, "quality", {})  # ip -> LinkQuality (modo calidad)
+
+    def _pump():
+        try:
+            it = iter(pages)
+            while True:
+                t0 = time.perf_counter()
+                page = next(it, None)  # descarga (o lectura del snapshot) de la página
+                t1 = time.perf_counter()
+                if page is None:
+                    if metrics is not None: metrics.add("catalog", t1 - t0)
+                    break
+                counters["pages"] += 1
+                historical_data.prefetch(t.ip for t in page)  # lectura en lote, fuera del event loop
+                t2 = time.perf_counter()
+                page = [t for t in page if accept(t)]
+                _dns_submit(page)
+                if metrics is not None:
+                    metrics.add("catalog", t1 - t0)
+                    metrics.add("history", t2 - t1)
+                    metrics.add("zone_filter", time.perf_counter() - t2)
+                # El evento sale antes de encolar: ningún "host" de la página le gana al "catalog"
+                if _STREAM is not None: _STREAM.catalog(counters["queued"] + len(page), pages=counters["pages"])
+                for t in page:
+                    counters["queued"] += 1
+                    asyncio.run_coroutine_threadsafe(queue.put(t), loop).result()
+                if counters["pages"] == 1:
+                    log("📥 Primera página del catálogo en cola; el sondeo arranca sin esperar el resto")
+            if _STREAM is not None: _STREAM.catalog(counters["queued"], pages=counters["pages"], done=True)
+        finally:
+            for _ in range(n_workers):
+                asyncio.run_coroutine_threadsafe(queue.put(None), loop).result()
+
+    async def _worker():
+        while True:
+            t = await queue.get()
+            if t is None:
+                if gate is not None: gate.close()  # la cola se vació: no entran más hosts al gate
+                return
+            if pool is not None: pool.sample_depth(queue.qsize())
+            if t.excluded:
+                results.append(ScanResult(t, active=False, excluded=True))
+                continue
+            plan = policy.plan(historical_data.get(t.ip))
+            with (pool.task() if pool is not None else nullcontext()):
+                if gate is not None:
+                    probe = await gate.probe(t.ip, plan, t.segment)
+                    if gateway_of_reason(probe[2]): plan = ()  # no se sondeó
+                else:
+                    probe = await pinger.ping_plan(t.ip, plan, t.segment)
+            r = scan_single_target(t, historical_data, probe, quality=link_quality.get(t.ip))
+            if stats is not None: stats.record(r, plan)
+            if metrics is not None: metrics.record(r, plan)
+            results.append(r)
+            if _STREAM is not None: _STREAM.host(r)
+
+    producer = loop.run_in_executor(None, _pump)
+    await asyncio.gather(*(_worker() for _ in range(n_workers)))
+    await producer  # propaga errores del catálogo
+    if pool is not None: pool.close()
+    if gate is not None:
+        dead = {gw: 0 for gw in gate.dead_gateways()}
+        for r in results:
+            gw = gateway_of_reason(r.ping_reason)
+            if gw in dead: dead[gw] += 1
+        _log_dead_gateways(topology, dead)
+    log(f"📚 Catálogo: {counters['pages']} páginas, {counters['queued']} puntos a escanear")
+    return results
+
+def _probe_sharded(targets: List[Target], historical_data: Dict, stats=None, metrics: Optional[RunMetrics] = None,
+                   workers: int = 2, strategy: str = "subnet", prober=None, prober_args: Tuple = ()) -> Tuple[List[ScanResult], Dict]:
+    """
+    Sondeo repartido en procesos (monitor_shards). Los ScanResult se arman aquí, a
+    medida que llegan los lotes. prober: fábrica para los hijos (default ICMP/TCP/HTTP).
+    """
+    import monitor_shards
+    from monitor_records import parse_ipv4
+    from monitor_topology import gateway_of_reason
+    policy = stats.policy if stats is not None else make_probe_policy()
+    historical_data.prefetch(t.ip for t in targets)
+    results: List[ScanResult] = [ScanResult(t, active=False, excluded=True) for t in targets if t.excluded]
+    live = [t for t in targets if not t.excluded]
+    plans = [policy.plan(historical_data.get(t.ip)) for t in live]
+    dead: Dict[str, int] = {}
+
+    def _merge(idx, active, latency, reason, reasons, quality):
+        for k, i in enumerate(idx):
+            lat = latency[k]
+            r = scan_single_target(live[i], historical_data, (active[k] == 1, None if lat < 0 else lat, reasons[reason[k]]))
+            if k in quality: r.quality = quality[k]
+            gw = gateway_of_reason(r.ping_reason)
+            plan = () if gw else plans[i]  # detrás de un gateway caído: no se sondeó
+            if gw: dead[gw] = dead.get(gw, 0) + 1
+            if stats is not None: stats.record(r, plan)
+            if metrics is not None: metrics.record(r, plan)
+            results.append(r)
+            if _STREAM is not None: _STREAM.host(r)
+
+    topology = get_topology()
+    topo = {"path": TOPOLOGY_JSON, "gateway_plan": policy.baseline(), "sample": TOPOLOGY_SAMPLE} if topology is not None else None
+    if prober is None:
+        per_worker = max(1, ASYNC_MAX_IN_FLIGHT // max(1, workers))
+        prober, prober_args = monitor_shards.icmp_prober, (per_worker, PROBES_JSON, TCP_MAX_IN_FLIGHT, QUALITY_BURST, QUALITY_INTERVAL_MS)
+    info = monitor_shards.run([parse_ipv4(t.ip) for t in live], [t.segment for t in live], plans, _merge,
+                              workers, strategy, ASYNC_MAX_IN_FLIGHT, prober, prober_args, topo)
+    if topology is not None and dead:
+        _log_dead_gateways(topology, dead)
+    return results, info
+
+def scan_sharded(targets: List[Target], workers: int, stats=None, metrics: Optional[RunMetrics] = None) -> Optional[List[ScanResult]]:
+    """Catálogo completo repartido en `workers` procesos. None si algún proceso no pudo sondear."""
+    from monitor_shards import ShardError
+    _dns_submit(targets)
+    with _phase(metrics, "history"):
+        historical_data = load_state_history()
+    if _STREAM is not None: _STREAM.catalog(len(targets), done=True)
+    log(f"🚀 Iniciando escaneo de {len(targets)} puntos en {workers} procesos (reparto: {SHARD_BY})")
+    start_time = time.time()
+    try:
+        results, info = _probe_sharded(targets, historical_data, stats, metrics, workers, SHARD_BY)
+    except (ShardError, ValueError) as e:
+        log(f"⚠️  Barrido repartido no disponible ({e}), usando un solo proceso")
+        return None
+    dur = time.time() - start_time
+    probed = sum(w["hosts"] for w in info["per_worker"])
+    log(f"✅ Escaneo completado en {dur:.1f}s ({probed / dur if dur > 0 else 0:.0f} sondas/s; "
+        + ", ".join(f"{w['hosts']} en {w['probe_s']:.1f}s" for w in info["per_worker"]) + ")")
+    if metrics is not None: metrics.add("probe", dur)
+    if stats is not None: stats.parallel = ASYNC_MAX_IN_FLIGHT
+    with _phase(metrics, "dns"):
+        resolve_hostnames(results)
+    with _phase(metrics, "history"):
+        update_state_history(results, historical_data)
+    return results
+
+def scan_catalog_streaming(zona: Optional[str] = None, force_refresh: bool = False, stats=None, metrics: Optional[RunMetrics] = None) -> Optional[List[ScanResult]]:
+    # zona admite varias separadas por coma, o TODAS (ver monitor_zones.parse_zonas)
+    """
+    Carga paginada + sondeo en tubería: las primeras sondas salen mientras se
+    descargan las páginas siguientes. None si el motor asíncrono no está disponible.
+    """
+    if PROBE_ENGINE == "subprocess":
+        return None
+    import asyncio
+    from monitor_catalog import CatalogUnavailable
+    import monitor_icmp
+
+    store = get_catalog_store()
+    zonas = parse_zonas(zona)
+    if zonas:
+        log(f"🎯 Filtrando por zona: '{_describe_zonas(zonas)}'")
+    accept = make_target_filter(zonas, store)
+    with _phase(metrics, "history"):
+        historical_data = load_state_history()
+    start_time = time.time()
+
+    async def _run(pinger):
+        return await _probe_stream(pinger, store.stream(force_refresh=force_refresh), accept, historical_data, stats, metrics)
+
+    try:
+        if _WARM_PROBER is not None:
+            results = _WARM_PROBER.run(_run(_warm_multi_prober()))
+        else:
+            async def _oneshot():
+                async with monitor_icmp.AsyncPinger(max_in_flight=ASYNC_MAX_IN_FLIGHT, burst=QUALITY_BURST,
+                                                    burst_interval_ms=QUALITY_INTERVAL_MS) as pinger:
+                    return await _run(make_multi_prober(pinger))
+            results = asyncio.run(_oneshot())
+    except monitor_icmp.ICMPUnavailable as e:
+        if PROBE_ENGINE == "async":
+            raise
+        log(f"⚠️  ICMP asíncrono no disponible ({e}), usando ping del sistema")
+        return None
+    except CatalogUnavailable as e:
+        raise ValueError(str(e))
+
+    if not results:
+        if zona:
+            raise ValueError(f"❌ No se encontraron puntos para la zona {zona}")
+        raise ValueError("❌ La tabla 'puntos_venta' está vacía o no retornó datos.")
+
+    log(f"✅ Escaneo completado en {time.time() - start_time:.1f}s (origen catálogo: {store.last_source})")
+    if metrics is not None: metrics.add("probe", time.time() - start_time)
+    if stats is not None: stats.parallel = ASYNC_MAX_IN_FLIGHT
+    with _phase(metrics, "dns"):
+        resolve_hostnames(results)
+    with _phase(metrics, "history"):
+        update_state_history(results, historical_data)
+    return results
+
+def _shard_workers() -> int:
+    if PROBE_ENGINE == "subprocess":
+        return 0
+    from monitor_shards import resolve_workers
+    try:
+        return resolve_workers(SHARD_WORKERS)
+    except ValueError:
+        log(f"⚠️  MONITOR_SHARDS inválido ({SHARD_WORKERS!r}); barrido en un proceso")
+        return 0
+
+def run_sweep(zona: Optional[str] = None, force_refresh: bool = False) -> Tuple[List[ScanResult], Dict]:
+    """Un barrido completo: carga del catálogo + sondeo + historial. Devuelve (resultados, meta)."""
+    from monitor_policy import PolicyStats
+    stats = PolicyStats(make_probe_policy())
+    metrics = RunMetrics()
+    start_dns_enrichment()
+    results = None
+    workers = _shard_workers()
+    if workers > 1:
+        # Flotas grandes: catálogo completo y sondeo repartido en procesos
+        targets = load_targets_from_supabase(zona=zona, force_refresh=force_refresh, metrics=metrics)
+        if len(targets) >= SHARD_MIN_TARGETS:
+            results = scan_sharded(targets, workers, stats, metrics)
+            if results is None:
+                metrics, stats = RunMetrics(), PolicyStats(stats.policy)
+        else:
+            results = scan_from_df_parallel(targets, stats, metrics)
+    if results is None:
+        # ✅ CARGA DESDE SUPABASE + ESCANEO EN TUBERÍA (paginado)
+        results = scan_catalog_streaming(zona=zona, force_refresh=force_refresh, stats=stats, metrics=metrics)
+    if results is None:
+        # Fallback: catálogo completo primero, luego ping del sistema
+        metrics = RunMetrics()
+        targets = load_targets_from_supabase(zona=zona, force_refresh=force_refresh, metrics=metrics)
+        stats = PolicyStats(stats.policy)  # descarta lo registrado por el intento fallido
+        results = scan_from_df_parallel(targets, stats, metrics)
+    with metrics.phase("archive"):
+        archive_results(results)
+    with metrics.phase("trends"):
+        update_zone_trends(zona, results)
+    with metrics.phase("events"):
+        observe_transitions(results)
+    if not parse_zonas(zona):
+        # Barrido GENERAL = catálogo completo: compactamos hosts que ya no están
+        removed = get_state_store().compact(r.ip for r in results)
+        if removed: log(f"🧹 Historial: {removed} hosts fuera del catálogo eliminados")
+        if removed and _EVENTS is not None: _EVENTS.compact()
+    summary = stats.summary()
+    if summary["adaptive"]:
+        log(f"⚡ Política adaptativa: ~{summary['wall_saved_s']:.1f}s menos de escaneo "
+            f"({summary['wait_saved_s']:.1f}s de espera evitada, {summary['fast_probes']} sondas rápidas, {summary['unanswered']} sin respuesta"
+            + (f", {summary['short_circuited']} detrás de un gateway caído" if summary["short_circuited"] else "") + ")")
+    publish_metrics(metrics, "sweep")
+    return results, {"policy": summary, "metrics": metrics.summary()}
+
+def get_metrics_registry():
+    global _METRICS
+    if _METRICS is None:
+        from monitor_metrics import Registry
+        _METRICS = Registry()
+    return _METRICS
+
+def publish_metrics(metrics: RunMetrics, kind: str) -> None:
+    """Suma la corrida al registro del proceso y reescribe METRICS_FILE si está configurado."""
+    registry = get_metrics_registry()
+    registry.observe(metrics, kind)
+    if METRICS_FILE:
+        try:
+            registry.write(METRICS_FILE)
+        except OSError as e:
+            log(f"⚠️  Métricas no escritas en {METRICS_FILE}: {e}")
+
+def _payload_metrics(view, report: RunMetrics) -> Dict:
+    """Métricas del barrido (o del barrido reutilizado) + las fases del reporte."""
+    out = dict(view.meta.get("metrics") or {})
+    out["phases_s"] = dict(out.get("phases_s") or {}, **{k: round(v, 4) for k, v in report.phases.items()})
+    return out
+
+def get_sweep_coordinator():
+    global _SWEEPS
+    if _SWEEPS is None:
+        from monitor_sweep import SweepCoordinator
+        _SWEEPS = SweepCoordinator(SWEEP_CACHE_JSON, SWEEP_LOCK_FILE, freshness_s=SWEEP_FRESHNESS_S,
+                                   zone_index=lambda: get_catalog_store().zone_index or ZoneIndex(), log=log)
+    return _SWEEPS
+
+def shared_sweep(zona: Optional[str] = None, force_refresh: bool = False, max_age_s: Optional[float] = None):
+    """
+    Resultados para la zona sin lanzar barridos paralelos: reutiliza el último si está
+    dentro de la ventana de frescura o se engancha al que esté en curso.
+    """
+    if force_refresh:
+        max_age_s = 0  # catálogo nuevo => barrido nuevo
+    if _SCHEDULER is not None and max_age_s != 0 and _SCHEDULER.ready:
+        # Sondeo continuo: la foto en memoria ya está al día por nivel (ver monitor_scheduler.py)
+        view = _SCHEDULER.view(parse_zonas(zona))
+        if view.results:
+            return view
+    view = get_sweep_coordinator().get(parse_zonas(zona), lambda: run_sweep(zona, force_refresh), max_age_s=max_age_s)
+    if not view.results:
+        raise ValueError(f"❌ No se encontraron puntos para la zona {zona}")
+    return view
+
+def start_scheduler():
+    """Arranca el sondeo continuo sobre el prober caliente (modo serve)."""
+    global _SCHEDULER
+    from monitor_scheduler import ProbeScheduler
+    history = load_state_history()
+
+    def changed_at(ip: str) -> float:
+        h = history.get(ip) or {}
+        for k in ("last_state_change", "first_seen"):
+            try:
+                return datetime.fromisoformat(h[k]).timestamp()
+            except (KeyError, TypeError, ValueError):
+                pass
+        return time.time() - SCHEDULE_HOT_WINDOW_S  # sin historial: nivel warm
+
+    def on_batch(batch: List[ScanResult]) -> None:
+        metrics = RunMetrics()
+        for r in batch: metrics.record(r)
+        with metrics.phase("history"):
+            get_state_store().apply_scan(batch, history, ewma_alpha=EWMA_ALPHA)
+        with metrics.phase("events"):
+            observe_transitions(batch)
+        publish_metrics(metrics, "live")
+
+    def on_cycle(snapshot: List[ScanResult]) -> None:
+        metrics = RunMetrics()
+        with metrics.phase("archive"):
+            archive_results(snapshot)
+        with metrics.phase("trends"):
+            update_zone_trends(None, snapshot)
+        publish_metrics(metrics, "live_cycle")
+
+    _SCHEDULER = ProbeScheduler(
+        _WARM_PROBER, load_targets=lambda: fetch_catalog(),
+        plan_for=lambda ip: make_probe_policy().plan(history.get(ip)),
+        make_result=lambda t, probe: scan_single_target(t, history, probe, quality=_warm_multi_prober().quality.get(t.ip)),
+        on_batch=on_batch, on_cycle=on_cycle, changed_at=changed_at,
+        interval_s=SCHEDULE_INTERVAL_S, max_pps=SCHEDULE_MAX_PPS, jitter=SCHEDULE_JITTER,
+        hot_factor=SCHEDULE_HOT_FACTOR, cold_factor=SCHEDULE_COLD_FACTOR, hot_window_s=SCHEDULE_HOT_WINDOW_S,
+        cold_after_s=SCHEDULE_COLD_AFTER_S, cycle_s=SCHEDULE_ARCHIVE_S, catalog_refresh_s=CATALOG_TTL_S,
+        zone_index=lambda: get_catalog_store().zone_index or ZoneIndex(),
+        probe=lambda t, plan: _warm_multi_prober().ping_plan(t.ip, plan, t.segment), log=log)
+    _SCHEDULER.start()
+    return _SCHEDULER
+
+def _format_age(age_s: float) -> str:
+    if age_s < 60: return f"{age_s:.0f}s"
+    return f"{age_s // 60:.0f}m {age_s % 60:02.0f}s"
+
+def count_active(results: List[ScanResult]) -> Tuple[int, int]:
+    """(activos, inactivos) ignorando excluidos."""
+    active = inactive = 0
+    for r in results:
+        if r.excluded: continue
+        if r.active: active += 1
+        else: inactive += 1
+    return active, inactive
+
+def get_archive():
+    global _ARCHIVE
+    if _ARCHIVE is None:
+        from monitor_archive import ResultArchive
+        _ARCHIVE = ResultArchive(ARCHIVE_DIR, log=log)
+    return _ARCHIVE
+
+def archive_results(results: List[ScanResult]) -> None:
+    # El histórico es un extra: si falla, el reporte sale igual
+    if not ARCHIVE_RESULTS: return
+    try:
+        n = get_archive().append_results(results)
+        log(f"📦 Archivo columnar: +{n} filas")
+    except Exception as e:
+        log(f"⚠️  No se pudo archivar el barrido: {e}")
+
+def zone_availability(zona: Optional[str], results: List[ScanResult]) -> Dict[str, float]:
+    """% en línea por zona barrida (GENERAL/TODAS: además uno por segmento)."""
+    zonas = parse_zonas(zona)
+    index = get_catalog_store().zone_index or ZoneIndex()
+    groups = split_results_by_zone(results, zonas or [ALL_ZONES_TOKEN], index)
+    if not zonas or zonas[0] == ALL_ZONES_TOKEN:
+        groups.append(("GENERAL", results))
+    out = {}
+    for z, group in groups:
+        act, inact = count_active(group)
+        if act + inact:
+            out[z] = act / (act + inact) * 100.0
+    return out
+
+def update_zone_trends(zona: Optional[str], results: List[ScanResult]) -> None:
+    # monitor_history.json: un paso de EWMA (EWMA_ALPHA) por zona y barrido real
+    try:
+        from monitor_analytics import update_zone_history
+        update_zone_history(HISTORY_JSON, zone_availability(zona, results), EWMA_ALPHA)
+    except Exception as e:
+        log(f"⚠️  No se pudo actualizar {HISTORY_JSON}: {e}")
+
+def get_event_tracker():
+    global _EVENTS
+    if _EVENTS is None:
+        from monitor_events import TransitionTracker
+        ensure_dirs()
+        _EVENTS = TransitionTracker(STATE_DB, confirm=EVENT_CONFIRM, hold_s=EVENT_HOLD_S, suppress=FLAP_SUPPRESS,
+                                    reuse=FLAP_REUSE, half_life_s=FLAP_HALF_LIFE_S, log=log)
+    return _EVENTS
+
+def observe_transitions(results: List[ScanResult]) -> None:
+    # Igual que el archivo: si falla, el reporte sale igual
+    try:
+        fired = get_event_tracker().observe(results)
+        if fired: log(f"🔔 Transiciones confirmadas: {fired}")
+    except Exception as e:
+        log(f"⚠️  No se pudieron registrar transiciones: {e}")
+
+def zone_trend_lines(zona: Optional[str]) -> List[str]:
+    """Líneas 'ZONA 82.7 % (EWMA 79.6 %, ↑)' desde monitor_history.json (sin escanear)."""
+    from monitor_analytics import load_zone_history, trend_line
+    history = load_zone_history(HISTORY_JSON)
+    if zona:
+        keys = [norm_text(zona)]
+    else:
+        keys = ["GENERAL"] + sorted(k for k in history if k != "GENERAL")
+    return [line for line in (trend_line(k, history.get(k)) for k in keys) if line]
+
+def export_results_csv(results: List[ScanResult], zona: Optional[str] = None) -> str:
+    # Adaptador opcional (pandas) con el esquema histórico de PuntosReportes/*.csv
+    ensure_dirs()
+    suffix = f"_{norm_text(zona)}" if zona else ""
+    path = os.path.join(OUTPUT_DIR, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_resultado_monitor{suffix}.csv")
+    results_to_dataframe(results).to_csv(path, index=False, encoding="utf-8-sig")
+    return path
 
 # ============================================================================
 # FORMATO REPORTES (MEJORADO)
 # ============================================================================
-def build_report_text(results_df: pd.DataFrame, scan_duration: float, zona: Optional[str] = None) -> str:
-    valid_points  = results_df[~results_df["excluded"]].copy()
-    total = len(valid_points)
-    active = int(valid_points["active"].sum()) if total else 0
-    inactive = total - active
+def split_results_by_zone(results: List[ScanResult], zonas: List[str], index: ZoneIndex) -> List[Tuple[str, List[ScanResult]]]:
+    """Un grupo por zona pedida (o por segmento si se pidieron TODAS), desde un solo barrido."""
+    if zonas[0] == ALL_ZONES_TOKEN:
+        by_seg: Dict[str, List[ScanResult]] = {}
+        for r in results:
+            by_seg.setdefault(index.norm_segment(r.segment) or "GENERAL", []).append(r)
+        return [(seg, by_seg[seg]) for seg in sorted(by_seg)]
+    return [(z, [r for r in results if index.in_zone(r.segment, z)]) for z in zonas]
+
+def degraded_links(results: List[ScanResult]) -> Tuple[int, List]:
+    """(puntos en línea con ráfaga medida, [(ScanResult, LinkQuality)] que superan algún umbral, peor primero)."""
+    measured = [r for r in results if r.quality and r.active and not r.excluded]
+    if not measured: return 0, []
+    from monitor_quality import LinkQuality, QualityThresholds
+    limits = QualityThresholds(QUALITY_LOSS_PCT, QUALITY_P95_MS, QUALITY_JITTER_MS)
+    out = [(r, q) for r, q in ((r, LinkQuality.unpack(r.quality)) for r in measured) if limits.degraded(q)]
+    out.sort(key=lambda rq: (-rq[1].loss_pct, -(rq[1].rtt_p95 or 0.0), str(rq[0].alias)))
+    return len(measured), out
+
+def build_report_text(results: List[ScanResult], scan_duration: float, zona: Optional[str] = None, age_s: Optional[float] = None, trends: Optional[List[str]] = None, live: bool = False) -> str:
+    active, inactive = count_active(results)
+    total = active + inactive
     avail = (active / total * 100) if total else 0
     emoji = _status_emoji_by_availability(avail)
     
@@ -359,99 +1122,332 @@ def build_report_text(results_df: pd.DataFrame, scan_duration: float, zona: Opti
     lines.append(f"📡 *Total Puntos:* {total}")
     lines.append(f"🟢 *En Línea:* {active}")
     lines.append(f"🔴 *Sin Conexión:* {inactive}")
-    lines.append(f"⏱ *Tiempo Escaneo:* {scan_duration:.1f}s")
+    if live:
+        lines.append(f"📡 *Monitoreo continuo:* datos de hace ≤ {_format_age(age_s or 0.0)}")
+    else:
+        lines.append(f"⏱ *Tiempo Escaneo:* {scan_duration:.1f}s")
+        if age_s is not None:
+            lines.append(f"♻️ *Datos de hace:* {_format_age(age_s)} (barrido compartido)")
+    if trends:
+        # Tendencia (monitor_history.json): una línea por zona
+        lines.append(f"📈 *Tendencia:* {trends[0]}" if len(trends) == 1 else "📈 *Tendencia por zona:*")
+        if len(trends) > 1:
+            for t in trends: lines.append(f"   {t}")
+    measured, degraded = degraded_links(results)
+    if measured:
+        lines.append(f"📶 *Calidad de enlace:* {len(degraded)} degradados de {measured} medidos")
     lines.append("─────────────────────\n")
     
+    offline: List[ScanResult] = []
     if inactive > 0:
+        offline = sorted((r for r in results if not r.excluded and not r.active), key=lambda r: str(r.alias))
+
+        # Causa común (monitor_topology): un bloque por gateway caído en vez de un punto por línea
+        by_gateway: Dict[str, List[ScanResult]] = {}
+        for r in offline:
+            reason = str(r.ping_reason or "")
+            if reason.startswith("unreachable_via:"):
+                by_gateway.setdefault(reason.split(":", 1)[1], []).append(r)
+        if by_gateway:
+            topology = get_topology()
+            lines.append("🔌 *ENLACES CAÍDOS (causa común):*")
+            for gw in sorted(by_gateway, key=lambda g: -len(by_gateway[g])):
+                # Nombre del enlace si está en topology.json (la IP solo como respaldo)
+                label = (topology.names.get(gw) if topology is not None else None) or gw
+                lines.append(f"\n🔗 *{label}* · {len(by_gateway[gw])} puntos")
+                lines.append("   " + ", ".join(str(r.alias) for r in by_gateway[gw]))
+            offline = [r for r in offline if not str(r.ping_reason or "").startswith("unreachable_via:")]
+            lines.append("")
+
+    if offline:
         lines.append("❌ *PUNTOS SIN APERTURA (OFFLINE):*\n")
-        off_df = valid_points[~valid_points["active"]].sort_values("alias")
         
         # Agrupar por zona para reporte general, más ordenado
         if not zona:
-             for seg, g in off_df.groupby("segment"):
+            by_segment: Dict[str, List[ScanResult]] = {}
+            for r in offline:
+                by_segment.setdefault(str(r.segment), []).append(r)
+            for seg in sorted(by_segment):
                 lines.append(f"\n📂 *{seg}*")
-                for _, r in g.iterrows(): 
+                for r in by_segment[seg]:
                     # 🔒 Solo mostramos Alias, ocultamos IP por seguridad/estética
-                    lines.append(f"   • {r['alias']}")
+                    lines.append(f"   • {r.alias}")
         else:
-            for _, r in off_df.iterrows(): 
-                 lines.append(f"• {r['alias']}")
-    else:
+            for r in offline:
+                lines.append(f"• {r.alias}")
+    elif inactive == 0:
         lines.append("\n✅ *¡Excelente! Todos los puntos están operativos.*")
 
+    if degraded:
+        # En línea pero con pérdida / latencia / jitter fuera de umbral (modo calidad)
+        lines.append("\n📶 *ENLACES DEGRADADOS:*")
+        for r, q in degraded[:QUALITY_MAX_LISTED]:
+            lines.append(f"• {r.alias} · {q.describe()}")
+        if len(degraded) > QUALITY_MAX_LISTED:
+            lines.append(f"   …y {len(degraded) - QUALITY_MAX_LISTED} más")
+
     return "\n".join(lines)
 
 # ============================================================================
 # MAIN
 # ============================================================================
 
+def _safe_trends(zona: Optional[str]) -> List[str]:
+    try:
+        return zone_trend_lines(zona)
+    except Exception as e:
+        log(f"⚠️  Tendencias no disponibles: {e}")
+        return []
+
+def build_report_payload(zona: Optional[str] = None, tipo: str = "standard", with_chart: bool = True, export_csv: bool = False, refresh_catalog: bool = False, max_age_s: Optional[float] = None) -> Dict:
+    """
+    Ejecuta carga -> escaneo -> historial -> reporte y devuelve el payload JSON
+    (el mismo que imprime main() en --json). Lo reutiliza el modo serve.
+    """
+    # Barrido compartido (ver monitor_sweep.py)
+    view = shared_sweep(zona=zona, force_refresh=refresh_catalog, max_age_s=max_age_s)
+    results = view.results
+    duration = view.duration
+    age_s = view.age_s if view.shared else None
+    live = bool(view.meta.get("live"))
+    if _STREAM is not None:
+        _STREAM.replay(results)  # barrido compartido: no pasó por el sondeo en vivo
+        act, inact = count_active(results)
+        _STREAM.summary(total=act + inact, active=act, inactive=inact, duration_s=round(duration, 2),
+                        shared=view.shared, age_s=round(view.age_s, 1))
+
+    if str(tipo or "").lower() in EVENT_TIPOS:
+        return build_events_payload(zona, view)
+
+    zonas = parse_zonas(zona)
+    multi = bool(zonas) and (len(zonas) > 1 or zonas[0] == ALL_ZONES_TOKEN)
+    chart_zone = _describe_zonas(zonas) if multi else (zonas[0] if zonas else None)
+
+    metrics = RunMetrics()
+
+    def _chart(act, inact, z):
+        with metrics.phase("chart"):
+            return generate_pie_chart(act, inact, z)
+
+    # GRÁFICO (Solo en JSON mode): se dibuja en segundo plano mientras se arma el texto
+    chart_job = None
+    if with_chart:
+        act, inact = count_active(results)
+        chart_job = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        chart_future = chart_job.submit(_chart, act, inact, chart_zone)
+
+    # REPORTE (uno por zona si se pidieron varias; un solo barrido para todas)
+    report_t0 = time.perf_counter()
+    if multi:
+        index = get_catalog_store().zone_index or ZoneIndex()
+        texts = []
+        for z, group in split_results_by_zone(results, zonas, index):
+            if group:
+                texts.append(build_report_text(group, duration, z, age_s, _safe_trends(z), live))
+            else:
+                texts.append(f"❌ No se encontraron puntos para la zona {norm_text(z)}")
+    else:
+        texts = [build_report_text(results, duration, chart_zone, age_s, _safe_trends(chart_zone), live)]
+    report_text = "\n\n".join(texts)
+    metrics.add("report", time.perf_counter() - report_t0)
+    if _STREAM is not None: _STREAM.emit("report", messages=[{"text": t} for t in texts])
+
+    # CSV (opcional, adaptador pandas)
+    csv_path = export_results_csv(results, zona) if export_csv else None
+
+    # GRÁFICO: recoger el render en segundo plano
+    chart_path = None
+    chart_error = None
+    if chart_job is not None:
+        try:
+            chart_path = chart_future.result()
+        except Exception as e:
+            chart_error = str(e)
+        finally:
+            chart_job.shutdown(wait=False)
+        if _STREAM is not None: _STREAM.emit("chart", image=chart_path, error=chart_error)
+    publish_metrics(metrics, "report")
+
+    return {
+        "ok": True,
+        "report": report_text,
+        "summary": f"Escaneados {len(results)} puntos.",
+        "image": chart_path,
+        "image_error": chart_error, # DEBUG
+        "csv": csv_path,
+        "messages": [{"text": t} for t in texts],
+        "degraded_links": [{"ip": r.ip, "alias": r.alias, "segment": r.segment, "quality": r.quality}
+                           for r, _ in degraded_links(results)[1]],
+        "sweep": _sweep_info(view),
+        "metrics": _payload_metrics(view, metrics),
+    }
+
+def _sweep_info(view) -> Dict:
+    return {
+        "shared": view.shared,
+        "age_s": round(view.age_s, 1),
+        "finished_at": datetime.fromtimestamp(view.finished_at).isoformat() if view.finished_at else None,
+        "policy": view.meta.get("policy"),
+    }
+
+def build_events_text(delta: Dict, zona_label: str) -> str:
+    since = datetime.fromtimestamp(delta["since"])
+    since_txt = since.strftime("%I:%M %p") if since.date() == datetime.now().date() else since.strftime("%d/%m %I:%M %p")
+    down, up, muted = delta["down"], delta["up"], delta["suppressed"]
+    if not down and not up and not muted:
+        return f"✅ *{zona_label}*: sin cambios desde {since_txt}"
+
+    def listed(items, fmt):
+        out = [fmt(e) for e in items[:EVENT_MAX_LISTED]]
+        if len(items) > EVENT_MAX_LISTED: out.append(f"   …y {len(items) - EVENT_MAX_LISTED} más")
+        return out
+
+    at = lambda e: datetime.fromtimestamp(e["at"]).strftime("%I:%M %p")
+    lines = [f"🔔 *CAMBIOS DE ESTADO* · {zona_label}",
+             f"🔴 {len(down)} caídos · 🟢 {len(up)} recuperados desde {since_txt}"]
+    if down:
+        lines.append("\n🔴 *Caídos:*")
+        lines += listed(down, lambda e: f"• {e['alias']} ({e['segment']}) · {at(e)}")
+    if up:
+        lines.append("\n🟢 *Recuperados:*")
+        lines += listed(up, lambda e: f"• {e['alias']} ({e['segment']}) · {at(e)}")
+    if muted:
+        lines.append(f"\n🔇 *Intermitentes (silenciados):* {len(muted)}")
+        lines += listed(muted, lambda e: f"• {e['alias']} ({e['segment']}) · {'arriba' if e['up'] else 'abajo'}")
+    return "\n".join(lines)
+
+def build_events_payload(zona: Optional[str], view) -> Dict:
+    """
+    Delta de transiciones confirmadas desde el último pedido de esta zona (o desde
+    MONITOR_EVENT_LOOKBACK_H la primera vez). Sin gráfico ni lista completa.
+    """
+    zonas = parse_zonas(zona)
+    label = _describe_zonas(zonas)
+    accept = None
+    if zonas and zonas[0] != ALL_ZONES_TOKEN:
+        index = get_catalog_store().zone_index or ZoneIndex()
+        accept = lambda seg: index.in_any(seg, zonas)
+    metrics = RunMetrics()
+    report_t0 = time.perf_counter()
+    tracker = get_event_tracker()
+    key = f"zona:{label}"
+    until = time.time()
+    since = tracker.cursor(key) or until - EVENT_LOOKBACK_H * 3600
+    delta = tracker.delta(since, until, accept)
+    tracker.advance(key, until)
+    text = build_events_text(delta, label)
+    metrics.add("report", time.perf_counter() - report_t0)
+    publish_metrics(metrics, "report")
+    if _STREAM is not None: _STREAM.emit("report", messages=[{"text": text}])
+    brief = lambda items: [{"ip": e["ip"], "alias": e["alias"], "segment": e["segment"]} for e in items]
+    return {
+        "ok": True,
+        "report": text,
+        "summary": f"{len(delta['down'])} caídos, {len(delta['up'])} recuperados, {len(delta['suppressed'])} silenciados.",
+        "image": None,
+        "image_error": None,
+        "csv": None,
+        "messages": [{"text": text}],
+        "events": {
+            "since": datetime.fromtimestamp(since).isoformat(timespec="seconds"),
+            "down": brief(delta["down"]),
+            "up": brief(delta["up"]),
+            "suppressed": brief(delta["suppressed"]),
+        },
+        "sweep": _sweep_info(view),
+        "metrics": _payload_metrics(view, metrics),
+    }
+
 def main():
+    global JSON_MODE, MAX_WORKERS, PING_RETRIES, RESOLVE_DNS, ADAPTIVE_PROBES, METRICS_FILE, SHARD_WORKERS, SHARD_BY, QUALITY_BURST, _STREAM
     parser = argparse.ArgumentParser()
     parser.add_argument("--json", action="store_true", help="Salida JSON pura")
-    parser.add_argument("--tipo", default="standard")
-    parser.add_argument("--zona", default=None)
+    parser.add_argument("--stream", nargs="?", const="offline", choices=["offline", "all"], default=None,
+                        help="Eventos NDJSON a medida que ocurren (implica --json); 'all' emite también los hosts en línea")
+    parser.add_argument("--tipo", default="standard", help="standard | eventos (solo cambios desde el último pedido)")
+    parser.add_argument("--zona", default=None, help="Zona, varias separadas por coma, o TODAS")
     # Ignoramos argumentos legacy de Excel
     parser.add_argument("--sheet", default=None) 
+    parser.add_argument("--csv", action="store_true", help="Guardar resultados en PuntosReportes/*.csv")
+    parser.add_argument("--refresh-catalog", action="store_true", help="Ignorar el snapshot y descargar el catálogo completo")
+    parser.add_argument("--max-workers", type=int, default=None, help=f"Hilos del fallback con ping del sistema (default {MAX_WORKERS})")
+    parser.add_argument("--retries", type=int, default=None, help=f"Intentos por host (default {PING_RETRIES})")
+    parser.add_argument("--resolve-dns", action="store_true", help="Hostname (PTR) de los puntos, en segundo plano y con caché (MONITOR_RESOLVE_DNS=1)")
+    parser.add_argument("--quality", nargs="?", type=int, const=5, default=None,
+                        help="Modo calidad: ráfaga de N echos por host (default 5) -> pérdida, p95 y jitter (MONITOR_QUALITY_BURST)")
+    parser.add_argument("--no-adaptive", action="store_true", help="Timeout y reintentos fijos para todos los hosts")
+    parser.add_argument("--max-age", type=float, default=None, help=f"Reutilizar un barrido de hasta N segundos (default {SWEEP_FRESHNESS_S:.0f}, 0 = barrer siempre)")
+    parser.add_argument("--metrics-file", default=None, help="Escribir métricas en formato Prometheus (MONITOR_METRICS_FILE)")
+    parser.add_argument("--shards", default=None, help="Procesos de sondeo: N | auto (MONITOR_SHARDS; 0 = uno)")
+    parser.add_argument("--shard-by", default=None, choices=["subnet", "hash"], help=f"Reparto entre procesos (default {SHARD_BY})")
     
     args, unknown = parser.parse_known_args()
     
-    global JSON_MODE
-    JSON_MODE = args.json
+    JSON_MODE = args.json or bool(args.stream)
+    if args.stream:
+        from monitor_stream import EventStream
+        _STREAM = EventStream(hosts=args.stream)
+    if args.max_workers: MAX_WORKERS = max(1, args.max_workers)
+    if args.retries: PING_RETRIES = max(1, args.retries)
+    if args.resolve_dns: RESOLVE_DNS = True
+    if args.no_adaptive: ADAPTIVE_PROBES = False
+    if args.metrics_file: METRICS_FILE = args.metrics_file
+    if args.shards is not None: SHARD_WORKERS = args.shards.strip().lower()
+    if args.shard_by: SHARD_BY = args.shard_by
+    if args.quality is not None: QUALITY_BURST = max(0, args.quality)
     
     zona = args.zona if (args.zona and args.zona.strip()) else None
 
-    # Timer
-    start_ts = time.time()
-    
     try:
-        # ✅ CARGA DESDE SUPABASE
-        df_targets = load_targets_from_supabase(zona=zona)
-        
-        # ESCANERO
-        results_df = scan_from_df_parallel(df_targets)
-        
-        duration = time.time() - start_ts
-        
-        # REPORTE
-        report_text = build_report_text(results_df, duration, zona)
-        
-        # GRÁFICO (Solo en JSON mode)
-        chart_path = None
-        chart_error = None
-        if JSON_MODE:
-            try:
-                # Calcular stats rápido desde el DF
-                valid = results_df[~results_df["excluded"]]
-                act = int(valid["active"].sum()) if len(valid) else 0
-                inact = len(valid) - act
-                chart_path = generate_pie_chart(act, inact, zona)
-            except Exception as e:
-                chart_error = str(e)
-
-        if JSON_MODE:
-            payload = {
-                "ok": True,
-                "report": report_text,
-                "summary": f"Escaneados {len(results_df)} puntos.",
-                "image": chart_path,
-                "image_error": chart_error, # DEBUG
-                "messages": [{"text": report_text}] 
-            }
+        payload = build_report_payload(zona=zona, tipo=args.tipo, with_chart=JSON_MODE, export_csv=args.csv, refresh_catalog=args.refresh_catalog, max_age_s=args.max_age)
+
+        if _STREAM is not None:
+            _STREAM.finish(payload)
+        elif JSON_MODE:
             # Usamos print directo, nuestra funcion log() silencia si JSON_MODE=True
             print(json.dumps(payload, ensure_ascii=False))
         else:
-            print(report_text)
-            
+            print(payload["report"])
+        flush_dns()  # la salida ya se entregó: lo resuelto queda para el próximo barrido
+
     except Exception as e:
         err_msg = str(e)
-        if JSON_MODE:
+        if _STREAM is not None:
+            _STREAM.error(err_msg)
+        elif JSON_MODE:
             print(json.dumps({"ok": False, "error": err_msg}, ensure_ascii=False))
         else:
             print(f"❌ Error Fatal: {err_msg}")
         sys.exit(1)
 
+def _import_pyplot():
+    import matplotlib
+    matplotlib.use('Agg') # Backend no interactivo para servidor
+    import matplotlib.pyplot as plt
+    return plt
+
+_CHART_LOCK = threading.Lock()  # pyplot no es thread-safe (modo serve atiende en paralelo)
+
+def get_chart_cache():
+    global _CHARTS
+    if _CHARTS is None:
+        from monitor_chart import ChartCache
+        _CHARTS = ChartCache(CHART_DIR, max_bytes=int(CHART_CACHE_MB * 1024 * 1024))
+        _CHARTS.purge_legacy(os.path.dirname(CHART_DIR))
+    return _CHARTS
+
 def generate_pie_chart(active, inactive, zona=None):
+    """Ruta absoluta del PNG (monitor_chart); si Pillow/NumPy fallan, el renderizador matplotlib."""
+    try:
+        return get_chart_cache().get(active, inactive, zona)
+    except Exception as e:
+        log(f"⚠️  Gráfico rápido no disponible ({e}); usando matplotlib")
+    with _CHART_LOCK:
+        return _render_pie_chart(active, inactive, zona)
+
+def _render_pie_chart(active, inactive, zona=None):
     try:
+        plt = _import_pyplot()
         # 🎨 Estilo Dashboard Premium
         # No dependemos de estilos preinstalados, configuramos manualmente el objeto Figure
         
@@ -472,7 +1468,7 @@ def generate_pie_chart(active, inactive, zona=None):
         fig.patch.set_facecolor(c_bg)
         
         # Font Common
-        font_main = 'Segoe UI'
+        font_main = 'DejaVu Sans'  # viene con matplotlib; 'Segoe UI' no existe en Linux
         
         # --- 1. CABECERA (Top 15%) ---
         zone_title = (zona or "GENERAL").upper()
@@ -506,7 +1502,7 @@ def generate_pie_chart(active, inactive, zona=None):
         def draw_stat_row(y, label, value, color_val):
             fig.text(0.15, y, "●", color=color_val, fontsize=14, ha='center', va='center')
             fig.text(0.20, y, label, color='#DDDDDD', fontsize=14, ha='left', va='center', fontname=font_main)
-            # Valor alineado a la derecha con 'Segoe UI'
+            # Valor alineado a la derecha
             fig.text(0.85, y, str(value), color='white', fontsize=16, weight='bold', ha='right', va='center', fontname=font_main)
 
         y_base = 0.28
@@ -520,11 +1516,9 @@ def generate_pie_chart(active, inactive, zona=None):
         now_str = datetime.now().strftime("%d %b %Y, %I:%M %p").upper()
         fig.text(0.5, 0.03, now_str, fontsize=9, color='#666666', ha='center', fontname=font_main)
 
-        # Guardar
-        if not os.path.exists("temp"):
-            os.makedirs("temp")
-            
-        filename = f"temp/chart_{int(time.time())}.png"
+        # Guardar (nombre único: dos reportes en el mismo segundo no se pisan)
+        os.makedirs(CHART_DIR, exist_ok=True)
+        filename = os.path.join(CHART_DIR, f"chart_mpl_{os.getpid()}_{time.time_ns()}.png")
         path = os.path.abspath(filename)
         
         # Guardamos EXACTO
@@ -541,5 +1535,8 @@ if __name__ == "__main__":
     # Check simple commands
     if len(sys.argv) > 1 and sys.argv[1] == "uptime":
         handle_uptime_command()
+    elif len(sys.argv) > 1 and sys.argv[1] == "serve":
+        import monitor_daemon
+        monitor_daemon.main(sys.argv[2:], sys.modules[__name__])
     else:
         main()
@@ -0,0 +1,122 @@
+# monitor_quality.py
+# Calidad de enlace por ráfaga (modo calidad: MONITOR_QUALITY_BURST=N o --quality N).
+# - Con PING_COUNT = 1 cada sonda da a lo sumo una latencia: un punto con 30 % de
+#   pérdida que contesta una vez se ve igual que uno sano.
+# - En modo calidad el primer intento de cada host ICMP es una ráfaga de N echos en
+#   tubería (AsyncPinger.ping_burst): se envían sin esperar respuestas, espaciados
+#   por host (MONITOR_QUALITY_INTERVAL_MS) y comprimidos a la primera mitad del
+#   timeout; todas esperan hasta el mismo plazo, así que la ráfaga dura lo mismo que
+#   un intento normal.
+# - LinkQuality resume la ráfaga: pérdida %, RTT min/prom/máx/p95 y jitter (media de
+#   |diferencias| entre RTTs consecutivos, como el jitter entre llegadas de RTP).
+# - Por host se guarda compacto (columna quality de state.db, ScanResult.quality):
+#     [enviados, recibidos, min, prom, max, p95, jitter]
+import json
+import math
+from typing import List, Optional, Sequence
+
+
+def _ms(v: float) -> str:
+    return f"{v:.1f}" if v < 10 else f"{v:.0f}"
+
+
+class LinkQuality:
+    __slots__ = ("sent", "received", "rtt_min", "rtt_avg", "rtt_max", "rtt_p95", "jitter")
+
+    def __init__(self, sent: int, received: int, rtt_min: Optional[float] = None, rtt_avg: Optional[float] = None,
+                 rtt_max: Optional[float] = None, rtt_p95: Optional[float] = None, jitter: Optional[float] = None):
+        self.sent = int(sent)
+        self.received = int(received)
+        self.rtt_min = rtt_min
+        self.rtt_avg = rtt_avg
+        self.rtt_max = rtt_max
+        self.rtt_p95 = rtt_p95
+        self.jitter = jitter
+
+    @classmethod
+    def from_samples(cls, samples: Sequence[Optional[float]]) -> "LinkQuality":
+        """samples: RTT (ms) de cada echo en orden de envío; None = sin respuesta."""
+        rtts = [float(s) for s in samples if s is not None]
+        if not rtts:
+            return cls(len(samples), 0)
+        ordered = sorted(rtts)
+        p95 = ordered[max(0, math.ceil(0.95 * len(ordered)) - 1)]  # rango más cercano
+        jitter = sum(abs(b - a) for a, b in zip(rtts, rtts[1:])) / (len(rtts) - 1) if len(rtts) > 1 else 0.0
+        return cls(len(samples), len(rtts), ordered[0], sum(rtts) / len(rtts), ordered[-1], p95, jitter)
+
+    @property
+    def loss_pct(self) -> float:
+        return 100.0 * (self.sent - self.received) / self.sent if self.sent else 0.0
+
+    def pack(self) -> List:
+        def _r(v):
+            return None if v is None else round(v, 2)
+        return [self.sent, self.received, _r(self.rtt_min), _r(self.rtt_avg), _r(self.rtt_max), _r(self.rtt_p95), _r(self.jitter)]
+
+    @classmethod
+    def unpack(cls, data) -> Optional["LinkQuality"]:
+        """Desde pack() o su JSON (fila de state.db); None si no hay datos válidos."""
+        if isinstance(data, str):
+            try:
+                data = json.loads(data)
+            except ValueError:
+                return None
+        if not isinstance(data, (list, tuple)) or len(data) != 7:
+            return None
+        return cls(*data)
+
+    def describe(self) -> str:
+        if not self.received:
+            return f"sin respuesta a {self.sent} echos"
+        return f"pérdida {self.loss_pct:.0f}% · p95 {_ms(self.rtt_p95)} ms · jitter {_ms(self.jitter)} ms"
+
+    def __repr__(self) -> str:
+        return f"LinkQuality({self.received}/{self.sent}, avg={self.rtt_avg}, p95={self.rtt_p95}, jitter={self.jitter})"
+
+
+class QualityThresholds:
+    """Umbrales de enlace degradado (alcanza con superar uno)."""
+
+    def __init__(self, loss_pct: float = 10.0, p95_ms: float = 250.0, jitter_ms: float = 30.0):
+        self.loss_pct = float(loss_pct)
+        self.p95_ms = float(p95_ms)
+        self.jitter_ms = float(jitter_ms)
+
+    def problems(self, q: LinkQuality) -> List[str]:
+        out = []
+        if q.loss_pct >= self.loss_pct:
+            out.append("loss")
+        if q.rtt_p95 is not None and q.rtt_p95 >= self.p95_ms:
+            out.append("p95")
+        if q.jitter is not None and q.jitter >= self.jitter_ms:
+            out.append("jitter")
+        return out
+
+    def degraded(self, q: Optional[LinkQuality]) -> bool:
+        return q is not None and q.received > 0 and bool(self.problems(q))
+
+
+def burst_offsets(count: int, interval_s: float, timeout_s: float) -> List[float]:
+    """Segundos desde el inicio para cada envío: cada interval_s, sin pasar de la mitad del timeout."""
+    count = max(1, int(count))
+    if count == 1:
+        return [0.0]
+    step = min(max(0.0, interval_s), timeout_s / 2.0 / (count - 1))
+    return [k * step for k in range(count)]
+
+
+def quality_changed(old, new, epsilon: float = 0.2) -> bool:
+    """¿Amerita escribir la calidad en state.db? Otra pérdida, o p95/jitter que se movieron."""
+    o, n = LinkQuality.unpack(old) if old is not None else None, LinkQuality.unpack(new) if new is not None else None
+    if (o is None) != (n is None):
+        return True
+    if o is None:
+        return False
+    if (o.sent, o.received) != (n.sent, n.received):
+        return True
+    for a, b in ((o.rtt_p95, n.rtt_p95), (o.jitter, n.jitter)):
+        if (a is None) != (b is None):
+            return True
+        if a is not None and abs(b - a) > max(1.0, epsilon * a):
+            return True
+    return False
@@ -0,0 +1,269 @@
+# monitor_records.py
+# Registros compactos del pipeline de escaneo (sin pandas en el camino caliente).
+# - Target:        un punto del catálogo (ip, segment, alias, excluded).
+# - ScanResult:    el resultado de sondear un Target.
+# - TargetTable:   el catálogo cargado, en columnas: ip como uint32 empaquetado +
+#                  índices a las tablas de segmentos / alias. Valida y deduplica al cargar.
+# - ExclusionList: rangos CIDR excluidos del sondeo (bisect sobre rangos fusionados).
+# Target y ScanResult usan __slots__: sin __dict__ por instancia, ~3-4x menos memoria
+# que un dict con las mismas claves cuando el catálogo crece.
+import socket
+from array import array
+from bisect import bisect_right
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Esquema histórico de los CSV en PuntosReportes/
+CSV_COLUMNS = [
+    "segment", "ip", "alias", "active", "excluded", "hostname", "latency",
+    "scan_time", "estimated_uptime", "state_change", "ping_reason",
+]
+
+
+class Target:
+    __slots__ = ("ip", "segment", "alias", "excluded")
+
+    def __init__(self, ip: str, segment: str = "General", alias: Optional[str] = None, excluded: bool = False):
+        self.ip = ip
+        self.segment = segment
+        self.alias = alias or ip
+        self.excluded = excluded  # se decide una vez al cargar el catálogo (TargetTable)
+
+    def __repr__(self) -> str:
+        return f"Target({self.ip!r}, {self.segment!r}, {self.alias!r})"
+
+
+class ScanResult:
+    __slots__ = ("segment", "ip", "alias", "active", "excluded", "hostname",
+                 "latency", "scan_time", "state_change", "ping_reason", "quality")
+
+    def __init__(self, target: Target, active: bool = False, excluded: bool = False,
+                 latency: Optional[float] = None, scan_time: Optional[str] = None,
+                 state_change: bool = False, ping_reason: Optional[str] = None,
+                 hostname: Optional[str] = None, quality: Optional[List] = None):
+        self.segment = target.segment
+        self.ip = target.ip
+        self.alias = target.alias
+        self.active = active
+        self.excluded = excluded
+        self.hostname = hostname
+        self.latency = latency
+        self.scan_time = scan_time
+        self.state_change = state_change
+        self.ping_reason = ping_reason
+        self.quality = quality  # LinkQuality.pack() de la ráfaga (modo calidad), si hubo
+
+    def to_dict(self) -> Dict:
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, d: Dict) -> "ScanResult":
+        r = cls.__new__(cls)
+        for k in cls.__slots__:
+            setattr(r, k, d.get(k))
+        r.active = bool(r.active)
+        r.excluded = bool(r.excluded)
+        r.state_change = bool(r.state_change)
+        return r
+
+    def __repr__(self) -> str:
+        return f"ScanResult({self.ip!r}, active={self.active}, reason={self.ping_reason!r})"
+
+
+# ============================================================================
+# IPs como enteros
+# ============================================================================
+def parse_ipv4(text) -> Optional[int]:
+    """'a.b.c.d' estricto -> uint32; None si no es una IPv4 válida (inet_pton: sin formas cortas ni ceros a la izquierda)."""
+    try:
+        return int.from_bytes(socket.inet_pton(socket.AF_INET, str(text or "").strip()), "big")
+    except (OSError, ValueError):
+        return None
+
+
+def format_ipv4(n: int) -> str:
+    return socket.inet_ntoa(n.to_bytes(4, "big"))
+
+
+class ExclusionList:
+    """Rangos CIDR excluidos, fusionados y ordenados: pertenencia = un bisect."""
+
+    def __init__(self, cidrs: Iterable[str] = ()):
+        import ipaddress
+        ranges = []
+        for c in cidrs:
+            c = str(c).strip()
+            if c:
+                net = ipaddress.IPv4Network(c, strict=False)
+                ranges.append((int(net.network_address), int(net.broadcast_address)))
+        merged: List[List[int]] = []
+        for lo, hi in sorted(ranges):
+            if merged and lo <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], hi)
+            else:
+                merged.append([lo, hi])
+        self._starts = array("I", (lo for lo, _ in merged))
+        self._ends = array("I", (hi for _, hi in merged))
+
+    def __bool__(self) -> bool:
+        return len(self._starts) > 0
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    def contains(self, n: int) -> bool:
+        i = bisect_right(self._starts, n) - 1
+        return i >= 0 and n <= self._ends[i]
+
+    def contains_ip(self, ip: str) -> bool:
+        n = parse_ipv4(ip)
+        return n is not None and self.contains(n)
+
+    def mask(self, ips: Sequence[int]) -> bytearray:
+        """1 por cada ip excluida, en una pasada."""
+        if not self._starts:
+            return bytearray(len(ips))
+        starts, ends = self._starts, self._ends
+        out = bytearray(len(ips))
+        for k, n in enumerate(ips):
+            i = bisect_right(starts, n) - 1
+            if i >= 0 and n <= ends[i]:
+                out[k] = 1
+        return out
+
+
+# ============================================================================
+# Catálogo en columnas
+# ============================================================================
+class TargetTable:
+    """
+    Catálogo cargado: ips (array 'I'), seg/alias (índices a self.segments / self.aliases)
+    y excluded (bytearray). Los Targets se crean al pedirlos, no se retienen.
+    Filas con IP inválida o repetida se descartan al cargar y quedan contadas.
+    """
+    _SAMPLES = 5
+
+    def __init__(self, exclusions: Optional[ExclusionList] = None):
+        self.exclusions = exclusions
+        self.ips = array("I")
+        self.seg = array("I")
+        self.alias = array("I")          # índice en self.aliases; 0 = alias igual a la ip
+        self.excluded = bytearray()
+        self.segments: List[str] = []
+        self.aliases: List[str] = [""]
+        self._seg_ids: Optional[Dict[str, int]] = {}
+        self._seen: Optional[set] = set()
+        self.invalid = 0
+        self.duplicates = 0
+        self.invalid_samples: List[str] = []
+        self.duplicate_samples: List[str] = []
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Tuple[str, Optional[str], Optional[str]]], exclusions: Optional[ExclusionList] = None) -> "TargetTable":
+        table = cls(exclusions)
+        table.extend(rows)
+        table.seal()
+        return table
+
+    def extend(self, rows: Iterable[Tuple[str, Optional[str], Optional[str]]]) -> int:
+        """Agrega filas (ip, segment, alias); devuelve cuántas se aceptaron."""
+        if self._seen is None:
+            raise RuntimeError("TargetTable sellada: no admite más filas")
+        start = len(self.ips)
+        seen, seg_ids, aliases = self._seen, self._seg_ids, self.aliases
+        add_ip, add_seg, add_alias, add_name = self.ips.append, self.seg.append, self.alias.append, aliases.append
+        pton, af, from_bytes = socket.inet_pton, socket.AF_INET, int.from_bytes
+        for ip, segment, alias in rows:
+            ip = str(ip or "").strip()
+            try:
+                n = from_bytes(pton(af, ip), "big")
+            except (OSError, ValueError):
+                self.invalid += 1
+                if len(self.invalid_samples) < self._SAMPLES:
+                    self.invalid_samples.append(ip)
+                continue
+            if n in seen:
+                self.duplicates += 1
+                if len(self.duplicate_samples) < self._SAMPLES:
+                    self.duplicate_samples.append(ip)
+                continue
+            seen.add(n)
+            segment = segment or "General"
+            sid = seg_ids.get(segment)
+            if sid is None:
+                sid = seg_ids[segment] = len(self.segments)
+                self.segments.append(segment)
+            if alias and alias != ip:
+                add_alias(len(aliases))
+                add_name(alias)
+            else:
+                add_alias(0)
+            add_ip(n)
+            add_seg(sid)
+        added = self.ips[start:]
+        self.excluded.extend(self.exclusions.mask(added) if self.exclusions else bytearray(len(added)))
+        return len(added)
+
+    def add_page(self, rows: Iterable[Tuple[str, Optional[str], Optional[str]]]) -> List[Target]:
+        """extend() + los Targets aceptados de este lote (carga en streaming)."""
+        start = len(self.ips)
+        self.extend(rows)
+        return self.slice(start, len(self.ips))
+
+    def seal(self) -> "TargetTable":
+        """Fin de la carga: suelta los diccionarios auxiliares (solo quedan las columnas)."""
+        self._seen = self._seg_ids = None
+        return self
+
+    def __len__(self) -> int:
+        return len(self.ips)
+
+    def target(self, i: int) -> Target:
+        ip = format_ipv4(self.ips[i])
+        aid = self.alias[i]
+        return Target(ip, self.segments[self.seg[i]], self.aliases[aid] if aid else ip, bool(self.excluded[i]))
+
+    def _build(self, rows: Iterable[int]) -> List[Target]:
+        ips, seg, alias, excluded = self.ips, self.seg, self.alias, self.excluded
+        segments, aliases, ntoa = self.segments, self.aliases, socket.inet_ntoa
+        out = []
+        for i in rows:
+            ip = ntoa(ips[i].to_bytes(4, "big"))
+            aid = alias[i]
+            out.append(Target(ip, segments[seg[i]], aliases[aid] if aid else ip, excluded[i] == 1))
+        return out
+
+    def slice(self, start: int, stop: int) -> List[Target]:
+        return self._build(range(start, min(stop, len(self.ips))))
+
+    def __iter__(self) -> Iterator[Target]:
+        return iter(self._build(range(len(self.ips))))
+
+    def where_segment(self, accept: Callable[[str], bool]) -> List[Target]:
+        """Targets cuyo segmento cumple `accept` (se evalúa una vez por segmento distinto)."""
+        ok = [accept(s) for s in self.segments]
+        return self._build(i for i, sid in enumerate(self.seg) if ok[sid])
+
+    @property
+    def n_excluded(self) -> int:
+        return self.excluded.count(1)
+
+    def report(self) -> Optional[str]:
+        """Resumen de filas descartadas (None si no hubo)."""
+        parts = []
+        if self.invalid:
+            parts.append(f"{self.invalid} IP inválidas ({', '.join(repr(x) for x in self.invalid_samples)})")
+        if self.duplicates:
+            parts.append(f"{self.duplicates} IP repetidas ({', '.join(self.duplicate_samples)})")
+        return "; ".join(parts) or None
+
+
+def targets_from_rows(rows: Iterable[Dict], exclusions: Optional[ExclusionList] = None) -> List[Target]:
+    """Filas de Supabase (dicts) -> Targets, validadas y sin IP repetidas."""
+    table = TargetTable.from_rows(((r.get("ip"), r.get("segment"), r.get("alias")) for r in rows), exclusions)
+    return list(table)
+
+
+def results_to_dataframe(results: Iterable[ScanResult]):
+    """Adaptador opcional a pandas (solo para exportar CSV / análisis ad-hoc)."""
+    import pandas as pd
+    return pd.DataFrame([r.to_dict() for r in results], columns=CSV_COLUMNS)
@@ -0,0 +1,260 @@
+# monitor_scheduler.py
+# Sondeo continuo del catálogo (modo serve --schedule / MONITOR_SCHEDULE=1).
+# - Cada host tiene su próxima sonda en un heap; al arrancar se reparten parejo en
+#   el intervalo (sin ráfaga inicial) y después se reprograman con jitter.
+# - Tope global de sondas por segundo (cubeta con espaciado fijo 1/pps): nunca hay
+#   ráfagas aunque muchos hosts venzan a la vez; si el parque no cabe en el intervalo
+#   al tope dado, el ciclo se estira en vez de amontonar sondas.
+# - Niveles por comportamiento reciente:
+#     hot   cambió de estado hace menos de hot_window_s (incluye los intermitentes)
+#     warm  el resto
+#     cold  sin cambios hace más de cold_after_s (estables arriba o caídos hace rato)
+#   Intervalo = interval_s * factor del nivel.
+# - Los resultados se guardan en memoria (un ScanResult por host) y se entregan en
+#   lotes cada flush_s a on_batch (historial, transiciones) en un hilo aparte; cada
+#   cycle_s la foto completa va a on_cycle (archivo, tendencias: como un barrido).
+# - Los reportes leen la foto en memoria (snapshot / view) sin barrer.
+import asyncio
+import heapq
+import random
+import threading
+import time
+import zlib
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from monitor_records import ScanResult, Target
+from monitor_sweep import SweepView
+from monitor_zones import ALL_ZONES_TOKEN, ZoneIndex
+
+TIERS = ("hot", "warm", "cold")
+
+
+class LiveHost:
+    __slots__ = ("target", "result", "probed_at", "changed_at", "tier", "due", "gen")
+
+    def __init__(self, target: Target, changed_at: float):
+        self.target = target
+        self.result: Optional[ScanResult] = None
+        self.probed_at = 0.0
+        self.changed_at = changed_at
+        self.tier = "warm"
+        self.due = 0.0
+        self.gen = 0  # invalida entradas viejas del heap al reprogramar
+
+
+class ProbeScheduler:
+    def __init__(self, pinger, load_targets: Callable[[], List[Target]], plan_for: Callable[[str], Tuple[int, ...]],
+                 make_result: Callable[[Target, Tuple], ScanResult], on_batch: Callable[[List[ScanResult]], None],
+                 on_cycle: Optional[Callable[[List[ScanResult]], None]] = None, changed_at: Optional[Callable[[str], float]] = None,
+                 interval_s: float = 60.0, max_pps: float = 50.0, jitter: float = 0.1,
+                 hot_factor: float = 0.25, cold_factor: float = 5.0, hot_window_s: float = 1800.0,
+                 cold_after_s: float = 86400.0, flush_s: float = 15.0, cycle_s: float = 900.0, catalog_refresh_s: float = 600.0,
+                 zone_index: Optional[Callable[[], ZoneIndex]] = None,
+                 probe: Optional[Callable[[Target, Tuple[int, ...]], Awaitable[Tuple]]] = None, log=print):
+        self.pinger = pinger                  # monitor_icmp.BackgroundPinger
+        # Sonda por host (monitor_probes.MultiProber); por defecto ICMP directo
+        self.probe = probe or (lambda t, plan: self.pinger.pinger.ping_plan(t.ip, plan))
+        self.load_targets = load_targets
+        self.plan_for = plan_for
+        self.make_result = make_result
+        self.on_batch = on_batch
+        self.on_cycle = on_cycle
+        self.changed_at = changed_at or (lambda ip: 0.0)
+        self.interval_s = interval_s
+        self.max_pps = max(0.1, max_pps)
+        self.jitter = jitter
+        self.factors = {"hot": hot_factor, "warm": 1.0, "cold": cold_factor}
+        self.hot_window_s = hot_window_s
+        self.cold_after_s = cold_after_s
+        self.flush_s = flush_s
+        self.cycle_s = cycle_s
+        self.catalog_refresh_s = catalog_refresh_s
+        self._zone_index = zone_index or ZoneIndex
+        self.log = log
+        self.hosts: Dict[str, LiveHost] = {}
+        self._heap: List[Tuple[float, int, str]] = []
+        self._mu = threading.Lock()           # hosts (el loop escribe, los pedidos HTTP leen)
+        self._batch: List[ScanResult] = []
+        self._stop = False
+        self._future = None
+        self.started_at = 0.0
+        self.probes = 0
+        self.behind_s = 0.0                   # atraso de la última sonda despachada
+
+    # ------------------------------------------------------------------ ciclo de vida
+    def start(self) -> None:
+        self.started_at = time.time()
+        self._reconcile(self.load_targets())
+        self._future = self.pinger.submit(self._main())
+        self.log(f"🗓️  Sondeo continuo: {len(self.hosts)} hosts cada ~{self.interval_s:.0f}s, tope {self.max_pps:.0f} sondas/s")
+
+    def stop(self) -> None:
+        self._stop = True
+        if self._future is not None:
+            try:
+                self._future.result(timeout=5)
+            except Exception:
+                pass
+
+    @property
+    def ready(self) -> bool:
+        """Todos los hosts del catálogo tienen al menos una sonda."""
+        hosts = self.hosts
+        return bool(hosts) and all(h.result is not None for h in list(hosts.values()))
+
+    # ------------------------------------------------------------------ programación
+    def _classify(self, h: LiveHost, now: float) -> str:
+        quiet = now - h.changed_at
+        if quiet < self.hot_window_s:
+            return "hot"
+        if quiet >= self.cold_after_s:
+            return "cold"
+        return "warm"
+
+    def _push(self, h: LiveHost, due: float) -> None:
+        h.gen += 1
+        h.due = due
+        heapq.heappush(self._heap, (due, h.gen, h.target.ip))
+
+    def _reconcile(self, targets: List[Target]) -> None:
+        """Altas y bajas del catálogo; los hosts nuevos se reparten en el intervalo."""
+        now = time.time()
+        # Los excluidos no se sondean: un punto que pasa a excluido sale como una baja
+        wanted = {t.ip: t for t in targets if not t.excluded}
+        with self._mu:
+            for ip in [ip for ip in self.hosts if ip not in wanted]:
+                del self.hosts[ip]  # su entrada del heap se descarta al salir
+            new = [t for ip, t in wanted.items() if ip not in self.hosts]
+            for t in wanted.values():
+                if t.ip in self.hosts:
+                    self.hosts[t.ip].target = t
+            # Orden por hash: las zonas quedan mezcladas en el tiempo, no en bloque
+            new.sort(key=lambda t: zlib.crc32(t.ip.encode()))
+            window = max(self.interval_s, len(new) / self.max_pps)
+            for i, t in enumerate(new):
+                h = self.hosts[t.ip] = LiveHost(t, self.changed_at(t.ip))
+                h.tier = self._classify(h, now)
+                self._push(h, now + window * i / max(1, len(new)))
+
+    def _reschedule(self, h: LiveHost, now: float) -> None:
+        h.tier = self._classify(h, now)
+        base = self.interval_s * self.factors[h.tier]
+        self._push(h, now + base * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    # ------------------------------------------------------------------ loop
+    async def _main(self) -> None:
+        loop = asyncio.get_running_loop()
+        spacing = 1.0 / self.max_pps
+        next_slot = time.time()
+        next_flush = time.time() + self.flush_s
+        next_cycle = time.time() + self.cycle_s
+        next_catalog = time.time() + self.catalog_refresh_s
+        tasks = set()
+        while not self._stop:
+            now = time.time()
+            if now >= next_flush:
+                next_flush = now + self.flush_s
+                await self._flush(loop)
+            if now >= next_cycle and self.on_cycle is not None and self.ready:
+                next_cycle = now + self.cycle_s
+                await loop.run_in_executor(None, self._safe, self.on_cycle, self.snapshot())
+            if now >= next_catalog:
+                next_catalog = now + self.catalog_refresh_s
+                try:
+                    targets = await loop.run_in_executor(None, self.load_targets)
+                    self._reconcile(targets)
+                except Exception as e:
+                    self.log(f"⚠️  Sondeo continuo: catálogo no actualizado ({e})")
+            if not self._heap:
+                await asyncio.sleep(0.5)
+                continue
+            due, gen, ip = self._heap[0]
+            if due > now:
+                await asyncio.sleep(min(due - now, 0.5))
+                continue
+            heapq.heappop(self._heap)
+            h = self.hosts.get(ip)
+            if h is None or h.gen != gen:
+                continue  # baja del catálogo o reprogramado
+            # Cubeta: una sonda cada 1/pps como máximo
+            next_slot = max(next_slot + spacing, now)
+            if next_slot > now:
+                await asyncio.sleep(next_slot - now)
+            self.behind_s = max(0.0, time.time() - due)
+            h.due = float("inf")  # en vuelo
+            task = asyncio.ensure_future(self._probe(h))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        for t in list(tasks):
+            t.cancel()
+        await self._flush(loop)
+
+    async def _probe(self, h: LiveHost) -> None:
+        ip = h.target.ip
+        try:
+            probe = await self.probe(h.target, self.plan_for(ip))
+            r = self.make_result(h.target, probe)
+        except Exception as e:
+            self.log(f"⚠️  Sondeo continuo {ip}: {e}")
+            self._reschedule(h, time.time())
+            return
+        now = time.time()
+        prev = h.result
+        if prev is not None and prev.active != r.active:
+            h.changed_at = now
+        h.result, h.probed_at = r, now
+        self.probes += 1
+        self._batch.append(r)
+        if ip in self.hosts:
+            self._reschedule(h, now)
+
+    async def _flush(self, loop) -> None:
+        if not self._batch:
+            return
+        batch, self._batch = self._batch, []
+        await loop.run_in_executor(None, self._safe, self.on_batch, batch)
+
+    def _safe(self, fn, arg) -> None:
+        try:
+            fn(arg)
+        except Exception as e:
+            self.log(f"⚠️  Sondeo continuo: {e}")
+
+    # ------------------------------------------------------------------ lectura
+    def snapshot(self, zonas: Optional[List[str]] = None) -> List[ScanResult]:
+        with self._mu:
+            hosts = list(self.hosts.values())
+        results = [h.result for h in hosts if h.result is not None]
+        if zonas and zonas[0] != ALL_ZONES_TOKEN:
+            index = self._zone_index()
+            results = [r for r in results if index.in_any(r.segment, zonas)]
+        return results
+
+    def view(self, zonas: Optional[List[str]] = None) -> SweepView:
+        """La foto en memoria con la forma de un barrido compartido (age_s = sonda más vieja)."""
+        with self._mu:
+            hosts = list(self.hosts.values())
+        if zonas and zonas[0] != ALL_ZONES_TOKEN:
+            index = self._zone_index()
+            hosts = [h for h in hosts if index.in_any(h.target.segment, zonas)]
+        hosts = [h for h in hosts if h.result is not None]
+        now = time.time()
+        oldest = min((h.probed_at for h in hosts), default=now)
+        newest = max((h.probed_at for h in hosts), default=now)
+        return SweepView([h.result for h in hosts], 0.0, now - oldest, True, newest, {"live": self.status()})
+
+    def status(self) -> Dict:
+        with self._mu:
+            hosts = list(self.hosts.values())
+        tiers = {t: 0 for t in TIERS}
+        for h in hosts:
+            tiers[h.tier] += 1
+        rate = sum(1.0 / (self.interval_s * self.factors[h.tier]) for h in hosts)
+        return {
+            "hosts": len(hosts),
+            "tiers": tiers,
+            "probes": self.probes,
+            "probes_per_s": round(min(rate, self.max_pps), 2),
+            "behind_s": round(self.behind_s, 1),
+            "uptime_s": round(time.time() - self.started_at, 1) if self.started_at else 0.0,
+        }
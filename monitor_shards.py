@@ -0,0 +1,220 @@
+# monitor_shards.py
+# Barrido repartido en varios procesos, para flotas donde un solo núcleo es el techo
+# (event loop + armado de resultados + historial compiten por el GIL).
+#
+#   MONITOR_SHARDS=4 (o auto = núcleos)   MONITOR_SHARD_BY=subnet | hash
+#
+# - Reparto:
+#     subnet  /24 completas por proceso (balanceo voraz por tamaño). Hosts detrás del
+#             mismo gateway quedan juntos: la topología se resuelve dentro de cada proceso.
+#     hash    hash multiplicativo de la ip: reparto parejo aunque haya pocas subredes.
+# - Cada proceso abre su propio socket ICMP y corre su propio event loop
+#   (monitor_icmp + monitor_probes, y GatewayGate si hay topología).
+# - Ida: ips uint32 + índices a tablas de segmentos y planes (arrays, sin Targets).
+#   Vuelta: por lotes de RESULT_CHUNK, índice local + activo + latencia + índice de motivo
+#   (+ LinkQuality.pack() de los hosts con ráfaga, en modo calidad).
+# - El proceso padre arma los ScanResult y hace una sola actualización de historial.
+# Procesos con "spawn": no heredan hilos ni el event loop del proceso residente.
+import os
+import time
+from array import array
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+STRATEGIES = ("subnet", "hash")
+RESULT_CHUNK = 1000
+ProbeResult = Tuple[bool, Optional[float], str]
+
+
+class ShardError(RuntimeError):
+    """Un proceso de sondeo falló (p. ej. sin socket ICMP): el llamador usa el motor de un proceso."""
+
+
+def resolve_workers(raw) -> int:
+    """'auto' -> núcleos disponibles; 0/1 -> sin reparto."""
+    raw = str(raw or "0").strip().lower()
+    if raw == "auto":
+        return os.cpu_count() or 1
+    return max(0, int(raw))
+
+
+def split(ips: Sequence[int], workers: int, strategy: str = "subnet") -> List[List[int]]:
+    """Índices de `ips` por proceso (listas vacías si hay menos grupos que procesos)."""
+    if strategy not in STRATEGIES:
+        raise ValueError(f"reparto desconocido: {strategy!r} (opciones: {', '.join(STRATEGIES)})")
+    workers = max(1, workers)
+    shards: List[List[int]] = [[] for _ in range(workers)]
+    if strategy == "hash":
+        for i, n in enumerate(ips):
+            shards[((n * 2654435761) & 0xFFFFFFFF) % workers].append(i)
+        return shards
+    subnets: Dict[int, List[int]] = {}
+    for i, n in enumerate(ips):
+        subnets.setdefault(n >> 8, []).append(i)
+    # Voraz: la subred más grande al proceso con menos hosts
+    for group in sorted(subnets.values(), key=len, reverse=True):
+        min(shards, key=len).extend(group)
+    return shards
+
+
+# ============================================================================
+# Proceso hijo
+# ============================================================================
+@asynccontextmanager
+async def icmp_prober(max_in_flight: int, probes_json: Optional[str] = None, tcp_max_in_flight: int = 256,
+                      burst: int = 0, burst_interval_ms: float = 20.0):
+    """Prober por defecto: AsyncPinger propio + MultiProber (mismo mapa de sondas y ráfaga que el padre)."""
+    import monitor_icmp
+    from monitor_probes import MultiProber, ProbeMap
+    async with monitor_icmp.AsyncPinger(max_in_flight=max_in_flight, burst=burst, burst_interval_ms=burst_interval_ms) as pinger:
+        yield MultiProber(pinger, ProbeMap.load(probes_json), max_in_flight=tcp_max_in_flight)
+
+
+class _Chunk:
+    """Resultados compactos de un lote: índice local, activo, latencia (-1 = None), motivo, calidad (dispersa)."""
+
+    def __init__(self):
+        self.idx = array("I")
+        self.active = bytearray()
+        self.latency = array("d")
+        self.reason = array("H")
+        self.reasons: Dict[str, int] = {}
+        self.quality: Dict[int, List] = {}  # posición en el lote -> LinkQuality.pack()
+
+    def __len__(self) -> int:
+        return len(self.idx)
+
+    def add(self, i: int, r: ProbeResult, quality=None) -> None:
+        if quality is not None:
+            self.quality[len(self.idx)] = quality.pack()
+        rid = self.reasons.get(r[2])
+        if rid is None:
+            rid = self.reasons[r[2]] = len(self.reasons)
+        self.idx.append(i)
+        self.active.append(1 if r[0] else 0)
+        self.latency.append(-1.0 if r[1] is None else float(r[1]))
+        self.reason.append(rid)
+
+    def pack(self) -> Tuple:
+        return ("results", self.idx, bytes(self.active), self.latency, self.reason, list(self.reasons), self.quality)
+
+
+async def _probe_shard(conn, job: Dict, prober: Callable, prober_args: Tuple) -> Dict:
+    import asyncio
+    from monitor_records import format_ipv4
+    ips = [format_ipv4(n) for n in job["ips"]]
+    segs, segments = job["segs"], job["segments"]
+    plans, plan_table = job["plans"], job["plan_table"]
+    started = time.perf_counter()
+    async with prober(*prober_args) as p:
+        probe = p.ping_plan
+        gate = None
+        if job.get("topology"):
+            from monitor_topology import GatewayGate, Topology
+            topology = Topology.load(job["topology"])
+            if topology is not None:
+                gate = GatewayGate(topology, p.ping_plan, tuple(job["gateway_plan"]), job.get("topology_sample", 2))
+                probe = gate.probe
+        quality = getattr(p, "quality", {})
+        pending = iter(range(len(ips)))
+        chunk = [_Chunk()]
+
+        async def _worker():
+            for i in pending:  # iterador compartido: cada corrutina toma el siguiente
+                r = await probe(ips[i], plan_table[plans[i]], segments[segs[i]])
+                chunk[0].add(i, r, quality.get(ips[i]) if r[0] else None)
+                if len(chunk[0]) >= RESULT_CHUNK:
+                    conn.send(chunk[0].pack())
+                    chunk[0] = _Chunk()
+            if gate is not None:
+                gate.close()  # todos los hosts del shard ya entraron al gate
+
+        await asyncio.gather(*(_worker() for _ in range(max(1, min(job["in_flight"], len(ips))))))
+        if len(chunk[0]):
+            conn.send(chunk[0].pack())
+    return {"hosts": len(ips), "probe_s": round(time.perf_counter() - started, 4), "pid": os.getpid()}
+
+
+def _worker_main(conn, job: Dict, prober: Callable, prober_args: Tuple) -> None:
+    import asyncio
+    try:
+        conn.send(("done", asyncio.run(_probe_shard(conn, job, prober, prober_args))))
+    except BaseException as e:
+        try:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+        except Exception:
+            pass
+    finally:
+        conn.close()
+
+
+# ============================================================================
+# Proceso padre
+# ============================================================================
+def run(ips: Sequence[int], segments: Sequence[str], plans: Sequence[Tuple[int, ...]],
+        on_results: Callable[[List[int], bytes, Sequence[float], Sequence[int], List[str], Dict[int, List]], None],
+        workers: int, strategy: str = "subnet", in_flight: int = 2000,
+        prober: Callable = icmp_prober, prober_args: Tuple = (), topology: Optional[Dict] = None) -> Dict:
+    """
+    Sondea ips (uint32) repartidas en `workers` procesos. on_results recibe cada lote con
+    índices globales (posición en `ips`) y la calidad por posición en el lote.
+    segments/plans son paralelos a ips.
+    topology: {"path", "gateway_plan", "sample"} o None. Lanza ShardError si un proceso falla.
+    """
+    import multiprocessing
+    from multiprocessing.connection import wait
+
+    shards = [s for s in split(ips, workers, strategy) if s]
+    per_worker = max(1, in_flight // max(1, len(shards)))
+    ctx = multiprocessing.get_context("spawn")
+    conns: Dict = {}
+    procs = []
+    started = time.perf_counter()
+    try:
+        for shard in shards:
+            seg_ids: Dict[str, int] = {}
+            plan_ids: Dict[Tuple[int, ...], int] = {}
+            job = {
+                "ips": array("I", (ips[i] for i in shard)),
+                "segs": array("I", (seg_ids.setdefault(segments[i], len(seg_ids)) for i in shard)),
+                "plans": array("I", (plan_ids.setdefault(tuple(plans[i]), len(plan_ids)) for i in shard)),
+                "in_flight": per_worker,
+            }
+            job["segments"] = list(seg_ids)
+            job["plan_table"] = list(plan_ids)
+            if topology:
+                job.update(topology=topology["path"], gateway_plan=list(topology["gateway_plan"]),
+                           topology_sample=topology.get("sample", 2))
+            recv, send = ctx.Pipe(duplex=False)
+            proc = ctx.Process(target=_worker_main, args=(send, job, prober, prober_args), daemon=True)
+            proc.start()
+            send.close()  # el padre solo lee: EOF cuando el hijo cierra su extremo
+            conns[recv] = shard
+            procs.append(proc)
+
+        workers_info: List[Dict] = []
+        while conns:
+            for conn in wait(list(conns)):
+                shard = conns[conn]
+                try:
+                    msg = conn.recv()
+                except EOFError:
+                    raise ShardError("un proceso de sondeo terminó sin reportar")
+                if msg[0] == "results":
+                    _, idx, active, latency, reason, reasons, quality = msg
+                    on_results([shard[i] for i in idx], active, latency, reason, reasons, quality)
+                elif msg[0] == "done":
+                    workers_info.append(msg[1])
+                    conn.close()
+                    del conns[conn]
+                else:
+                    raise ShardError(msg[1])
+        return {"workers": len(shards), "strategy": strategy, "wall_s": round(time.perf_counter() - started, 4),
+                "per_worker": sorted(workers_info, key=lambda w: -w["hosts"])}
+    finally:
+        for conn in conns:
+            conn.close()
+        for proc in procs:
+            proc.join(timeout=5)
+            if proc.is_alive():
+                proc.terminate()
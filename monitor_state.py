@@ -0,0 +1,422 @@
+# monitor_state.py
+# Estado por IP del monitor en SQLite (modo WAL) en lugar de reescribir state_history.json.
+# - Una fila por host, con índices por segmento y por fecha de escritura.
+# - Cada escaneo escribe en UNA transacción solo las filas que cambiaron:
+#   transiciones (last_state, active_since, state_changes...) siempre; los campos
+#   que se mueven en cada barrido (last_scan, last_seen_active, latencia) solo cuando
+#   se alejan lo suficiente de lo guardado (MONITOR_STATE_TOUCH_S / LAT_EPSILON).
+#   La calidad de enlace (modo calidad) va compacta en una columna JSON
+#   [enviados, recibidos, min, prom, max, p95, jitter] con el mismo criterio.
+#   Así el I/O por barrido escala con los cambios, no con el tamaño del parque.
+#   La EWMA de latencia no escrita se sigue acumulando en memoria (contra el último
+#   valor escrito), para que una deriva lenta termine llegando a disco.
+# - Cada barrido relee sus filas dentro de la misma transacción IMMEDIATE en la que
+#   escribe: dos escritores solapados (serve + CLI, scheduler + barrido) no se pisan.
+#   write_seq (uno por transacción) dice qué filas cambiaron desde que una vista las
+#   leyó, sin depender de relojes: solo esas se vuelven a leer.
+# - Retención: los hosts que salieron del catálogo se compactan pasado un plazo.
+# - Migración automática desde state_history.json la primera vez.
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from monitor_analytics import DEFAULT_TAU_S, close_interval
+from monitor_policy import update_latency_stats
+from monitor_quality import quality_changed
+from monitor_records import ScanResult
+
+_FIELDS = ("alias", "segment", "first_seen", "state_changes", "last_state", "last_seen_active",
+           "active_since", "last_state_change", "last_scan", "lat_ewma", "lat_dev",
+           "up_s", "down_s", "n_down", "n_up", "ewma_avail", "quality")
+# Campos que solo cambian en una transición: cualquier diferencia se escribe
+_TRANSITION_FIELDS = ("alias", "segment", "first_seen", "state_changes", "last_state",
+                      "active_since", "last_state_change", "up_s", "down_s", "n_down", "n_up", "ewma_avail")
+# Columnas agregadas después de la primera versión del esquema (ALTER TABLE al abrir)
+_ADDED_COLUMNS = {
+    "up_s": "REAL NOT NULL DEFAULT 0",       # monitor_analytics: intervalos cerrados
+    "down_s": "REAL NOT NULL DEFAULT 0",
+    "n_down": "INTEGER NOT NULL DEFAULT 0",
+    "n_up": "INTEGER NOT NULL DEFAULT 0",    # reparaciones (abajo -> arriba) con su down_s
+    "ewma_avail": "REAL",
+    "quality": "TEXT",                       # monitor_quality: última ráfaga (JSON compacto)
+    "write_seq": "INTEGER NOT NULL DEFAULT 0",  # transacción que escribió la fila por última vez
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS host_state (
+    ip                TEXT PRIMARY KEY,
+    alias             TEXT,
+    segment           TEXT,
+    first_seen        TEXT,
+    state_changes     INTEGER NOT NULL DEFAULT 0,
+    last_state        INTEGER,
+    last_seen_active  TEXT,
+    active_since      TEXT,
+    last_state_change TEXT,
+    last_scan         TEXT,
+    lat_ewma          REAL,
+    lat_dev           REAL,
+    up_s              REAL NOT NULL DEFAULT 0,
+    down_s            REAL NOT NULL DEFAULT 0,
+    n_down            INTEGER NOT NULL DEFAULT 0,
+    n_up              INTEGER NOT NULL DEFAULT 0,
+    ewma_avail        REAL,
+    quality           TEXT,
+    write_seq         INTEGER NOT NULL DEFAULT 0,
+    updated_at        REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_host_state_segment ON host_state(segment);
+CREATE INDEX IF NOT EXISTS ix_host_state_updated ON host_state(updated_at);
+"""
+
+_CHUNK = 500  # límite práctico de parámetros por IN (...)
+
+
+def _row_to_dict(row: sqlite3.Row) -> Dict:
+    d = {k: row[k] for k in _FIELDS}
+    if d["last_state"] is not None:
+        d["last_state"] = bool(d["last_state"])
+    d["state_changes"] = int(d["state_changes"] or 0)
+    d["n_down"] = int(d["n_down"] or 0)
+    d["n_up"] = int(d["n_up"] or 0)
+    if d["quality"] is not None:
+        d["quality"] = json.loads(d["quality"])
+    return d
+
+
+def _seconds_between(a: Optional[str], b: Optional[str]) -> Optional[float]:
+    try:
+        return (datetime.fromisoformat(b) - datetime.fromisoformat(a)).total_seconds()
+    except (TypeError, ValueError):
+        return None
+
+
+class StateView:
+    """
+    Vista tipo dict (ip -> fila) sobre el store. Las filas se leen bajo demanda por
+    clave primaria (o en lote con prefetch) y quedan en memoria para el resto del barrido.
+    """
+
+    def __init__(self, store: "StateStore"):
+        self.store = store
+        self._rows: Dict[str, Optional[Dict]] = {}
+        self.complete = False     # True si se cargó la tabla entera
+        self.loaded_at = 0.0
+        self.seq: Optional[int] = None  # write_seq del disco cuando se leyó la primera fila
+
+    def _reading(self) -> None:
+        if self.seq is None:
+            self.seq = self.store.write_seq()
+
+    def prefetch(self, ips: Iterable[str]) -> None:
+        missing = [ip for ip in ips if ip not in self._rows]
+        if not missing:
+            return
+        self._reading()
+        found = self.store.get_many(missing)
+        for ip in missing:
+            self._rows[ip] = found.get(ip)
+
+    def get(self, ip: str, default=None) -> Optional[Dict]:
+        if ip not in self._rows:
+            if self.complete:
+                return default
+            self._reading()
+            self._rows[ip] = self.store.get(ip)
+        row = self._rows[ip]
+        return default if row is None else row
+
+    def __getitem__(self, ip: str) -> Dict:
+        row = self.get(ip)
+        if row is None:
+            raise KeyError(ip)
+        return row
+
+    def __contains__(self, ip: str) -> bool:
+        return self.get(ip) is not None
+
+    def __len__(self) -> int:
+        return sum(1 for r in self._rows.values() if r is not None) if self.complete else self.store.count()
+
+    def __iter__(self) -> Iterator[str]:
+        if not self.complete:
+            self.load_all()
+        return (ip for ip, r in list(self._rows.items()) if r is not None)
+
+    def load_all(self) -> "StateView":
+        self.loaded_at = time.time()
+        self.seq = self.store.write_seq()
+        self._rows = {ip: row for ip, row in self.store.iter_rows()}
+        self.complete = True
+        return self
+
+    def refresh(self) -> int:
+        """Vista completa en memoria (modo serve): trae lo que otros procesos escribieron."""
+        if not self.complete:
+            return 0
+        self.loaded_at = time.time()
+        return self._catch_up()
+
+    def _catch_up(self) -> int:
+        seq = self.store.write_seq()
+        if self.seq is None or seq == self.seq:
+            self.seq = seq
+            return 0
+        changed = self.store.changed_after(self.seq)
+        self._rows.update(changed)
+        self.seq = seq
+        return len(changed)
+
+    def current(self, ips: List[str]) -> Dict[str, Dict]:
+        """
+        Filas de ips tal como están en disco ahora (llamar con el lock de escritura tomado):
+        lo ya leído, corregido con lo que otros escribieron desde entonces.
+        """
+        if self.seq is not None:
+            self._catch_up()
+        if not self.complete:
+            self.prefetch(ips)
+        return {ip: self._rows[ip] for ip in ips if self._rows.get(ip) is not None}
+
+    def _remember(self, ip: str, row: Optional[Dict]) -> None:
+        self._rows[ip] = row
+
+
+class StateStore:
+    def __init__(self, path: str, touch_s: float = 300.0, lat_epsilon: float = 0.2, retention_s: float = 30 * 86400.0,
+                 ewma_tau_s: float = DEFAULT_TAU_S, log=print):
+        self.path = path
+        self.ewma_tau_s = ewma_tau_s    # EWMA de disponibilidad por host (monitor_analytics)
+        self.touch_s = touch_s          # máx. atraso de last_scan / last_seen_active en disco
+        self.lat_epsilon = lat_epsilon  # cambio relativo de latencia que amerita escribir
+        self.retention_s = retention_s
+        self.log = log
+        # ip -> (lat_ewma, lat_dev en disco, lat_ewma, lat_dev acumuladas sin escribir)
+        self._lat_pending: Dict[str, Tuple[Optional[float], Optional[float], float, float]] = {}
+        self._local = threading.local()  # una conexión por hilo (modo serve atiende en paralelo)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+        have = {row["name"] for row in conn.execute("PRAGMA table_info(host_state)")}
+        for col, decl in _ADDED_COLUMNS.items():
+            if col not in have:
+                conn.execute(f"ALTER TABLE host_state ADD COLUMN {col} {decl}")
+        if "n_up" not in have and "n_down" in have:
+            # Antes se derivaba state_changes - n_down: exacto en filas nacidas aquí; en las
+            # migradas de state_history.json (state_changes heredado) se acota por la
+            # alternancia de estados, y sin tiempo caído no hay reparación que medir
+            conn.execute("UPDATE host_state SET n_up = MIN(MAX(state_changes - n_down, 0), n_down + 1) WHERE down_s > 0")
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_host_state_seq ON host_state(write_seq)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ------------------------------------------------------------------ lecturas
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM host_state").fetchone()[0]
+
+    def get(self, ip: str) -> Optional[Dict]:
+        row = self._conn().execute("SELECT * FROM host_state WHERE ip = ?", (ip,)).fetchone()
+        return _row_to_dict(row) if row is not None else None
+
+    def get_many(self, ips: Iterable[str]) -> Dict[str, Dict]:
+        ips = list(ips)
+        out: Dict[str, Dict] = {}
+        conn = self._conn()
+        for i in range(0, len(ips), _CHUNK):
+            chunk = ips[i:i + _CHUNK]
+            q = f"SELECT * FROM host_state WHERE ip IN ({','.join('?' * len(chunk))})"
+            for row in conn.execute(q, chunk):
+                out[row["ip"]] = _row_to_dict(row)
+        return out
+
+    def by_segment(self, segment: str) -> Dict[str, Dict]:
+        rows = self._conn().execute("SELECT * FROM host_state WHERE segment = ?", (segment,))
+        return {row["ip"]: _row_to_dict(row) for row in rows}
+
+    def iter_rows(self):
+        for row in self._conn().execute("SELECT * FROM host_state"):
+            yield row["ip"], _row_to_dict(row)
+
+    def write_seq(self) -> int:
+        return self._conn().execute("SELECT COALESCE(MAX(write_seq), 0) FROM host_state").fetchone()[0]
+
+    def changed_after(self, seq: int) -> Dict[str, Dict]:
+        rows = self._conn().execute("SELECT * FROM host_state WHERE write_seq > ?", (seq,))
+        return {row["ip"]: _row_to_dict(row) for row in rows}
+
+    def changed_since(self, ts: float) -> Dict[str, Dict]:
+        rows = self._conn().execute("SELECT * FROM host_state WHERE updated_at > ?", (ts,))
+        return {row["ip"]: _row_to_dict(row) for row in rows}
+
+    def view(self) -> StateView:
+        return StateView(self)
+
+    # ------------------------------------------------------------------ escrituras
+    def _needs_write(self, old: Optional[Dict], new: Dict) -> bool:
+        if old is None:
+            return True
+        if any(old.get(k) != new.get(k) for k in _TRANSITION_FIELDS):
+            return True
+        for k in ("last_scan", "last_seen_active"):
+            lag = _seconds_between(old.get(k), new.get(k))
+            if (old.get(k) is None) != (new.get(k) is None) or (lag is not None and lag >= self.touch_s):
+                return True
+        if quality_changed(old.get("quality"), new.get("quality"), self.lat_epsilon):
+            return True
+        o, n = old.get("lat_ewma"), new.get("lat_ewma")
+        if (o is None) != (n is None):
+            return True
+        return o is not None and abs(n - o) > max(1.0, self.lat_epsilon * o)
+
+    def upsert(self, rows: Dict[str, Dict]) -> None:
+        if not rows:
+            return
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._write(conn, rows)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _write(self, conn: sqlite3.Connection, rows: Dict[str, Dict]) -> None:
+        """INSERT ... ON CONFLICT de las filas, dentro de la transacción del llamador."""
+        if not rows:
+            return
+        now = time.time()
+        seq = conn.execute("SELECT COALESCE(MAX(write_seq), 0) + 1 FROM host_state").fetchone()[0]
+        cols = ("ip",) + _FIELDS + ("write_seq", "updated_at")
+        params = []
+        for ip, r in rows.items():
+            vals = [ip] + [r.get(k) for k in _FIELDS] + [seq, now]
+            ls = r.get("last_state")
+            vals[1 + _FIELDS.index("last_state")] = None if ls is None else int(bool(ls))
+            q = r.get("quality")
+            vals[1 + _FIELDS.index("quality")] = None if q is None else json.dumps(q, separators=(",", ":"))
+            params.append(vals)
+        sql = (f"INSERT INTO host_state ({','.join(cols)}) VALUES ({','.join('?' * len(cols))}) "
+               f"ON CONFLICT(ip) DO UPDATE SET " + ", ".join(f"{c}=excluded.{c}" for c in cols[1:]))
+        conn.executemany(sql, params)
+
+    def apply_scan(self, results: List[ScanResult], view: Optional[StateView] = None,
+                   now_iso: Optional[str] = None, ewma_alpha: float = 0.3) -> int:
+        """
+        Aplica un barrido (misma lógica que el antiguo update_state_history). Devuelve filas escritas.
+        Las filas se toman bajo el lock de escritura (StateView.current): lo que otro
+        proceso o hilo escribió desde la lectura de la vista no se pisa.
+        """
+        view = view or self.view()
+        now_iso = now_iso or datetime.now().isoformat()
+        live = [r for r in results if not r.excluded]
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            current = view.current([r.ip for r in live])
+            rows, dirty = self._apply(live, current, now_iso, ewma_alpha)
+            self._write(conn, dirty)
+            self._track_latency(rows, dirty, current)  # bajo el lock: otro hilo no lo ve a medias
+            seq = self.write_seq() if dirty else None
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        for ip, h in dirty.items():
+            view._remember(ip, h)
+        if seq is not None and view.seq is not None:
+            view.seq = seq  # lo escrito ya está en la vista
+        return len(dirty)
+
+    def _track_latency(self, rows: Dict[str, Dict], dirty: Dict[str, Dict], current: Dict[str, Dict]) -> None:
+        for ip, h in rows.items():
+            old = current.get(ip)
+            if ip in dirty or old is None:
+                self._lat_pending.pop(ip, None)
+            elif (h.get("lat_ewma"), h.get("lat_dev")) != (old.get("lat_ewma"), old.get("lat_dev")):
+                self._lat_pending[ip] = (old.get("lat_ewma"), old.get("lat_dev"), h["lat_ewma"], h["lat_dev"])
+
+    def _apply(self, live: List[ScanResult], current: Dict[str, Dict], now_iso: str,
+               ewma_alpha: float) -> Tuple[Dict[str, Dict], Dict[str, Dict]]:
+        """(estado nuevo de cada host, solo las filas que ameritan escribirse)."""
+        rows: Dict[str, Dict] = {}
+        dirty: Dict[str, Dict] = {}
+        for result in live:
+            ip = result.ip
+            is_active = bool(result.active)
+            old = current.get(ip)
+            h = dict(old) if old else {"alias": result.alias, "segment": result.segment, "first_seen": now_iso, "state_changes": 0, "last_state": None, "last_seen_active": None, "active_since": None, "last_state_change": None, "last_scan": None, "lat_ewma": None, "lat_dev": None, "up_s": 0.0, "down_s": 0.0, "n_down": 0, "n_up": 0, "ewma_avail": None, "quality": None}
+            pending = self._lat_pending.get(ip)
+            if pending is not None and old is not None and pending[:2] == (old.get("lat_ewma"), old.get("lat_dev")):
+                h["lat_ewma"], h["lat_dev"] = pending[2], pending[3]  # sigue la EWMA acumulada sin escribir
+            prev_state = h.get("last_state")
+            h["alias"], h["segment"] = result.alias, result.segment
+            h["last_state"] = is_active
+            h["last_scan"] = now_iso
+            if is_active:
+                h["last_seen_active"] = now_iso
+                if prev_state is False or not h.get("active_since"): h["active_since"] = now_iso
+                if result.latency is not None:
+                    update_latency_stats(h, result.latency, ewma_alpha)
+                if result.quality is not None:
+                    h["quality"] = list(result.quality)
+            if prev_state is not None and prev_state != is_active:
+                close_interval(h, prev_state, now_iso, self.ewma_tau_s)
+                h["state_changes"] = int(h.get("state_changes", 0)) + 1
+                h["last_state_change"] = now_iso
+                if is_active is False: h["active_since"] = None
+            # Se compara contra lo que está en disco; la latencia no escrita queda en _lat_pending
+            rows[ip] = h
+            if self._needs_write(old, h):
+                dirty[ip] = h
+        return rows, dirty
+
+    def compact(self, live_ips: Iterable[str], now: Optional[datetime] = None) -> int:
+        """Borra hosts fuera del catálogo sin escanear hace más de retention_s."""
+        cutoff = ((now or datetime.now()).timestamp() - self.retention_s)
+        cutoff_iso = datetime.fromtimestamp(cutoff).isoformat()
+        conn = self._conn()
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS live_ips (ip TEXT PRIMARY KEY)")
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM live_ips")
+            conn.executemany("INSERT OR IGNORE INTO live_ips (ip) VALUES (?)", ((ip,) for ip in live_ips))
+            cur = conn.execute(
+                "DELETE FROM host_state WHERE ip NOT IN (SELECT ip FROM live_ips) "
+                "AND (last_scan IS NULL OR last_scan < ?)", (cutoff_iso,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return cur.rowcount
+
+    def import_json(self, json_path: str) -> int:
+        """Migración única desde state_history.json (si la tabla está vacía)."""
+        if self.count() > 0 or not os.path.exists(json_path):
+            return 0
+        try:
+            with open(json_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            self.log(f"⚠️  No se pudo leer {json_path} para migrar: {e}")
+            return 0
+        rows = {ip: {k: (entry or {}).get(k) for k in _FIELDS} for ip, entry in data.items()}
+        for r in rows.values():
+            r["state_changes"] = int(r.get("state_changes") or 0)
+            # Los contadores arrancan en cero: state_changes viejo no tiene intervalos detrás
+            r["up_s"], r["down_s"], r["n_down"], r["n_up"] = 0.0, 0.0, 0, 0
+        self.upsert(rows)
+        os.replace(json_path, json_path + ".migrated")
+        self.log(f"🗄️  Historial migrado a SQLite: {len(rows)} IPs ({json_path} -> .migrated)")
+        return len(rows)
@@ -0,0 +1,111 @@
+# monitor_stream.py
+# Salida NDJSON (--stream): un objeto JSON por línea, escrito apenas ocurre.
+#   {"event": "catalog",  "t": 0.41, "queued": 340, "pages": 1, "done": false}
+#   {"event": "host",     "t": 0.62, "ip": "...", "alias": "...", "segment": "...", "active": false, ...}
+#   {"event": "progress", "t": 1.10, "done": 210, "total": 340, "offline": 12}
+#   {"event": "summary",  ...}   {"event": "report", ...}   {"event": "chart", ...}
+#   {"event": "done", "payload": {...}}   (el mismo payload de --json)
+#   {"event": "error", "error": "..."}
+# "t" = segundos desde que arrancó main(). Los eventos con "replay": true vienen de
+# un barrido ya terminado (ventana de frescura / otro proceso): llegan todos de una vez.
+# "progress" lo emite un hilo cada progress_s desde el primer "catalog" hasta el cierre
+# del barrido, haya o no hosts nuevos: un barrido trabado sigue dando señales de vida.
+import json
+import sys
+import threading
+import time
+from typing import Dict, Iterable, Optional, Set
+
+from monitor_records import ScanResult
+
+HOSTS_OFFLINE = "offline"
+HOSTS_ALL = "all"
+
+
+class EventStream:
+    def __init__(self, out=None, hosts: str = HOSTS_OFFLINE, progress_s: float = 0.5):
+        self.out = out or sys.stdout
+        self.hosts = hosts
+        self.progress_s = progress_s
+        self._t0 = time.monotonic()
+        self._lock = threading.Lock()
+        self._sent: Set[str] = set()   # IPs ya emitidas (el replay no las repite)
+        self._ticker: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.total: Optional[int] = None
+        self.done = 0
+        self.offline = 0
+
+    def emit(self, event: str, **data) -> None:
+        line = json.dumps({"event": event, "t": round(time.monotonic() - self._t0, 3), **data},
+                          ensure_ascii=False, default=str)
+        with self._lock:
+            self.out.write(line + "\n")
+            self.out.flush()
+
+    def catalog(self, queued: int, pages: Optional[int] = None, done: bool = False, replay: bool = False) -> None:
+        if done:
+            self.total = queued
+        data = {"queued": queued, "done": done}
+        if pages is not None: data["pages"] = pages
+        if replay: data["replay"] = True
+        self.emit("catalog", **data)
+        if not replay:
+            self._start_ticker()
+
+    def _start_ticker(self) -> None:
+        with self._lock:
+            if self._ticker is not None or self._stop.is_set():
+                return
+            self._ticker = threading.Thread(target=self._tick, name="stream-progress", daemon=True)
+        self._ticker.start()
+
+    def _tick(self) -> None:
+        while not self._stop.wait(self.progress_s):
+            self.progress()
+
+    def stop(self) -> None:
+        """Corta el hilo de progreso; después de esto no sale ningún "progress" periódico."""
+        self._stop.set()
+        ticker = self._ticker
+        if ticker is not None and ticker is not threading.current_thread():
+            ticker.join()
+
+    def host(self, r: ScanResult, replay: bool = False) -> None:
+        with self._lock:
+            if r.ip in self._sent:
+                return
+            self._sent.add(r.ip)
+            self.done += 1
+            down = not r.active and not r.excluded
+            if down: self.offline += 1
+        if self.hosts == HOSTS_ALL or down:
+            data = {"ip": r.ip, "alias": r.alias, "segment": r.segment, "active": r.active,
+                    "latency": r.latency, "reason": r.ping_reason, "state_change": r.state_change}
+            if r.excluded: data["excluded"] = True
+            if replay: data["replay"] = True
+            self.emit("host", **data)
+
+    def progress(self) -> None:
+        self.emit("progress", done=self.done, total=self.total, offline=self.offline)
+
+    def replay(self, results: Iterable[ScanResult]) -> None:
+        """Completa el stream con resultados que no pasaron por el sondeo en vivo."""
+        results = list(results)
+        if self.total is None:
+            self.catalog(len(results), done=True, replay=True)
+        for r in results:
+            self.host(r, replay=True)
+        self.stop()
+        self.progress()
+
+    def summary(self, **data) -> None:
+        self.emit("summary", **data)
+
+    def error(self, message: str) -> None:
+        self.stop()
+        self.emit("error", ok=False, error=message)
+
+    def finish(self, payload: Dict) -> None:
+        self.stop()
+        self.emit("done", payload=payload)
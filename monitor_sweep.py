@@ -0,0 +1,242 @@
+# monitor_sweep.py
+# Un solo barrido a la vez contra la red de puntos, sin importar cuántos pidan reporte.
+# - Single-flight: si llega un pedido mientras hay un barrido en curso que lo cubre,
+#   se engancha a ese barrido en lugar de lanzar otro.
+# - Ventana de frescura: dentro de MONITOR_FRESHNESS_S se responde con el último
+#   barrido completado (y el reporte indica su antigüedad).
+# - Entre procesos (bot que lanza el CLI + modo serve): lock de archivo alrededor
+#   del barrido y caché en disco del último resultado (PuntosReportes/last_sweep.json).
+#   El lock también serializa las escrituras del historial (state.db).
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from monitor_records import ScanResult
+from monitor_zones import ALL_ZONES_TOKEN, ZoneIndex, norm_text
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+CACHE_VERSION = 1
+
+
+class FileLock:
+    """Lock exclusivo entre procesos (flock en Linux, msvcrt.locking en Windows)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fh = None
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._fh = open(self.path, "a+")
+        if fcntl is not None:
+            fcntl.flock(self._fh.fileno(), fcntl.LOCK_EX)
+        else:
+            self._fh.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(self._fh.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue  # LK_LOCK reintenta ~10s y luego falla; seguimos esperando
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._fh.fileno(), fcntl.LOCK_UN)
+            else:
+                self._fh.seek(0)
+                msvcrt.locking(self._fh.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self._fh.close()
+            self._fh = None
+
+
+class Sweep:
+    __slots__ = ("zonas", "results", "meta", "started_at", "finished_at", "duration", "error", "done")
+
+    def __init__(self, zonas: Optional[List[str]]):
+        self.zonas = zonas
+        self.results: Optional[List[ScanResult]] = None
+        self.meta: Dict = {}
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.duration = 0.0
+        self.error: Optional[BaseException] = None
+        self.done = threading.Event()
+
+    def covers(self, zonas: Optional[List[str]]) -> bool:
+        """¿Este barrido incluye todos los puntos que pide `zonas`?"""
+        if not self.zonas or self.zonas[0] == ALL_ZONES_TOKEN:
+            return True
+        if not zonas or zonas[0] == ALL_ZONES_TOKEN:
+            return False
+        return {norm_text(z) for z in zonas} <= {norm_text(z) for z in self.zonas}
+
+    def age(self) -> float:
+        return max(0.0, time.time() - (self.finished_at or time.time()))
+
+
+class SweepView:
+    """Lo que recibe un pedido: resultados ya filtrados a sus zonas + procedencia."""
+    __slots__ = ("results", "duration", "age_s", "shared", "finished_at", "meta")
+
+    def __init__(self, results: List[ScanResult], duration: float, age_s: float, shared: bool, finished_at: float, meta: Optional[Dict] = None):
+        self.results = results
+        self.meta = meta or {}
+        self.duration = duration
+        self.age_s = age_s
+        self.shared = shared
+        self.finished_at = finished_at
+
+
+class SweepCoordinator:
+    def __init__(self, cache_path: str, lock_path: str, freshness_s: float = 60.0,
+                 zone_index: Optional[Callable[[], ZoneIndex]] = None, log: Callable[[str], None] = print):
+        self.cache_path = cache_path
+        self.lock_path = lock_path
+        self.freshness_s = freshness_s
+        self._zone_index = zone_index or ZoneIndex
+        self.log = log
+        self._mu = threading.Lock()
+        self._inflight: Optional[Sweep] = None
+        self._last: Optional[Sweep] = None
+        self._last_mtime = 0.0
+
+    # ------------------------------------------------------------------ caché en disco
+    def _read_cache(self) -> Optional[Sweep]:
+        try:
+            mtime = os.path.getmtime(self.cache_path)
+        except OSError:
+            return None
+        if self._last is not None and mtime <= self._last_mtime:
+            return self._last  # nada nuevo en disco
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception:
+            return None
+        if data.get("version") != CACHE_VERSION:
+            return None
+        sweep = Sweep(data.get("zonas"))
+        sweep.started_at = float(data.get("started_at") or 0)
+        sweep.finished_at = float(data.get("finished_at") or 0)
+        sweep.duration = float(data.get("duration_s") or 0)
+        sweep.results = [ScanResult.from_dict(d) for d in data.get("results") or []]
+        sweep.meta = data.get("meta") or {}
+        sweep.done.set()
+        if self._last is None or sweep.finished_at > (self._last.finished_at or 0):
+            self._last, self._last_mtime = sweep, mtime
+        return self._last
+
+    def _write_cache(self, sweep: Sweep) -> float:
+        tmp = self.cache_path + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.cache_path)), exist_ok=True)
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({
+                    "version": CACHE_VERSION,
+                    "zonas": sweep.zonas,
+                    "started_at": sweep.started_at,
+                    "finished_at": sweep.finished_at,
+                    "duration_s": sweep.duration,
+                    "meta": sweep.meta,
+                    "results": [r.to_dict() for r in sweep.results],
+                }, f, ensure_ascii=False)
+            os.replace(tmp, self.cache_path)
+            return os.path.getmtime(self.cache_path)
+        except Exception as e:
+            self.log(f"⚠️  No se pudo guardar el último barrido: {e}")
+            return 0.0
+
+    def _fresh(self, zonas: Optional[List[str]], max_age_s: float) -> Optional[Sweep]:
+        if max_age_s <= 0:
+            return None
+        last = self._read_cache()
+        if last is not None and last.results is not None and last.age() <= max_age_s and last.covers(zonas):
+            return last
+        return None
+
+    # ------------------------------------------------------------------ API
+    def _view(self, sweep: Sweep, zonas: Optional[List[str]], shared: bool) -> SweepView:
+        results = sweep.results
+        if zonas and zonas[0] != ALL_ZONES_TOKEN and not (sweep.zonas and Sweep(zonas).covers(sweep.zonas)):
+            # El barrido fue más amplio que el pedido: recortamos a sus zonas
+            index = self._zone_index()
+            results = [r for r in results if index.in_any(r.segment, zonas)]
+        return SweepView(results, sweep.duration, sweep.age() if shared else 0.0, shared, sweep.finished_at, sweep.meta)
+
+    def get(self, zonas: Optional[List[str]], run: Callable[[], Tuple[List[ScanResult], Dict]], max_age_s: Optional[float] = None) -> SweepView:
+        """
+        Resultados para `zonas`: del último barrido si está fresco, del barrido en curso
+        si lo cubre, o de un barrido nuevo (`run` -> (resultados, meta)) cuando no queda otra.
+        """
+        max_age_s = self.freshness_s if max_age_s is None else max_age_s
+        while True:
+            with self._mu:
+                hit = self._fresh(zonas, max_age_s)
+                if hit is not None:
+                    self.log(f"♻️  Reutilizando barrido de hace {hit.age():.0f}s")
+                    return self._view(hit, zonas, shared=True)
+                sweep = self._inflight
+                owner = sweep is None
+                if owner:
+                    sweep = self._inflight = Sweep(zonas)
+
+            if owner:
+                swept = self._run(sweep, run, max_age_s)
+                if sweep.error is not None:
+                    raise sweep.error
+                return self._view(sweep, zonas, shared=not swept)
+
+            self.log("⏳ Barrido en curso; esperando su resultado")
+            sweep.done.wait()
+            if sweep.covers(zonas):
+                if sweep.error is not None:
+                    raise sweep.error
+                return self._view(sweep, zonas, shared=True)
+            # El barrido en curso no cubría estas zonas: ahora sí, uno nuevo (de a uno)
+
+    def _run(self, sweep: Sweep, run: Callable[[], Tuple[List[ScanResult], Dict]], max_age_s: float) -> bool:
+        """Ejecuta el barrido bajo el lock entre procesos. False si se reutilizó uno ajeno."""
+        swept = False
+        mtime = 0.0
+        try:
+            with FileLock(self.lock_path):
+                # Otro proceso pudo terminar un barrido equivalente mientras esperábamos el lock
+                hit = self._fresh(sweep.zonas, max_age_s)
+                if hit is not None:
+                    self.log(f"♻️  Otro proceso acaba de barrer (hace {hit.age():.0f}s); reutilizando")
+                    sweep.zonas, sweep.results, sweep.meta = hit.zonas, hit.results, hit.meta
+                    sweep.started_at, sweep.finished_at, sweep.duration = hit.started_at, hit.finished_at, hit.duration
+                else:
+                    sweep.started_at = time.time()
+                    sweep.results, sweep.meta = run()
+                    sweep.finished_at = time.time()
+                    sweep.duration = sweep.finished_at - sweep.started_at
+                    swept = True
+                    mtime = self._write_cache(sweep)
+        except BaseException as e:
+            sweep.error = e
+        finally:
+            with self._mu:
+                if swept and (self._last is None or sweep.finished_at >= (self._last.finished_at or 0)):
+                    self._last, self._last_mtime = sweep, max(mtime, self._last_mtime)
+                self._inflight = None
+            sweep.done.set()
+        return swept
+
+    def status(self) -> Dict:
+        last = self._last
+        return {
+            "in_flight": self._inflight is not None,
+            "last_age_s": round(last.age(), 1) if last is not None else None,
+            "last_points": len(last.results) if last is not None and last.results is not None else None,
+        }
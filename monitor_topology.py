@@ -0,0 +1,206 @@
+# monitor_topology.py
+# Mapa de dependencias opcional (subred -> gateway) para no gastar el presupuesto de
+# sondeo en hosts detrás de un enlace caído. Archivo junto al catálogo:
+#   PuntosReportes/topology.json   (o MONITOR_TOPOLOGY)
+#   {"10.100.0.0/16": "10.100.0.1",
+#    "192.168.20.0/24": {"gateway": "192.168.20.1", "name": "VPN ROZO"}}
+# Flujo por barrido:
+#   1. Cada gateway se sondea una sola vez, con el presupuesto completo, antes que sus hosts.
+#   2. Gateway caído: se sondean `sample` hosts detrás con un solo intento rápido.
+#      Si alguno responde, el gateway no es la causa (p. ej. filtra ICMP) y todos se
+#      sondean normal (las muestras que fallaron, con el resto de su plan); si ninguno
+#      responde, el resto se marca sin sondear con ping_reason "unreachable_via:<gateway>".
+# Coincidencia por prefijo más largo, con enteros (sin objetos ipaddress por host).
+import ipaddress
+import json
+import os
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+ProbeResult = Tuple[bool, Optional[float], str]
+UNREACHABLE_PREFIX = "unreachable_via:"
+
+
+def unreachable_reason(gateway: str) -> str:
+    return f"{UNREACHABLE_PREFIX}{gateway}"
+
+
+def gateway_of_reason(reason: Optional[str]) -> Optional[str]:
+    reason = str(reason or "")
+    return reason[len(UNREACHABLE_PREFIX):] if reason.startswith(UNREACHABLE_PREFIX) else None
+
+
+class Topology:
+    def __init__(self, entries: Iterable[Tuple[str, str, Optional[str]]] = ()):
+        # prefixlen -> {red: gateway}; se recorren de más largo a más corto
+        self._by_len: Dict[int, Dict[int, str]] = {}
+        self.names: Dict[str, str] = {}
+        for cidr, gateway, name in entries:
+            net = ipaddress.IPv4Network(cidr, strict=False)
+            gw = str(ipaddress.IPv4Address(gateway))
+            self._by_len.setdefault(net.prefixlen, {})[int(net.network_address)] = gw
+            if name:
+                self.names[gw] = name
+        self._lens = sorted(self._by_len, reverse=True)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["Topology"]:
+        """None si no hay archivo (la topología es opcional)."""
+        if not path or not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        entries = []
+        for cidr, spec in data.items():
+            if isinstance(spec, dict):
+                entries.append((cidr, spec["gateway"], spec.get("name")))
+            else:
+                entries.append((cidr, spec, None))
+        return cls(entries)
+
+    def __len__(self) -> int:
+        return sum(len(d) for d in self._by_len.values())
+
+    def gateway_for(self, ip: str) -> Optional[str]:
+        try:
+            n = int(ipaddress.IPv4Address(ip))
+        except ValueError:
+            return None
+        for plen in self._lens:
+            mask = (0xFFFFFFFF << (32 - plen)) & 0xFFFFFFFF
+            gw = self._by_len[plen].get(n & mask)
+            if gw is not None:
+                return None if gw == ip else gw  # el gateway no depende de sí mismo
+        return None
+
+    def label(self, gateway: str) -> str:
+        name = self.names.get(gateway)
+        return f"{name} ({gateway})" if name else gateway
+
+    def group(self, ips: Iterable[str]) -> Tuple[Dict[str, List[str]], List[str]]:
+        """(gateway -> hosts detrás, hosts sin gateway conocido)."""
+        behind: Dict[str, List[str]] = {}
+        direct: List[str] = []
+        for ip in ips:
+            gw = self.gateway_for(ip)
+            if gw is None:
+                direct.append(ip)
+            else:
+                behind.setdefault(gw, []).append(ip)
+        return behind, direct
+
+
+def dead_gateways_sync(topology: Topology, ips: Iterable[str], probe_many: Callable[[List[str], Dict[str, Tuple[int, ...]]], Dict[str, ProbeResult]],
+                       gateway_plan: Tuple[int, ...], sample_plan: Tuple[int, ...], sample: int = 2) -> Dict[str, str]:
+    """
+    Versión por lotes (motores síncronos): ip -> gateway caído para los hosts que no
+    hay que sondear. probe_many(ips, planes) -> {ip: (vivo, latencia, motivo)}.
+    """
+    behind, _ = topology.group(ips)
+    if not behind:
+        return {}
+    gws = sorted(behind)
+    res = probe_many(gws, {gw: gateway_plan for gw in gws})
+    dead = [gw for gw in gws if not res.get(gw, (False,))[0]]
+    if not dead:
+        return {}
+    samples = {gw: sorted(behind[gw])[:max(0, sample)] for gw in dead}
+    probe_ips = [ip for s in samples.values() for ip in s]
+    sres = probe_many(probe_ips, {ip: sample_plan for ip in probe_ips}) if probe_ips else {}
+    out: Dict[str, str] = {}
+    for gw in dead:
+        if any(sres.get(ip, (False,))[0] for ip in samples[gw]):
+            continue  # responde algo detrás: el gateway solo no contesta ICMP
+        for ip in behind[gw]:
+            out[ip] = gw
+    return out
+
+
+class _GatewayState:
+    __slots__ = ("task", "sampled", "finished", "alive_behind", "verdict")
+
+    def __init__(self, task):
+        self.task = task
+        self.sampled = 0
+        self.finished = 0
+        self.alive_behind = False
+        self.verdict = None  # asyncio.Event, creado en el loop
+
+
+class GatewayGate:
+    """
+    Versión en tubería (motor asíncrono): se llama por host a medida que llega del
+    catálogo; el gateway se sondea una vez y los hosts detrás esperan su veredicto.
+    El veredicto sale con la primera muestra que responde, al terminar las `sample`
+    muestras, o con close() (no llegan más hosts) si no queda ninguna en vuelo.
+    """
+
+    def __init__(self, topology: Topology, probe: Callable[[str, Tuple[int, ...]], Awaitable[ProbeResult]],
+                 gateway_plan: Tuple[int, ...], sample: int = 2):
+        self.topology = topology
+        self._probe = probe
+        self.gateway_plan = gateway_plan
+        self.sample = max(0, sample)
+        self._gw: Dict[str, _GatewayState] = {}
+        self._closed = False
+
+    def _state(self, gw: str) -> _GatewayState:
+        import asyncio
+        st = self._gw.get(gw)
+        if st is None:
+            st = self._gw[gw] = _GatewayState(asyncio.ensure_future(self._probe(gw, self.gateway_plan)))
+            st.verdict = asyncio.Event()
+            if self.sample == 0:
+                st.verdict.set()
+        return st
+
+    def _settle(self, st: _GatewayState) -> None:
+        if st.alive_behind or st.finished >= self.sample or (self._closed and st.finished == st.sampled):
+            st.verdict.set()
+
+    def close(self) -> None:
+        """Ya entraron todos los hosts: las muestras que faltan no van a llegar."""
+        self._closed = True
+        for st in self._gw.values():
+            self._settle(st)
+
+    async def probe(self, ip: str, plan: Tuple[int, ...], segment: Optional[str] = None) -> ProbeResult:
+        # segment solo se reenvía a la sonda del host (monitor_probes elige el protocolo por zona)
+        extra = () if segment is None else (segment,)
+        gw = self.topology.gateway_for(ip)
+        if gw is None:
+            return await self._probe(ip, plan, *extra)
+        st = self._state(gw)
+        # El turno de muestra se toma al llegar (antes de cualquier await): close() ve
+        # todas las muestras que van a existir
+        is_sample = st.sampled < self.sample
+        if is_sample:
+            st.sampled += 1
+        alive_gw = (await st.task)[0]
+        if alive_gw:
+            return await self._probe(ip, plan, *extra)
+        if is_sample:
+            # Muestra: un intento rápido
+            try:
+                r = await self._probe(ip, plan[:1], *extra)
+            finally:
+                st.finished += 1
+            if r[0]:
+                st.alive_behind = True
+            self._settle(st)
+            if r[0]:
+                return r
+            # Falló: otra muestra puede probar que el gateway no es la causa; entonces
+            # este host sigue con el resto del plan como cualquier otro
+            await st.verdict.wait()
+            if st.alive_behind:
+                return await self._probe(ip, plan[1:], *extra) if len(plan) > 1 else r
+            return False, None, unreachable_reason(gw)
+        await st.verdict.wait()
+        if not st.alive_behind:
+            return False, None, unreachable_reason(gw)
+        return await self._probe(ip, plan, *extra)
+
+    def dead_gateways(self) -> List[str]:
+        """Gateways sin respuesta y sin nada vivo detrás en este barrido."""
+        return sorted(gw for gw, st in self._gw.items()
+                      if st.task.done() and not st.task.result()[0] and not st.alive_behind)
@@ -0,0 +1,119 @@
+# monitor_zones.py
+# Normalización de texto e índice de zonas del catálogo.
+# - norm_text / contains_word: misma semántica de siempre, sin recompilar regex por fila.
+# - ZoneIndex: segmento normalizado -> targets, y palabra -> segmentos; se arma una
+#   sola vez al cargar el catálogo y las consultas por zona quedan en O(1) (memo).
+# - parse_zonas: "--zona PALMIRA,ROZO" o "--zona TODAS" para varios reportes en un barrido.
+import re
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set
+
+from monitor_records import Target
+
+ALL_ZONES_TOKEN = "*"
+_ALL_ZONES_ALIASES = {"*", "ALL", "TODAS", "TODOS"}
+
+_ACCENTS = str.maketrans("ÁÉÍÓÚÑ", "AEIOUN")
+_WS_RE = re.compile(r"\s+")
+_WORD_RE = re.compile(r"[A-Z0-9]+")
+
+
+def norm_text(s: Optional[str]) -> str:
+    if s is None:
+        return ""
+    t = str(s).strip().upper()
+    t = t.translate(_ACCENTS)
+    return _WS_RE.sub(" ", t).strip()
+
+
+@lru_cache(maxsize=1024)
+def _word_pattern(needle: str):
+    return re.compile(r"(^|[^A-Z0-9])" + re.escape(needle) + r"([^A-Z0-9]|$)")
+
+
+def contains_word(haystack: str, needle: str) -> bool:
+    if not needle: return True
+    if not haystack: return False
+    return _word_pattern(needle).search(haystack) is not None
+
+
+def parse_zonas(raw: Optional[str]) -> Optional[List[str]]:
+    """
+    None          -> reporte GENERAL (sin filtro)
+    ["*"]         -> todas las zonas, un reporte por segmento
+    ["A", "B"...] -> un reporte por zona (separadas por coma)
+    """
+    if raw is None or not str(raw).strip():
+        return None
+    zonas: List[str] = []
+    for part in str(raw).split(","):
+        z = part.strip()
+        if not z:
+            continue
+        if norm_text(z) in _ALL_ZONES_ALIASES:
+            return [ALL_ZONES_TOKEN]
+        if z not in zonas:
+            zonas.append(z)
+    return zonas or None
+
+
+class ZoneIndex:
+    def __init__(self, targets: Iterable[Target] = (), keep_targets: bool = True):
+        self.keep_targets = keep_targets
+        self._seg_norm: Dict[str, str] = {}             # segmento crudo -> normalizado
+        self.by_segment: Dict[str, List[Target]] = {}   # normalizado -> targets
+        self._words: Dict[str, Set[str]] = {}           # palabra -> segmentos normalizados
+        self._zone_cache: Dict[str, FrozenSet[str]] = {}
+        self.add(targets)
+
+    def norm_segment(self, raw: str) -> str:
+        n = self._seg_norm.get(raw)
+        if n is None:
+            n = self._seg_norm[raw] = norm_text(raw)
+            if n not in self.by_segment:
+                self.by_segment[n] = []
+                for w in _WORD_RE.findall(n):
+                    self._words.setdefault(w, set()).add(n)
+                self._zone_cache.clear()  # apareció un segmento nuevo
+        return n
+
+    def add(self, targets: Iterable[Target]) -> None:
+        for t in targets:
+            n = self.norm_segment(t.segment)
+            if self.keep_targets:
+                self.by_segment[n].append(t)
+
+    def segments_for(self, zona: str) -> FrozenSet[str]:
+        """Segmentos normalizados que contienen la zona como palabra completa."""
+        zn = norm_text(zona)
+        hit = self._zone_cache.get(zn)
+        if hit is not None:
+            return hit
+        words = _WORD_RE.findall(zn)
+        # Candidatos: segmentos que tienen la primera palabra de la zona; luego verificación exacta
+        candidates = self._words.get(words[0], ()) if words else self.by_segment.keys()
+        hit = frozenset(s for s in candidates if contains_word(s, zn))
+        self._zone_cache[zn] = hit
+        return hit
+
+    def in_zone(self, raw_segment: str, zona: str) -> bool:
+        return self.norm_segment(raw_segment) in self.segments_for(zona)
+
+    def in_any(self, raw_segment: str, zonas: Optional[List[str]]) -> bool:
+        if not zonas or zonas[0] == ALL_ZONES_TOKEN:
+            return True
+        n = self.norm_segment(raw_segment)
+        return any(n in self.segments_for(z) for z in zonas)
+
+    def zones(self) -> List[str]:
+        return sorted(s for s in self.by_segment if s)
+
+    def targets_for(self, zonas: Optional[List[str]]) -> List[Target]:
+        if not zonas or zonas[0] == ALL_ZONES_TOKEN:
+            return [t for seg in self.by_segment.values() for t in seg]
+        segs: List[str] = []
+        for z in zonas:
+            for s in sorted(self.segments_for(z)):
+                if s not in segs:
+                    segs.append(s)
+        return [t for s in segs for t in self.by_segment.get(s, ())]
@@ -0,0 +1,23 @@
+-- Marcador de cambios para el snapshot local del catálogo (monitor_catalog.py)
+-- Con updated_at el monitor solo descarga las filas modificadas desde su último
+-- snapshot; sin esta columna cae a descarga completa cada vez que vence el TTL.
+
+ALTER TABLE public.puntos_venta
+    ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT now();
+
+-- Mantener updated_at al día en cada UPDATE (incluye desactivar: active=false)
+CREATE OR REPLACE FUNCTION public.puntos_venta_touch_updated_at()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at = now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_puntos_venta_updated_at ON public.puntos_venta;
+CREATE TRIGGER trg_puntos_venta_updated_at
+    BEFORE UPDATE ON public.puntos_venta
+    FOR EACH ROW EXECUTE FUNCTION public.puntos_venta_touch_updated_at();
+
+-- Índice para el marcador (max(updated_at)) y el delta (updated_at > x)
+CREATE INDEX IF NOT EXISTS idx_puntos_venta_updated_at ON public.puntos_venta(updated_at DESC);
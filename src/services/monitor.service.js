@@ -1,6 +1,7 @@
 // src/services/monitor.service.js
 const { spawn } = require("child_process");
 const path = require("path");
+const { StringDecoder } = require("string_decoder");
 const { sendTextChunked, sendTextMany } = require("./messaging.service");
 
 function pickPython() {
@@ -59,6 +60,36 @@ function safeParseJsonLoose(text) {
   return null;
 }
 
+/**
+ * ✅ Modo streaming (MONITOR_STREAM=1 | all): el Python emite NDJSON, un evento por línea
+ * (catalog, host, progress, summary, report, chart, done). Ver monitor_stream.py.
+ */
+function streamMode() {
+  const v = String(process.env.MONITOR_STREAM || "").trim().toLowerCase();
+  if (!v || v === "0") return null;
+  return v === "all" ? "all" : "offline";
+}
+
+/**
+ * Parte stdout en líneas a medida que llega y entrega cada evento JSON.
+ * Las líneas que no son JSON (ruido) se ignoran.
+ */
+function createNdjsonParser(onEvent) {
+  let buf = "";
+  return (chunk) => {
+    buf += chunk;
+    let nl;
+    while ((nl = buf.indexOf("\n")) !== -1) {
+      const line = buf.slice(0, nl).trim();
+      buf = buf.slice(nl + 1);
+      if (!line.startsWith("{")) continue;
+      let ev = null;
+      try { ev = JSON.parse(line); } catch (_) { continue; }
+      if (ev && ev.event) onEvent(ev);
+    }
+  };
+}
+
 function buildArgs({ scriptPath, tipo, zona }) {
   // ✅ Por defecto: el Python debe devolver JSON para que el bot envíe segmentado
   // Si necesitas el modo antiguo (Python enviando), pon MONITOR_MODE=self_send
@@ -84,6 +115,8 @@ function buildArgs({ scriptPath, tipo, zona }) {
   } else {
     // ✅ NUEVO: JSON + tipo + opcional zona
     args.push("--json");
+    const stream = streamMode();
+    if (stream) args.push("--stream", stream);
     args.push("--tipo", String(tipo || "standard"));
     if (zona && String(zona).trim()) args.push("--zona", String(zona).trim());
   }
@@ -98,7 +131,75 @@ function buildArgs({ scriptPath, tipo, zona }) {
   return args;
 }
 
-function runMonitor({ tipo = "standard", zona }) {
+/**
+ * ✅ Monitor residente (python monitor_puntos_wpp.py serve)
+ * - MONITOR_DAEMON_URL="http://127.0.0.1:8765"  o  MONITOR_DAEMON_SOCKET="/tmp/monitor.sock"
+ * - Devuelve la misma forma que runMonitor(); null si el daemon no responde
+ *   (en ese caso se usa el spawn clásico).
+ */
+function runMonitorDaemon({ tipo = "standard", zona }) {
+  const baseUrl = String(process.env.MONITOR_DAEMON_URL || "").trim();
+  const socketPath = String(process.env.MONITOR_DAEMON_SOCKET || "").trim();
+  if (!baseUrl && !socketPath) return Promise.resolve(null);
+
+  const http = require("http");
+  const timeoutMs = Number(process.env.MONITOR_TIMEOUT_MS || 180000);
+  const body = JSON.stringify({ tipo: String(tipo || "standard"), zona: zona && String(zona).trim() ? String(zona).trim() : null });
+
+  const opts = { method: "POST", path: "/report", headers: { "Content-Type": "application/json", "Content-Length": Buffer.byteLength(body) } };
+  let target = `unix:${socketPath}`;
+  if (socketPath) {
+    opts.socketPath = socketPath;
+  } else {
+    const u = new URL("/report", baseUrl);
+    opts.hostname = u.hostname;
+    opts.port = u.port;
+    target = u.toString();
+  }
+
+  return new Promise((resolve) => {
+    const req = http.request(opts, (res) => {
+      let raw = "";
+      res.setEncoding("utf8");
+      res.on("data", (d) => (raw += d));
+      res.on("end", () => {
+        const payload = safeParseJsonLoose(raw);
+        resolve({
+          ok: res.statusCode === 200 && !!payload,
+          exitCode: res.statusCode === 200 ? 0 : 1,
+          stdout: raw,
+          stderr: payload && payload.error ? String(payload.error) : "",
+          cmd: `daemon ${target}`,
+          killedByTimeout: false,
+          payload,
+        });
+      });
+    });
+    let timedOut = false;
+    req.setTimeout(timeoutMs, () => {
+      timedOut = true;
+      req.destroy(new Error("daemon_timeout"));
+    });
+    req.on("error", (err) => {
+      if (timedOut) {
+        // El daemon está vivo pero el barrido se pasó del tiempo: no relanzar otro por spawn
+        return resolve({ ok: false, exitCode: -1, stdout: "", stderr: "daemon_timeout", cmd: `daemon ${target}`, killedByTimeout: true, payload: null });
+      }
+      // Daemon caído / no escuchando => fallback a spawn
+      console.error(`⚠️ Monitor daemon no disponible (${target}): ${err?.message || err}`);
+      resolve(null);
+    });
+    req.end(body);
+  });
+}
+
+async function runMonitor({ tipo = "standard", zona, onEvent }) {
+  const viaDaemon = await runMonitorDaemon({ tipo, zona });
+  if (viaDaemon) return viaDaemon;
+  return runMonitorSpawn({ tipo, zona, onEvent });
+}
+
+function runMonitorSpawn({ tipo = "standard", zona, onEvent }) {
   return new Promise((resolve) => {
     const pythonBin = pickPython();
     const scriptPath = process.env.MONITOR_SCRIPT || require("path").resolve(__dirname, "../../monitor_puntos_wpp.py");
@@ -115,13 +216,26 @@ function runMonitor({ tipo = "standard", zona }) {
     let stdout = "";
     let stderr = "";
     let killedByTimeout = false;
+    let streamed = null; // payload del evento "done" (modo streaming)
+    const parseChunk = streamMode() ? createNdjsonParser((ev) => {
+      if (ev.event === "done") streamed = ev.payload || null;
+      else if (ev.event === "error") streamed = { ok: false, error: ev.error };
+      if (onEvent) {
+        try { onEvent(ev); } catch (e) { console.error("⚠️ onEvent:", e?.message || e); }
+      }
+    }) : null;
 
     const timer = setTimeout(() => {
       killedByTimeout = true;
       try { child.kill("SIGKILL"); } catch (_) { }
     }, timeoutMs);
 
-    child.stdout.on("data", (d) => (stdout += d.toString("utf8")));
+    const decoder = new StringDecoder("utf8"); // no partir caracteres multibyte entre chunks
+    child.stdout.on("data", (d) => {
+      const text = decoder.write(d);
+      stdout += text;
+      if (parseChunk) parseChunk(text);
+    });
     child.stderr.on("data", (d) => (stderr += d.toString("utf8")));
 
     child.on("error", (err) => {
@@ -140,7 +254,8 @@ function runMonitor({ tipo = "standard", zona }) {
     child.on("close", (exitCode) => {
       clearTimeout(timer);
 
-      const payload = safeParseJsonLoose(stdout);
+      if (parseChunk) parseChunk("\n"); // última línea sin salto
+      const payload = streamed || safeParseJsonLoose(stdout);
 
       const ok = (exitCode === 0) && !killedByTimeout;
 
@@ -167,8 +282,60 @@ function runMonitor({ tipo = "standard", zona }) {
  * - Si payload.messages[] existe => envía en orden (segmentado por zona)
  * - Si no => fallback sendTextChunked(stdout/report)
  */
+/**
+ * Avisos tempranos en modo streaming: "Escaneando N puntos…" apenas llega el catálogo y,
+ * tras MONITOR_STREAM_FIRST_MS, un solo mensaje con los primeros puntos sin conexión.
+ * Los eventos "replay" (barrido ya hecho) no generan avisos: el reporte llega enseguida.
+ */
+function createProgressNotifier(to) {
+  const firstMs = Number(process.env.MONITOR_STREAM_FIRST_MS || 1000);
+  const maxListed = Number(process.env.MONITOR_STREAM_FIRST_MAX || 10);
+  let chain = Promise.resolve();
+  let announced = false;
+  let summarized = false;
+  let timer = null;
+  const offline = [];
+
+  const send = (text) => {
+    chain = chain.then(() => sendTextMany(to, [text], { delayMs: 0, stopOnFail: true })).catch((e) => {
+      console.error("⚠️ Aviso de progreso no enviado:", e?.message || e);
+    });
+  };
+
+  const flushOffline = () => {
+    timer = null;
+    if (summarized || !offline.length) return;
+    const lines = offline.slice(0, maxListed).map((h) => `• ${h.alias || h.ip} (${h.segment || "-"})`);
+    const more = offline.length > maxListed ? `\n…y ${offline.length - maxListed} más` : "";
+    send(`⚠️ *Primeros puntos sin conexión:*\n${lines.join("\n")}${more}`);
+  };
+
+  return {
+    onEvent(ev) {
+      if (ev.replay || summarized) return;
+      if (ev.event === "catalog" && ev.done && !announced) {
+        announced = true;
+        send(`🔎 Escaneando ${ev.queued} puntos…`);
+      } else if (ev.event === "host" && !ev.active && !ev.excluded) {
+        offline.push(ev);
+        if (!timer && offline.length === 1) timer = setTimeout(flushOffline, firstMs);
+      } else if (ev.event === "summary") {
+        summarized = true; // el reporte completo ya viene en camino
+        if (timer) clearTimeout(timer);
+      }
+    },
+    // Espera a que salgan los avisos antes de enviar el reporte (orden en el chat)
+    drain() {
+      if (timer) clearTimeout(timer);
+      return chain;
+    },
+  };
+}
+
 async function runMonitorAndSend({ to, tipo = "standard", zona }) {
-  const r = await runMonitor({ tipo, zona });
+  const notifier = streamMode() ? createProgressNotifier(to) : null;
+  const r = await runMonitor({ tipo, zona, onEvent: notifier ? notifier.onEvent : undefined });
+  if (notifier) await notifier.drain();
 
   if (!r.ok) {
     // Devuelve un error más útil (stderr recortado) para no spamear
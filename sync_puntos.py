@@ -0,0 +1,265 @@
+# sync_puntos.py
+# Sincroniza Puntos.xlsx -> tabla `puntos_venta` por diferencias (reemplaza a
+# import_points.py / migrate_puntos.py, que subían todas las filas en cada corrida).
+#
+#   python sync_puntos.py                 # aplica el diff
+#   python sync_puntos.py --dry-run       # solo resumen, no escribe
+#   python sync_puntos.py --excel otro.xlsx --no-deactivate
+#
+# Flujo:
+#   1. Una lectura proyectada de la tabla (ip, segment, alias, active), paginada con Range.
+#   2. Diff vectorizado (merge por ip) contra el Excel normalizado:
+#        nuevos      ip en el Excel y no en la tabla
+#        cambiados   alias/segment distinto, o estaba inactivo y volvió a la hoja
+#        retirados   activos en la tabla y ausentes del Excel -> active=false
+#   3. Solo se escribe lo que cambió: upserts por lotes (on_conflict=ip) y PATCH
+#      active=false por lotes de ip, en paralelo, con reintento y back-off exponencial.
+# Una hoja sin cambios cuesta una lectura y cero escrituras.
+import argparse
+import json
+import os
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Tuple
+
+import pandas as pd
+from dotenv import load_dotenv
+
+from monitor_catalog import CatalogStore, CatalogUnavailable
+from monitor_records import parse_ipv4
+
+load_dotenv()
+
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+EXCEL_FILE = os.getenv("MONITOR_PUNTOS_XLSX", "Puntos.xlsx")
+TABLE = "puntos_venta"
+SYNC_BATCH = int(os.getenv("SYNC_BATCH", "500"))
+SYNC_WORKERS = int(os.getenv("SYNC_WORKERS", "4"))
+SYNC_RETRIES = int(os.getenv("SYNC_RETRIES", "4"))
+SYNC_TIMEOUT_S = float(os.getenv("SYNC_TIMEOUT_S", "20"))
+READ_PAGE_SIZE = 10000  # una sola página en tablas normales; si PostgREST recorta, iter_pages sigue
+
+FIELDS = ["alias", "segment"]
+# Nombres aceptados por columna (en mayúsculas, ya normalizados)
+_IP_COLS = ["IP", "DIRECCION_IP", "IP_ADDRESS"]
+_SEG_COLS = ["CENTRO DE COSTO", "ZONA", "SEGMENTO"]
+_ALIAS_COLS = ["PUNTO DE VENTA", "NOMBRE", "ALIAS", "PUNTO"]
+_RETRY_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+
+# ============================================================================
+# Lectura
+# ============================================================================
+def _pick(columns, options) -> str:
+    return next((c for c in options if c in columns), "")
+
+
+def read_sheet(path: str) -> Tuple[pd.DataFrame, Dict[str, int]]:
+    """Excel -> DataFrame ip/alias/segment único por ip (gana la última fila, como hacía el upsert)."""
+    df = pd.read_excel(path, engine="openpyxl", dtype=str)
+    df.columns = [str(c).strip().upper() for c in df.columns]
+    ip_col = _pick(df.columns, _IP_COLS)
+    if not ip_col:
+        raise ValueError(f"❌ No se encontró columna de IP en {path} (se buscó {', '.join(_IP_COLS)})")
+    seg_col, alias_col = _pick(df.columns, _SEG_COLS), _pick(df.columns, _ALIAS_COLS)
+
+    ip = df[ip_col].fillna("").str.strip()
+    out = pd.DataFrame({
+        "ip": ip,
+        "alias": df[alias_col].fillna("").str.strip() if alias_col else ip,
+        "segment": df[seg_col].fillna("").str.strip() if seg_col else "General",
+    })
+    total = len(out)
+    out = out[out["ip"].map(lambda v: parse_ipv4(v) is not None)]  # IPv4 estricta (como el catálogo)
+    invalid = total - len(out)
+    dup = int(out["ip"].duplicated().sum())
+    out = out.drop_duplicates("ip", keep="last").reset_index(drop=True)
+    return out, {"rows": total, "invalid": invalid, "duplicates": dup}
+
+
+def read_table(store: CatalogStore) -> pd.DataFrame:
+    """Tabla actual, solo las columnas que se comparan."""
+    rows: List[Dict] = []
+    for page in store.iter_pages({"select": "ip,alias,segment,active"}, READ_PAGE_SIZE):
+        rows.extend(page)
+    df = pd.DataFrame(rows, columns=["ip", "alias", "segment", "active"])
+    for col in ["ip"] + FIELDS:
+        df[col] = df[col].fillna("").astype(str).str.strip()
+    df["active"] = df["active"].fillna(False).astype(bool)
+    return df
+
+
+# ============================================================================
+# Diff
+# ============================================================================
+def compute_diff(sheet: pd.DataFrame, table: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    merged = sheet.merge(table, on="ip", how="outer", suffixes=("", "_db"), indicator=True)
+    new = merged["_merge"] == "left_only"
+    both = merged["_merge"] == "both"
+    gone = merged["_merge"] == "right_only"
+
+    differs = pd.Series(False, index=merged.index)
+    for col in FIELDS:
+        differs |= merged[col] != merged[f"{col}_db"]
+    inactive = ~merged["active"].fillna(False).astype(bool)
+
+    cols = ["ip"] + FIELDS
+    return {
+        "inserted": merged.loc[new, cols].reset_index(drop=True),
+        "changed": merged.loc[both & (differs | inactive), cols].reset_index(drop=True),
+        "removed": merged.loc[gone & ~inactive, ["ip", "alias_db", "segment_db"]]
+                         .rename(columns={"alias_db": "alias", "segment_db": "segment"}).reset_index(drop=True),
+    }
+
+
+# ============================================================================
+# Escritura
+# ============================================================================
+class Writer:
+    """Escrituras PostgREST con reintento y back-off (mismo transporte urllib que monitor_catalog)."""
+
+    def __init__(self, base_url: str, api_key: str, table: str = TABLE, timeout_s: float = SYNC_TIMEOUT_S,
+                 retries: int = SYNC_RETRIES, backoff_s: float = 0.5, log: Callable[[str], None] = print):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.table = table
+        self.timeout_s = timeout_s
+        self.retries = max(1, retries)
+        self.backoff_s = backoff_s
+        self.log = log
+
+    def _send(self, method: str, params: Dict[str, str], body, prefer: str) -> None:
+        url = f"{self.base_url}/rest/v1/{self.table}?{urllib.parse.urlencode(params, safe=',.:()')}"
+        headers = {
+            "apikey": self.api_key,
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+            "Prefer": prefer,
+        }
+        data = json.dumps(body).encode("utf-8")
+        for attempt in range(1, self.retries + 1):
+            try:
+                req = urllib.request.Request(url, data=data, headers=headers, method=method)
+                with urllib.request.urlopen(req, timeout=self.timeout_s) as resp:
+                    resp.read()
+                return
+            except urllib.error.HTTPError as e:
+                if e.code not in _RETRY_STATUS or attempt == self.retries:
+                    raise RuntimeError(f"{method} {e.code}: {e.read()[:200].decode('utf-8', 'replace')}")
+                wait = float(e.headers.get("Retry-After") or 0) or self.backoff_s * 2 ** (attempt - 1)
+            except (urllib.error.URLError, TimeoutError, ConnectionError) as e:
+                if attempt == self.retries:
+                    raise RuntimeError(f"{method}: {e}")
+                wait = self.backoff_s * 2 ** (attempt - 1)
+            self.log(f"   ⏳ {method} reintento {attempt}/{self.retries - 1} en {wait:.1f}s")
+            time.sleep(wait)
+
+    def upsert(self, records: List[Dict]) -> None:
+        self._send("POST", {"on_conflict": "ip"}, records, "resolution=merge-duplicates,return=minimal")
+
+    def deactivate(self, ips: List[str]) -> None:
+        # Las IPs salen de la tabla, no de la hoja validada: cada valor va entre comillas
+        # (in.("a","b")) para que una fila vieja con comas o paréntesis no rompa el filtro
+        quoted = ",".join('"' + ip.replace("\\", "\\\\").replace('"', '\\"') + '"' for ip in ips)
+        self._send("PATCH", {"ip": f"in.({quoted})"}, {"active": False}, "return=minimal")
+
+
+def _batches(items: List, size: int) -> List[List]:
+    size = max(1, size)
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def apply_diff(writer: Writer, diff: Dict[str, pd.DataFrame], batch: int = SYNC_BATCH,
+               workers: int = SYNC_WORKERS, deactivate: bool = True) -> Dict[str, int]:
+    """Lanza todos los lotes en paralelo; devuelve {'ok': n, 'failed': n, 'requests': n}."""
+    records = pd.concat([diff["inserted"], diff["changed"]]).assign(active=True).to_dict("records")
+    jobs: List[Tuple[Callable, List]] = [(writer.upsert, b) for b in _batches(records, batch)]
+    if deactivate:
+        jobs += [(writer.deactivate, b) for b in _batches(diff["removed"]["ip"].tolist(), batch)]
+    stats = {"ok": 0, "failed": 0, "requests": len(jobs)}
+    if not jobs:
+        return stats
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(jobs)))) as pool:
+        futures = {pool.submit(fn, b): (fn.__name__, len(b)) for fn, b in jobs}
+        for fut in as_completed(futures):
+            name, n = futures[fut]
+            try:
+                fut.result()
+                stats["ok"] += n
+            except Exception as e:
+                stats["failed"] += n
+                writer.log(f"   ❌ Lote {name} ({n} filas): {e}")
+    return stats
+
+
+# ============================================================================
+# CLI
+# ============================================================================
+def print_summary(diff: Dict[str, pd.DataFrame], sheet_info: Dict[str, int], table_rows: int, limit: int = 10) -> None:
+    print(f"📄 Excel: {sheet_info['rows']} filas · {sheet_info['invalid']} IP inválidas · {sheet_info['duplicates']} IP repetidas")
+    print(f"☁️  Tabla: {table_rows} filas")
+    for key, icon, label in (("inserted", "➕", "Nuevos"), ("changed", "✏️ ", "Cambiados"), ("removed", "➖", "Retirados (active=false)")):
+        df = diff[key]
+        print(f"{icon} {label}: {len(df)}")
+        if len(df):
+            print(df.head(limit).to_string(index=False))
+            if len(df) > limit:
+                print(f"   ... y {len(df) - limit} más")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Sincroniza Puntos.xlsx con la tabla puntos_venta (solo diferencias)")
+    parser.add_argument("--excel", default=EXCEL_FILE)
+    parser.add_argument("--dry-run", action="store_true", help="Mostrar el diff sin escribir")
+    parser.add_argument("--no-deactivate", action="store_true", help="No marcar active=false los puntos retirados de la hoja")
+    parser.add_argument("--batch", type=int, default=SYNC_BATCH, help=f"Filas por petición (default {SYNC_BATCH})")
+    parser.add_argument("--workers", type=int, default=SYNC_WORKERS, help=f"Peticiones en paralelo (default {SYNC_WORKERS})")
+    args = parser.parse_args(argv)
+
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        print("❌ Faltan credenciales de Supabase en .env")
+        return 1
+
+    try:
+        sheet, info = read_sheet(args.excel)
+    except Exception as e:
+        print(f"❌ Error leyendo Excel: {e}")
+        return 1
+
+    # El snapshot no se usa: solo se aprovecha la paginación de CatalogStore
+    store = CatalogStore(SUPABASE_URL, SUPABASE_KEY, snapshot_path="", table=TABLE, timeout_s=SYNC_TIMEOUT_S)
+    started = time.perf_counter()
+    try:
+        table = read_table(store)
+    except CatalogUnavailable as e:
+        print(e)
+        return 1
+    except (urllib.error.URLError, OSError, ValueError) as e:
+        print(f"❌ Error leyendo la tabla {TABLE}: {e}")
+        return 1
+    diff = compute_diff(sheet, table)
+    print_summary(diff, info, len(table))
+
+    pending = len(diff["inserted"]) + len(diff["changed"]) + (0 if args.no_deactivate else len(diff["removed"]))
+    if args.dry_run:
+        print("🧪 Dry-run: no se escribió nada.")
+        return 0
+    if not pending:
+        print(f"✅ Sin cambios ({time.perf_counter() - started:.1f}s).")
+        return 0
+
+    writer = Writer(SUPABASE_URL, SUPABASE_KEY)
+    stats = apply_diff(writer, diff, batch=args.batch, workers=args.workers, deactivate=not args.no_deactivate)
+    icon = "✅" if not stats["failed"] else "⚠️ "
+    print(f"{icon} Sincronización: {stats['ok']} filas escritas, {stats['failed']} fallidas, "
+          f"{stats['requests']} peticiones ({time.perf_counter() - started:.1f}s).")
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,38 @@
+# monitor_analytics sobre filas reales de monitor_state (StateStore en tmp_path).
+import json
+import math
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from monitor_analytics import HostFrame, host_stats  # noqa: E402
+from monitor_records import ScanResult, Target  # noqa: E402
+from monitor_state import StateStore  # noqa: E402
+
+
+def test_migrated_history_has_no_phantom_repairs(tmp_path):
+    legacy = tmp_path / "state_history.json"
+    legacy.write_text(json.dumps({"192.168.19.32": {"state_changes": 5, "last_state": True,
+                                                    "first_seen": "2026-01-01T00:00:00"}}))
+    store = StateStore(str(tmp_path / "state.db"), log=lambda msg: None)
+    assert store.import_json(str(legacy)) == 1
+
+    row = store.get("192.168.19.32")
+    assert (row["state_changes"], row["n_down"], row["n_up"], row["down_s"]) == (5, 0, 0, 0.0)
+    assert math.isnan(host_stats(HostFrame({"192.168.19.32": row}))["mttr_s"][0])  # sin reparaciones medidas
+
+    t = Target("192.168.19.32", "ROZO")
+    store.apply_scan([ScanResult(t, active=False)], now_iso="2026-01-02T00:00:00")
+    store.apply_scan([ScanResult(t, active=True, latency=1.0)], now_iso="2026-01-02T01:30:00")
+    row = store.get("192.168.19.32")
+    assert (row["n_down"], row["n_up"], row["down_s"]) == (1, 1, 5400.0)
+    assert host_stats(HostFrame({"192.168.19.32": row}))["mttr_s"][0] == pytest.approx(5400.0)
+
+
+def test_trend_line_matches_report_header(tmp_path):
+    from monitor_analytics import trend_line, update_zone_history
+
+    pct = 1 / 26 * 100  # 3.846...: redondeado a 2 decimales (3.85) el .1f daba 3.9
+    history = update_zone_history(str(tmp_path / "monitor_history.json"), {"ROZO": pct}, 0.3)
+    assert trend_line("ROZO", history["ROZO"]).startswith(f"ROZO {pct:.1f} % ")
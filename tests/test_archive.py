@@ -0,0 +1,49 @@
+# monitor_archive.backfill: cada CSV histórico entra una sola vez aunque corran varios a la vez.
+import glob
+import json
+import os
+import threading
+
+from monitor_archive import ResultArchive
+
+HEADER = "ip,alias,segment,active,state_change,latency,scan_time,ping_reason,excluded\n"
+
+
+def _write_csvs(csv_dir, files=6, rows=200):
+    os.makedirs(csv_dir)
+    for k in range(files):
+        with open(os.path.join(csv_dir, f"reporte_{k}.csv"), "w", encoding="utf-8") as f:
+            f.write(HEADER)
+            for i in range(rows):
+                f.write(f"10.0.{k}.{i % 250 + 1},P{i},ROZO,True,False,1.5,2026-01-29T10:{k:02d}:00,ok,False\n")
+    return files * rows
+
+
+def _archived_rows(root) -> int:
+    total = 0
+    for path in glob.glob(os.path.join(root, "day=*", "seg=*", "_rows")):
+        with open(path) as f:
+            total += int(f.read())
+    return total
+
+
+def test_concurrent_backfills_import_each_file_once(tmp_path):
+    csv_dir, root = str(tmp_path / "csv"), str(tmp_path / "archive")
+    expected = _write_csvs(csv_dir)
+    start = threading.Barrier(4)
+    counts = []
+
+    def _run():
+        archive = ResultArchive(root, log=lambda msg: None)  # uno por "proceso"
+        start.wait()
+        counts.append(archive.backfill(csv_dir))
+
+    threads = [threading.Thread(target=_run) for _ in range(4)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+
+    assert _archived_rows(root) == expected
+    assert sum(files for files, _ in counts) == 6
+    with open(os.path.join(root, "imported.json"), encoding="utf-8") as f:
+        assert len(json.load(f)) == 6
+    assert ResultArchive(root, log=lambda msg: None).backfill(csv_dir) == (0, 0)
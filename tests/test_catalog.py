@@ -0,0 +1,159 @@
+# monitor_catalog.CatalogStore contra un stand-in PostgREST local.
+# El stub solo responde en /rest/v1/puntos_venta: cualquier otra ruta es 404, así
+# que una URL mal armada (p. ej. la tabla equivocada) hace fallar la prueba.
+import json
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from monitor_catalog import CatalogStore, CatalogUnavailable
+
+TABLE_PATH = "/rest/v1/puntos_venta"
+
+
+class FakePostgrest:
+    """Subconjunto de PostgREST que usa CatalogStore: select, eq/gt, order, limit, Range y count=exact."""
+
+    def __init__(self, rows):
+        self.rows = [dict(r) for r in rows]
+        self.requests = []  # (ruta, {param: valor}) de cada GET
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                url = urllib.parse.urlparse(self.path)
+                params = dict(urllib.parse.parse_qsl(url.query))
+                fake.requests.append((url.path, params))
+                if url.path != TABLE_PATH:
+                    self.send_error(404)
+                    return
+                fake.reply(self, params)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+
+    def reply(self, handler, params):
+        rows = list(self.rows)
+        for key, value in params.items():
+            if key in ("select", "order", "limit"):
+                continue
+            op, arg = value.split(".", 1)
+            if op == "eq":
+                rows = [r for r in rows if str(r.get(key)).lower() == arg.lower()]
+            elif op == "gt":
+                rows = [r for r in rows if r.get(key) is not None and str(r[key]) > arg]
+        if "order" in params:
+            col, _, direction = params["order"].partition(".")
+            rows.sort(key=lambda r: r.get(col) or "", reverse=direction.startswith("desc"))
+        total = len(rows)
+        start, stop = 0, total
+        if "limit" in params:
+            stop = int(params["limit"])
+        rng = handler.headers.get("Range")
+        if rng:
+            a, b = rng.split("-")
+            start, stop = int(a), int(b) + 1
+        rows = rows[start:stop]
+        cols = params.get("select", "*")
+        if cols != "*":
+            rows = [{c: r.get(c) for c in cols.split(",")} for r in rows]
+        body = json.dumps(rows).encode("utf-8")
+        handler.send_response(200)
+        handler.send_header("Content-Type", "application/json")
+        if "count=exact" in (handler.headers.get("Prefer") or ""):
+            handler.send_header("Content-Range", f"{start}-{start + len(rows) - 1}/{total}")
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+
+@pytest.fixture
+def postgrest():
+    rows = [
+        {"ip": f"10.1.0.{i}", "segment": "PALMIRA" if i % 2 else "ROZO", "alias": f"PUNTO {i}",
+         "active": True, "updated_at": f"2026-02-01T00:00:0{i}+00:00"}
+        for i in range(1, 6)
+    ]
+    fake = FakePostgrest(rows)
+    fake.thread.start()
+    yield fake
+    fake.server.shutdown()
+    fake.server.server_close()
+
+
+def _store(fake, tmp_path, **kwargs):
+    kwargs.setdefault("page_size", 2)  # fuerza varias páginas con Range
+    return CatalogStore(fake.url, "key", str(tmp_path / "catalog_snapshot.json"), **kwargs)
+
+
+def _catalog(targets):
+    return sorted((t.ip, t.segment, t.alias) for t in targets)
+
+
+def test_full_download_pages_and_writes_snapshot(postgrest, tmp_path):
+    store = _store(postgrest, tmp_path)
+    targets = store.load()
+
+    assert store.last_source == "full"
+    assert _catalog(targets) == sorted((r["ip"], r["segment"], r["alias"]) for r in postgrest.rows)
+    assert all(path == TABLE_PATH for path, _ in postgrest.requests)
+    pages = [p for _, p in postgrest.requests if p.get("select") == "ip,segment,alias,updated_at"]
+    assert len(pages) == 3  # 5 filas en páginas de 2
+
+    snap = json.loads((tmp_path / "catalog_snapshot.json").read_text(encoding="utf-8"))
+    assert snap["table"] == "puntos_venta"
+    assert sorted(r[0] for r in snap["rows"]) == sorted(r["ip"] for r in postgrest.rows)
+    assert snap["marker"] == {"count": 5, "max_updated_at": "2026-02-01T00:00:05+00:00", "has_updated_at": True}
+
+
+def test_fresh_snapshot_skips_network(postgrest, tmp_path):
+    _store(postgrest, tmp_path).load()
+    before = len(postgrest.requests)
+
+    store = _store(postgrest, tmp_path)
+    assert len(store.load()) == 5
+    assert store.last_source == "snapshot"
+    assert len(postgrest.requests) == before
+
+
+def test_delta_refresh_applies_changes_and_deactivations(postgrest, tmp_path):
+    _store(postgrest, tmp_path).load()
+    rows = {r["ip"]: r for r in postgrest.rows}
+    rows["10.1.0.2"].update(alias="PUNTO 2 NUEVO", updated_at="2026-02-02T00:00:00+00:00")
+    rows["10.1.0.3"].update(active=False, updated_at="2026-02-02T00:00:01+00:00")
+    postgrest.rows.append({"ip": "10.1.0.9", "segment": "ROZO", "alias": "PUNTO 9", "active": True,
+                           "updated_at": "2026-02-02T00:00:02+00:00"})
+    postgrest.requests.clear()
+
+    store = _store(postgrest, tmp_path, ttl_s=0)  # snapshot vencido: marcador + delta
+    targets = store.load()
+
+    assert store.last_source == "delta"
+    assert _catalog(targets) == sorted((r["ip"], r["segment"], r["alias"]) for r in postgrest.rows if r["active"])
+    assert all(path == TABLE_PATH for path, _ in postgrest.requests)
+    deltas = [p for _, p in postgrest.requests if "updated_at" in p and p["updated_at"].startswith("gt.")]
+    assert {p["updated_at"] for p in deltas} == {"gt.2026-02-01T00:00:05+00:00"}  # 3 cambios, 2 páginas
+    assert not any(p.get("select") == "ip,segment,alias,updated_at" for _, p in postgrest.requests)  # sin descarga completa
+
+
+def test_unchanged_marker_only_touches_snapshot(postgrest, tmp_path):
+    _store(postgrest, tmp_path).load()
+    postgrest.requests.clear()
+
+    store = _store(postgrest, tmp_path, ttl_s=0)
+    assert len(store.load()) == 5
+    assert store.last_source == "marker"
+    assert len(postgrest.requests) == 1
+
+
+def test_wrong_table_is_not_silently_served(postgrest, tmp_path):
+    store = _store(postgrest, tmp_path, table="otra_tabla")
+    with pytest.raises(CatalogUnavailable):
+        store.load()
+    assert {path for path, _ in postgrest.requests} == {"/rest/v1/otra_tabla"}
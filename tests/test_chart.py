@@ -0,0 +1,43 @@
+# monitor_chart: la plantilla persistida da el mismo PNG y no necesita NumPy.
+import os
+import subprocess
+import sys
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("PIL")
+
+from monitor_chart import TEMPLATE_VERSION, ChartCache, DonutRenderer  # noqa: E402
+
+NOW = datetime(2026, 10, 17, 12, 0)
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_persisted_template_renders_the_same(tmp_path):
+    built = DonutRenderer(str(tmp_path))
+    loaded = DonutRenderer(str(tmp_path))
+    assert (built.loaded, loaded.loaded) == (False, True)
+    for active, inactive in ((37, 5), (1, 999), (5, 0), (0, 5)):
+        assert built.render(active, inactive, "Centro", NOW).tobytes() == loaded.render(active, inactive, "Centro", NOW).tobytes()
+
+
+def test_corrupt_layer_is_rebuilt(tmp_path):
+    DonutRenderer(str(tmp_path))
+    (tmp_path / "theta.png").write_bytes(b"\x89PNG a medio escribir")
+    assert not DonutRenderer(str(tmp_path)).loaded
+    assert DonutRenderer(str(tmp_path)).loaded
+
+
+def test_cached_process_skips_numpy_and_keeps_template(tmp_path):
+    cache = ChartCache(str(tmp_path), max_bytes=0, min_age_s=0)
+    assert cache.get(37, 5, "Centro", NOW)
+    assert cache.evict() == 0  # el único chart ya se desalojó; la plantilla no cuenta
+    assert os.path.isdir(tmp_path / f"template_v{TEMPLATE_VERSION}")
+
+    code = ("import sys; from datetime import datetime; from monitor_chart import ChartCache; "
+            f"c = ChartCache({str(tmp_path)!r}); c.get(1, 2, None, datetime(2026, 1, 1)); "
+            "print(c.renderer().loaded, 'numpy' in sys.modules)")
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    assert out.split() == ["True", "False"]
@@ -0,0 +1,147 @@
+# PtrCache / DnsEnricher (monitor_dns) contra un servidor DNS UDP de prueba en loopback.
+import json
+import socket
+import struct
+import threading
+import time
+
+import pytest
+
+from monitor_dns import DnsEnricher, PtrCache, build_ptr_query, parse_ptr_response
+
+NAMED = "10.0.0.1"      # PTR pos-01.gane.local
+NXDOMAIN = "10.0.0.2"
+SILENT = "10.0.0.3"     # nunca contesta -> timeout
+SERVFAIL = "10.0.0.4"
+
+
+def _encode(name: str) -> bytes:
+    return b"".join(bytes([len(p)]) + p.encode("ascii") for p in name.split(".")) + b"\x00"
+
+
+class FakeDns:
+    """Contesta PTR según la IP consultada; cuenta las consultas recibidas por IP."""
+
+    def __init__(self, answers):
+        self.answers = answers  # ip -> nombre | "NXDOMAIN" | "SERVFAIL" (ausente: silencio)
+        self.queries = {}
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.settimeout(0.05)
+        self.addr = self.sock.getsockname()
+        self._stop = False
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def _serve(self):
+        while not self._stop:
+            try:
+                data, peer = self.sock.recvfrom(512)
+            except socket.timeout:
+                continue
+            qid = struct.unpack("!H", data[:2])[0]
+            question = data[12:]
+            labels, i = [], 0
+            while question[i]:
+                labels.append(question[i + 1:i + 1 + question[i]].decode("ascii"))
+                i += 1 + question[i]
+            question = question[:i + 5]
+            ip = ".".join(reversed(labels[:4]))
+            self.queries[ip] = self.queries.get(ip, 0) + 1
+            answer = self.answers.get(ip)
+            if answer is None:
+                continue
+            rcode = {"NXDOMAIN": 3, "SERVFAIL": 2}.get(answer, 0)
+            records = b""
+            if not rcode:
+                rdata = _encode(answer)
+                # Nombre comprimido: puntero a la pregunta (offset 12), como los servidores reales
+                records = struct.pack("!HHHIH", 0xC00C, 12, 1, 300, len(rdata)) + rdata
+            header = struct.pack("!HHHHHH", qid, 0x8180 | rcode, 1, 1 if records else 0, 0, 0)
+            self.sock.sendto(header + question + records, peer)
+
+    def close(self):
+        self._stop = True
+        self.thread.join()
+        self.sock.close()
+
+
+@pytest.fixture
+def dns():
+    server = FakeDns({NAMED: "pos-01.gane.local.", NXDOMAIN: "NXDOMAIN", SERVFAIL: "SERVFAIL"})
+    yield server
+    server.close()
+
+
+def _enrich(cache, server, ips, budget_s=2.0, timeout_s=0.2):
+    enricher = DnsEnricher(cache, server, budget_s=budget_s, timeout_s=timeout_s)
+    enricher.submit(ips)
+    enricher.close()
+    assert enricher.wait(budget_s + 1.0)
+    return enricher
+
+
+def test_ptr_wire_roundtrip():
+    query = build_ptr_query(0x1234, "10.1.2.3")
+    assert b"\x013\x012\x011\x0210\x07in-addr\x04arpa\x00" in query
+    answer = _encode("pos-07.gane.local")
+    response = (struct.pack("!HHHHHH", 0x1234, 0x8180, 1, 1, 0, 0) + query[12:]
+                + struct.pack("!HHHIH", 0xC00C, 12, 1, 60, len(answer)) + answer)
+    assert parse_ptr_response(response) == (0x1234, 0, "pos-07.gane.local")
+
+
+def test_enricher_caches_names_and_nxdomain_but_not_timeouts(dns, tmp_path):
+    path = str(tmp_path / "dns_cache.json")
+    cache = PtrCache(path, ttl_s=86400, negative_ttl_s=3600)
+    enricher = _enrich(cache, dns.addr, [NAMED, NXDOMAIN, SILENT, SERVFAIL, NAMED])
+
+    assert enricher.hostname(NAMED) == "pos-01.gane.local"
+    assert enricher.hostname(NXDOMAIN) is None and cache.fresh(NXDOMAIN)
+    assert not cache.fresh(SILENT) and not cache.fresh(SERVFAIL)  # se reintentan en otro barrido
+    assert dns.queries[SILENT] == 2 and dns.queries[NAMED] == 1  # un reintento por timeout; sin duplicados
+    assert enricher.stats["resolved"] == 1 and enricher.stats["nxdomain"] == 1 and enricher.stats["timeouts"] == 2
+
+    now = time.time()
+    entries = json.loads(open(path, encoding="utf-8").read())["entries"]
+    assert set(entries) == {NAMED, NXDOMAIN}
+    assert entries[NAMED][1] - now == pytest.approx(86400, abs=5)
+    assert entries[NXDOMAIN][1] - now == pytest.approx(3600, abs=5)  # TTL negativo más corto
+
+
+def test_fresh_cache_skips_the_network(dns, tmp_path):
+    path = str(tmp_path / "dns_cache.json")
+    _enrich(PtrCache(path), dns.addr, [NAMED, NXDOMAIN])
+    dns.queries.clear()
+
+    cache = PtrCache(path)  # recargada de disco
+    enricher = _enrich(cache, dns.addr, [NAMED, NXDOMAIN])
+    assert dns.queries == {}
+    assert enricher.stats["cached"] == 2
+    assert cache.name(NAMED) == "pos-01.gane.local"
+
+
+def test_expired_name_is_shown_while_it_is_requeried(dns, tmp_path):
+    cache = PtrCache(str(tmp_path / "dns_cache.json"))
+    cache.put(NAMED, "viejo.gane.local", now=time.time() - 2 * 86400)
+    assert not cache.fresh(NAMED)
+    assert cache.name(NAMED) == "viejo.gane.local"
+
+    _enrich(cache, dns.addr, [NAMED])
+    assert cache.name(NAMED) == "pos-01.gane.local" and cache.fresh(NAMED)
+
+
+def test_silent_server_is_bounded_by_the_budget(dns, tmp_path):
+    cache = PtrCache(str(tmp_path / "dns_cache.json"))
+    started = time.monotonic()
+    enricher = _enrich(cache, dns.addr, [SILENT, "10.0.0.5", "10.0.0.6"], budget_s=0.3, timeout_s=1.0)
+    assert time.monotonic() - started < 1.0
+    assert cache.entries == {}
+    assert enricher.stats["queried"] == 3  # vencido el presupuesto se abandonan, no se esperan
+
+
+def test_prune_drops_long_expired_entries(tmp_path):
+    cache = PtrCache(str(tmp_path / "dns_cache.json"), ttl_s=60, negative_ttl_s=60)
+    cache.put(NAMED, "pos-01.gane.local")
+    cache.put(NXDOMAIN, None, now=time.time() - 30 * 86400)
+    assert cache.prune() == 1
+    assert set(cache.entries) == {NAMED}
@@ -0,0 +1,121 @@
+# Sondas TCP / HEAD HTTP de monitor_probes contra servidores en loopback.
+import asyncio
+import socket
+
+import pytest
+
+from monitor_probes import ICMP, MultiProber, ProbeMap, ProbeSpec, http_once, probe_plan, tcp_once
+
+LOCAL = "127.0.0.1"
+
+
+def _free_port() -> int:
+    # Puerto que nadie escucha: se reserva y se suelta (connect -> RST)
+    with socket.socket() as s:
+        s.bind((LOCAL, 0))
+        return s.getsockname()[1]
+
+
+async def _serve(handler):
+    server = await asyncio.start_server(handler, LOCAL, 0)
+    return server, server.sockets[0].getsockname()[1]
+
+
+def _http_server(status: str, seen: list):
+    async def handler(reader, writer):
+        seen.append(await reader.readuntil(b"\r\n\r\n"))
+        writer.write(f"HTTP/1.0 {status}\r\nContent-Length: 0\r\n\r\n".encode("ascii"))
+        await writer.drain()
+        writer.close()
+    return handler
+
+
+async def _silent(reader, writer):
+    await asyncio.sleep(5)  # acepta la conexión y nunca contesta
+    writer.close()
+
+
+def test_tcp_connect_ok():
+    async def run():
+        server, port = await _serve(lambda r, w: w.close())
+        async with server:
+            return await tcp_once(LOCAL, port, 1.0)
+    active, latency, reason = asyncio.run(run())
+    assert (active, reason) == (True, "tcp_ok")
+    assert latency is not None and latency >= 0
+
+
+def test_tcp_refused_counts_as_alive():
+    active, latency, reason = asyncio.run(tcp_once(LOCAL, _free_port(), 1.0))
+    assert (active, reason) == (True, "tcp_refused")
+    assert latency is not None
+
+
+def test_http_head_reports_status_and_sends_path():
+    seen = []
+
+    async def run():
+        server, port = await _serve(_http_server("404 Not Found", seen))
+        async with server:
+            return await http_once(LOCAL, port, "/status", False, 1.0)
+    active, latency, reason = asyncio.run(run())
+    assert (active, reason) == (True, "http_404")  # cualquier respuesta HTTP es host vivo
+    assert latency is not None
+    assert seen[0].startswith(b"HEAD /status HTTP/1.0\r\n")
+    assert b"\r\nHost: 127.0.0.1\r\n" in seen[0]
+
+
+def test_http_non_http_answer_is_alive():
+    async def handler(reader, writer):
+        writer.write(b"SSH-2.0-dropbear\r\n")
+        await writer.drain()
+        writer.close()
+
+    async def run():
+        server, port = await _serve(handler)
+        async with server:
+            return await http_once(LOCAL, port, "/", False, 1.0)
+    assert asyncio.run(run())[::2] == (True, "http_invalid")
+
+
+def test_http_timeout_retries_the_whole_plan():
+    async def run():
+        server, port = await _serve(_silent)
+        async with server:
+            return await probe_plan(ProbeSpec("http", port), LOCAL, (50, 50))
+    assert asyncio.run(run()) == (False, None, "timeout")
+
+
+def test_multiprober_dispatches_by_host_and_segment():
+    seen = []
+
+    async def run():
+        server, port = await _serve(_http_server("200 OK", seen))
+        async with server:
+            probe_map = ProbeMap(hosts={"127.0.0.1": ProbeSpec.parse(f"http:{port}/ping")},
+                                 segments={"rozo": ProbeSpec.parse(f"tcp:{_free_port()}")})
+            prober = MultiProber(None, probe_map)
+            return await prober.ping_many(["127.0.0.1", "127.0.0.2", "127.0.0.3"], default=(500,),
+                                          segments={"127.0.0.2": "Rozo"})
+    results = asyncio.run(run())
+    assert results["127.0.0.1"][::2] == (True, "http_200")
+    assert results["127.0.0.2"][::2] == (True, "tcp_refused")
+    assert results["127.0.0.3"] == (False, None, "icmp_unavailable")  # sin motor ICMP
+    assert seen and seen[0].startswith(b"HEAD /ping ")
+
+
+def test_spec_parsing():
+    assert str(ProbeSpec.parse("HTTPS")) == "https:443/"
+    assert str(ProbeSpec.parse("http:8080/status")) == "http:8080/status"
+    assert str(ProbeSpec.parse("http:/health")) == "http:80/health"
+    assert str(ProbeSpec.parse("HTTP:8080/Status/Check")) == "http:8080/Status/Check"  # ruta con mayúsculas intacta
+    with pytest.raises(ValueError):
+        ProbeSpec.parse("tcp")  # tcp sin puerto
+
+
+def test_segment_rules_match_like_the_catalog():
+    tcp = ProbeSpec.parse("tcp:80")
+    probe_map = ProbeMap(segments={"Bogotá  Norte": tcp})
+    assert probe_map.spec_for("10.0.0.1", "BOGOTA NORTE") == tcp
+    assert probe_map.spec_for("10.0.0.1", " bogotá norte ") == tcp
+    assert probe_map.spec_for("10.0.0.1", "BOGOTA") == ICMP
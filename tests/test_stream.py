@@ -0,0 +1,54 @@
+# monitor_stream: progreso por temporizador y orden catalog -> host en el sondeo en vivo.
+import asyncio
+import io
+import json
+import time
+
+from monitor_records import Target
+from monitor_stream import HOSTS_ALL, EventStream
+
+
+def _events(out: io.StringIO):
+    return [json.loads(line) for line in out.getvalue().splitlines()]
+
+
+def test_progress_ticks_without_hosts_and_stops_at_finish():
+    out = io.StringIO()
+    stream = EventStream(out, progress_s=0.02)
+    stream.catalog(3, done=True)
+    time.sleep(0.15)  # barrido trabado: ningún host en este rato
+    stream.finish({})
+    names = [e["event"] for e in _events(out)]
+    assert names.count("progress") >= 2
+    assert names[-1] == "done"
+    time.sleep(0.05)
+    assert [e["event"] for e in _events(out)][-1] == "done"  # nada después del cierre
+
+
+class _Pinger:
+    async def ping_plan(self, ip, plan, segment=None):
+        await asyncio.sleep(0)
+        return True, 1.0, "ok"
+
+
+def test_catalog_precedes_first_host_in_pipelined_scan(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    import monitor_puntos_wpp as mon
+    monkeypatch.setattr(mon, "log", lambda msg: None)
+    monkeypatch.setattr(mon, "get_topology", lambda: None)
+    mon.ensure_dirs()
+    out = io.StringIO()
+    stream = EventStream(out, hosts=HOSTS_ALL, progress_s=60)
+    monkeypatch.setattr(mon, "_STREAM", stream)
+    pages = [[Target(f"192.0.2.{p * 10 + i}", "General", f"P{p}{i}") for i in range(1, 4)] for p in range(2)]
+
+    results = asyncio.run(mon._probe_stream(_Pinger(), pages, lambda t: True, mon.load_state_history()))
+    stream.stop()
+
+    assert len(results) == 6
+    events = _events(out)
+    first_host = next(i for i, e in enumerate(events) if e["event"] == "host")
+    assert events[0]["event"] == "catalog" and events[0]["queued"] == 3 and first_host > 0
+    page_two = next(i for i, e in enumerate(events) if e["event"] == "catalog" and e.get("pages") == 2)
+    seen_before = {e["ip"] for e in events[:page_two] if e["event"] == "host"}
+    assert not seen_before & {t.ip for t in pages[1]}
@@ -0,0 +1,125 @@
+# sync_puntos.compute_diff / apply_diff: hoja normalizada vs. tabla puntos_venta.
+import pytest
+
+pd = pytest.importorskip("pandas")
+
+import urllib.error  # noqa: E402
+
+import sync_puntos  # noqa: E402
+from sync_puntos import Writer, apply_diff, compute_diff, read_sheet  # noqa: E402
+
+
+def _sheet(*rows):
+    return pd.DataFrame(rows, columns=["ip", "alias", "segment"])
+
+
+def _table(*rows):
+    return pd.DataFrame(rows, columns=["ip", "alias", "segment", "active"])
+
+
+def _records(df):
+    return sorted(map(tuple, df.to_records(index=False).tolist()))
+
+
+@pytest.fixture
+def diff():
+    sheet = _sheet(
+        ("10.0.0.1", "PUNTO 1", "PALMIRA"),          # igual
+        ("10.0.0.2", "PUNTO 2 NUEVO", "PALMIRA"),    # cambió alias
+        ("10.0.0.3", "PUNTO 3", "ROZO"),             # cambió segmento
+        ("10.0.0.4", "PUNTO 4", "ROZO"),             # estaba inactivo y volvió a la hoja
+        ("10.0.0.9", "PUNTO 9", "FLORIDA"),          # nuevo
+    )
+    table = _table(
+        ("10.0.0.1", "PUNTO 1", "PALMIRA", True),
+        ("10.0.0.2", "PUNTO 2", "PALMIRA", True),
+        ("10.0.0.3", "PUNTO 3", "PALMIRA", True),
+        ("10.0.0.4", "PUNTO 4", "ROZO", False),
+        ("10.0.0.5", "PUNTO 5", "PRADERA", True),    # retirado de la hoja
+        ("10.0.0.6", "PUNTO 6", "PRADERA", False),   # ya inactivo: no se vuelve a tocar
+    )
+    return compute_diff(sheet, table)
+
+
+def test_insert(diff):
+    assert _records(diff["inserted"]) == [("10.0.0.9", "PUNTO 9", "FLORIDA")]
+
+
+def test_change_and_reactivate(diff):
+    assert _records(diff["changed"]) == [
+        ("10.0.0.2", "PUNTO 2 NUEVO", "PALMIRA"),
+        ("10.0.0.3", "PUNTO 3", "ROZO"),
+        ("10.0.0.4", "PUNTO 4", "ROZO"),
+    ]
+
+
+def test_retire_only_active_rows(diff):
+    assert _records(diff["removed"]) == [("10.0.0.5", "PUNTO 5", "PRADERA")]
+    assert list(diff["removed"].columns) == ["ip", "alias", "segment"]
+
+
+def test_unchanged_sheet_is_empty_diff():
+    rows = [("10.0.0.1", "PUNTO 1", "PALMIRA"), ("10.0.0.2", "PUNTO 2", "ROZO")]
+    out = compute_diff(_sheet(*rows), _table(*(r + (True,) for r in rows)))
+    assert all(df.empty for df in out.values())
+
+
+class _Writer:
+    def __init__(self):
+        self.upserts, self.deactivated = [], []
+
+    def upsert(self, records):
+        self.upserts.extend(records)
+
+    def deactivate(self, ips):
+        self.deactivated.extend(ips)
+
+    def log(self, msg):
+        pass
+
+
+def test_apply_diff_upserts_active_and_deactivates(diff):
+    writer = _Writer()
+    stats = apply_diff(writer, diff, batch=2, workers=2)
+    assert sorted(r["ip"] for r in writer.upserts) == ["10.0.0.2", "10.0.0.3", "10.0.0.4", "10.0.0.9"]
+    assert all(r["active"] is True for r in writer.upserts)
+    assert writer.deactivated == ["10.0.0.5"]
+    assert stats == {"ok": 5, "failed": 0, "requests": 3}
+
+    writer = _Writer()
+    apply_diff(writer, diff, deactivate=False)
+    assert writer.deactivated == []
+
+
+def test_read_sheet_keeps_only_valid_ipv4(tmp_path):
+    pytest.importorskip("openpyxl")
+    path = str(tmp_path / "Puntos.xlsx")
+    pd.DataFrame({
+        "IP": ["10.0.0.1", " 10.0.0.2 ", "10.0.0.300", "10.0.0.1,10.0.0.5", "sin ip", "010.0.0.3", None, "10.0.0.1"],
+        "Punto de venta": ["P1", "P2", "MALA", "DOS", "TEXTO", "CERO", "VACIA", "P1 BIS"],
+        "Zona": ["ROZO"] * 8,
+    }).to_excel(path, index=False)
+    sheet, info = read_sheet(path)
+    assert _records(sheet) == [("10.0.0.1", "P1 BIS", "ROZO"), ("10.0.0.2", "P2", "ROZO")]
+    assert info == {"rows": 8, "invalid": 5, "duplicates": 1}
+
+
+def test_deactivate_quotes_every_ip():
+    writer = Writer("http://x", "k", log=lambda msg: None)
+    sent = []
+    writer._send = lambda method, params, body, prefer: sent.append(params["ip"])
+    writer.deactivate(["10.0.0.5", 'a,b)"c'])
+    assert sent == ['in.("10.0.0.5","a,b)\\"c")']
+
+
+def test_table_read_failure_is_a_clean_error(monkeypatch, capsys):
+    monkeypatch.setattr(sync_puntos, "SUPABASE_URL", "http://127.0.0.1:9")
+    monkeypatch.setattr(sync_puntos, "SUPABASE_KEY", "k")
+    monkeypatch.setattr(sync_puntos, "read_sheet", lambda path: (_sheet(), {"rows": 0, "invalid": 0, "duplicates": 0}))
+
+    def _down(store):
+        raise urllib.error.URLError("connection refused")
+
+    monkeypatch.setattr(sync_puntos, "read_table", _down)
+    assert sync_puntos.main([]) == 1
+    assert capsys.readouterr().out.strip() == "❌ Error leyendo la tabla puntos_venta: <urlopen error connection refused>"
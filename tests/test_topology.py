@@ -0,0 +1,66 @@
+# monitor_topology.GatewayGate: orden de muestras y veredicto detrás de un gateway caído.
+import asyncio
+
+from monitor_topology import GatewayGate, Topology
+
+GW = "10.0.0.1"
+PLAN = (300, 600)
+
+
+class FakeProbe:
+    """Resultado por IP con demora (s) por intento; registra los planes recibidos."""
+
+    def __init__(self, answers):
+        self.answers = answers  # ip -> (vivo, demora)
+        self.calls = {}
+
+    async def __call__(self, ip, plan, *segment):
+        self.calls.setdefault(ip, []).append(tuple(plan))
+        alive, delay = self.answers.get(ip, (False, 0.0))
+        await asyncio.sleep(delay)
+        return (True, 1.0, "ok") if alive else (False, None, "timeout")
+
+
+def _gate(probe, sample=2):
+    return GatewayGate(Topology([("10.0.0.0/24", GW, None)]), probe, (1000,), sample)
+
+
+async def _sweep(gate, ips):
+    """Como _probe_stream: todos los hosts entran al gate y luego close()."""
+    tasks = [asyncio.ensure_future(gate.probe(ip, PLAN)) for ip in ips]
+    await asyncio.sleep(0)
+    gate.close()
+    return await asyncio.wait_for(asyncio.gather(*tasks), 2.0)
+
+
+def test_failed_sample_continues_when_another_sample_answers():
+    # .2 falla su intento rápido antes de que .3 conteste: el gateway no es la causa
+    probe = FakeProbe({"10.0.0.2": (False, 0.01), "10.0.0.3": (True, 0.03), "10.0.0.4": (True, 0.0)})
+    results = asyncio.run(_sweep(_gate(probe), ["10.0.0.2", "10.0.0.3", "10.0.0.4"]))
+    assert results[0] == (False, None, "timeout")  # no unreachable_via
+    assert probe.calls["10.0.0.2"] == [(300,), (600,)]  # el resto de su plan
+    assert results[1][0] and results[2][0]
+    assert probe.calls["10.0.0.4"] == [PLAN]  # no es muestra: plan completo tras el veredicto
+
+
+def test_all_samples_fail_marks_the_rest_unprobed():
+    probe = FakeProbe({})
+    gate = _gate(probe)
+    results = asyncio.run(_sweep(gate, ["10.0.0.2", "10.0.0.3", "10.0.0.4"]))
+    assert [r[2] for r in results] == ["unreachable_via:10.0.0.1"] * 3
+    assert probe.calls["10.0.0.2"] == [(300,)] and probe.calls["10.0.0.3"] == [(300,)]
+    assert "10.0.0.4" not in probe.calls
+    assert gate.dead_gateways() == [GW]
+
+
+def test_close_settles_with_fewer_hosts_than_samples():
+    probe = FakeProbe({})
+    results = asyncio.run(_sweep(_gate(probe, sample=3), ["10.0.0.2"]))
+    assert results == [(False, None, "unreachable_via:10.0.0.1")]
+
+
+def test_live_gateway_probes_hosts_normally():
+    probe = FakeProbe({GW: (True, 0.0), "10.0.0.2": (False, 0.0)})
+    results = asyncio.run(_sweep(_gate(probe), ["10.0.0.2", "10.9.9.9"]))
+    assert results == [(False, None, "timeout")] * 2
+    assert probe.calls["10.0.0.2"] == [PLAN] and probe.calls["10.9.9.9"] == [PLAN]